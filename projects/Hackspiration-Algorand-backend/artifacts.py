@@ -0,0 +1,176 @@
+"""
+Content-addressed cache for the compiled SubSharePool contract.
+
+The key is a hash of the contract source plus the compiler package versions,
+so the PyTeal -> TEAL -> bytecode pipeline runs once per contract change instead
+of once per deployment. Entries are single JSON files holding the approval/clear
+TEAL, the compiled programs and the ARC-32 app spec. Each contract variant
+(local-state contract.py, box-storage contract_boxes.py) has its own entries;
+contracts kept elsewhere (the contracts project's deploy script) register
+their own variant and share the cache.
+
+    python artifacts.py [local|box]    # build (or reuse) and print the cache entry path
+"""
+import base64
+import dataclasses
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+from importlib import metadata
+from pathlib import Path
+
+# variant -> (artifact name, contract source)
+VARIANTS = {
+    "local": ("subshare_pool", Path(__file__).parent / "contract.py"),
+    "box": ("subshare_pool_boxes", Path(__file__).parent / "contract_boxes.py"),
+}
+DEFAULT_VARIANT = "local"
+ARTIFACT_DIR = Path(os.getenv("ARTIFACT_CACHE_DIR", Path(__file__).parent / ".artifacts"))
+COMPILER_PACKAGES = ("pyteal", "beaker-pyteal", "algokit-utils", "py-algorand-sdk")
+
+
+@dataclasses.dataclass
+class ContractArtifacts:
+    key: str
+    approval_teal: str
+    clear_teal: str
+    arc32: str
+    approval_bin: bytes | None = None
+    clear_bin: bytes | None = None
+
+    @property
+    def app_spec(self):
+        from algokit_utils import ApplicationSpecification
+
+        return ApplicationSpecification.from_json(self.arc32)
+
+    @property
+    def compiled(self):
+        return self.approval_bin is not None and self.clear_bin is not None
+
+    def to_json(self):
+        data = dataclasses.asdict(self)
+        for name in ("approval_bin", "clear_bin"):
+            if data[name] is not None:
+                data[name] = base64.b64encode(data[name]).decode()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        for name in ("approval_bin", "clear_bin"):
+            if data.get(name) is not None:
+                data[name] = base64.b64decode(data[name])
+        return cls(**data)
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+
+def register(variant, name, source):
+    """Adds a contract variant whose source lives outside this directory."""
+    VARIANTS[variant] = (name, Path(source))
+
+
+def contract_source(variant=DEFAULT_VARIANT):
+    return VARIANTS[variant][1]
+
+
+def fingerprint(variant=DEFAULT_VARIANT):
+    digest = hashlib.sha256()
+    digest.update(contract_source(variant).read_bytes())
+    for package in COMPILER_PACKAGES:
+        digest.update(f"\0{package}=={_version(package)}".encode())
+    digest.update(f"\0python{sys.version_info.major}.{sys.version_info.minor}".encode())
+    return digest.hexdigest()
+
+
+def artifact_path(key, variant=DEFAULT_VARIANT):
+    return ARTIFACT_DIR / f"{VARIANTS[variant][0]}-{key[:16]}.json"
+
+
+def _write(artifacts, variant=DEFAULT_VARIANT):
+    # Atomic replace so concurrent workers never read a half-written entry
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    path = artifact_path(artifacts.key, variant)
+    fd, tmp = tempfile.mkstemp(dir=ARTIFACT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(artifacts.to_json())
+    os.replace(tmp, path)
+    return path
+
+
+def build(key, algod_client=None, variant=DEFAULT_VARIANT):
+    """Compiles the variant's contract from scratch. Programs are assembled only if algod is given."""
+    # Loaded by path, so a variant from another project cannot be shadowed by a module of the same name here
+    module_spec = importlib.util.spec_from_file_location(f"_contract_{variant}", contract_source(variant))
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    app = module.app
+
+    # Built offline: given algod, beaker would also compile both programs for source maps
+    spec = app.build()
+    artifacts = ContractArtifacts(
+        key=key,
+        approval_teal=spec.approval_program,
+        clear_teal=spec.clear_program,
+        arc32=spec.to_json(),
+    )
+    if algod_client is not None:
+        assemble(artifacts, algod_client)
+    return artifacts
+
+
+def assemble(artifacts, algod_client):
+    artifacts.approval_bin = base64.b64decode(algod_client.compile(artifacts.approval_teal)["result"])
+    artifacts.clear_bin = base64.b64decode(algod_client.compile(artifacts.clear_teal)["result"])
+
+
+_loaded = {}  # variant -> ContractArtifacts
+_lock = threading.Lock()
+
+
+def read_cached(variant=DEFAULT_VARIANT):
+    """The cache entry for the current source, read from disk once per process, or None."""
+    key = fingerprint(variant)
+    loaded = _loaded.get(variant)
+    if loaded is not None and loaded.key == key:
+        return loaded
+    try:
+        raw = artifact_path(key, variant).read_text()
+    except FileNotFoundError:
+        return None
+    _loaded[variant] = ContractArtifacts.from_json(raw)
+    return _loaded[variant]
+
+
+def load(algod_client=None, variant=DEFAULT_VARIANT):
+    """
+    Returns the artifacts for the current contract source, compiling and caching
+    them on a miss. With an algod client, the assembled programs are filled in
+    (and cached) too.
+    """
+    with _lock:
+        artifacts = read_cached(variant)
+        if artifacts is None:
+            artifacts = build(fingerprint(variant), algod_client, variant)
+            _write(artifacts, variant)
+        elif algod_client is not None and not artifacts.compiled:
+            assemble(artifacts, algod_client)
+            _write(artifacts, variant)
+        _loaded[variant] = artifacts
+        return artifacts
+
+
+if __name__ == "__main__":
+    variant = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_VARIANT
+    load(variant=variant)
+    print(artifact_path(fingerprint(variant), variant))
@@ -0,0 +1,290 @@
+"""
+Atomic-group batching for app calls the backend makes itself (renew_cycle,
+payout, ...) across many SubSharePool apps.
+
+Calls are collected into atomic groups of up to 16. The first transaction of a
+group pays the fees of the whole group, inner payments included (fee pooling),
+so the other calls go out with a zero fee. Several groups are signed and
+submitted concurrently, up to `max_in_flight` at a time.
+
+A group is all-or-nothing. When one fails, the batcher asks the sender which
+call broke it: from the error if possible, otherwise by simulating. It fails
+that call's future and resubmits the rest. If no culprit can be found, it
+bisects.
+"""
+import collections
+import copy
+import dataclasses
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_GROUP_SIZE = 16
+
+
+@dataclasses.dataclass
+class AppCall:
+    app_id: int
+    method: str
+    args: list = dataclasses.field(default_factory=list)
+    accounts: list = dataclasses.field(default_factory=list)
+    boxes: list = dataclasses.field(default_factory=list)
+    inner_txns: int = 0  # inner transactions the call may issue, for fee pooling
+    variant: str = "local"  # contract variant, see artifacts.VARIANTS
+
+
+class GroupFailed(Exception):
+    def __init__(self, message, failed_index=None):
+        super().__init__(message)
+        self.failed_index = failed_index
+
+
+class AtcSender:
+    """Signs and submits groups with the deployer account through algosdk's AtomicTransactionComposer."""
+
+    def __init__(self, algod_client=None, account=None, contracts=None, wait_rounds=4):
+        self._algod = algod_client
+        self._account = account
+        self._contracts = contracts or {}  # variant -> ApplicationSpecification
+        self.wait_rounds = wait_rounds
+
+    @property
+    def algod(self):
+        if self._algod is None:
+            from chain import get_chain
+
+            self._algod = get_chain().algod
+        return self._algod
+
+    @property
+    def account(self):
+        if self._account is None:
+            from chain import get_chain
+
+            self._account = get_chain().deployer
+        return self._account
+
+    def _method(self, call):
+        if call.variant not in self._contracts:
+            import artifacts
+
+            self._contracts[call.variant] = artifacts.load(self.algod, call.variant).app_spec
+        return self._contracts[call.variant].contract.get_method_by_name(call.method)
+
+    def compose(self, calls, sp):
+        from algosdk.atomic_transaction_composer import AtomicTransactionComposer
+
+        atc = AtomicTransactionComposer()
+        total_fee = max(sp.min_fee, 1000) * (len(calls) + sum(call.inner_txns for call in calls))
+        for n, call in enumerate(calls):
+            call_sp = copy.copy(sp)
+            call_sp.flat_fee = True
+            call_sp.fee = total_fee if n == 0 else 0
+            atc.add_method_call(
+                app_id=call.app_id,
+                method=self._method(call),
+                sender=self.account.address,
+                sp=call_sp,
+                signer=self.account.signer,
+                method_args=call.args,
+                accounts=call.accounts or None,
+                boxes=call.boxes or None,
+            )
+        return atc
+
+    def send(self, calls, sp):
+        """Submits one atomic group and waits for it. Returns the confirmed round."""
+        from algosdk import error
+
+        atc = self.compose(calls, sp)
+        try:
+            result = atc.execute(self.algod, self.wait_rounds)
+        except error.AlgodHTTPError as e:
+            txids = [t.txn.get_txid() for t in atc.txn_list]
+            raise GroupFailed(str(e), _failed_index(str(e), txids)) from e
+        return result.confirmed_round
+
+    def simulate(self, calls, sp):
+        """Index of the call that makes the group fail, or None."""
+        result = self.compose(calls, sp).simulate(self.algod)
+        if result.failure_message and result.failed_at:
+            return result.failed_at[0]
+        return None
+
+
+def _failed_index(message, txids):
+    # algod rejects a group with "transaction <txid>: logic eval error: ..."
+    match = re.search(r"transaction ([A-Z2-7]{52})", message)
+    if match and match.group(1) in txids:
+        return txids.index(match.group(1))
+    return None
+
+
+class BatcherStats:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = {
+            "calls_submitted": 0,
+            "calls_confirmed": 0,
+            "calls_failed": 0,
+            "groups_sent": 0,
+            "groups_confirmed": 0,
+            "groups_failed": 0,
+            "simulations": 0,
+        }
+        self._latencies = collections.deque(maxlen=window)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def confirmed(self, calls, latency):
+        with self._lock:
+            self.counters["groups_confirmed"] += 1
+            self.counters["calls_confirmed"] += calls
+            self._latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            latencies = sorted(self._latencies)
+            snapshot = dict(self.counters)
+        snapshot["calls_per_s"] = round(snapshot["calls_confirmed"] / elapsed, 2)
+        snapshot["groups_per_s"] = round(snapshot["groups_confirmed"] / elapsed, 2)
+        for name, q in (("p50", 0.5), ("p95", 0.95)):
+            value = latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+            snapshot[f"confirm_latency_{name}_ms"] = round(value * 1000, 1)
+        return snapshot
+
+
+class GroupBatcher:
+    """
+    Collects AppCalls from any thread and submits them as atomic groups.
+
+    submit() returns a Future that resolves to the confirmed round, or raises
+    the call's GroupFailed. A group is sent once it is full or `linger` seconds
+    after its first call arrived. `sender` needs send(calls, sp) and
+    simulate(calls, sp); use fakes.FakeGroupSender to run without a network.
+    """
+
+    def __init__(self, sender, group_size=MAX_GROUP_SIZE, max_in_flight=4, linger=0.02, params=None):
+        self.sender = sender
+        self.group_size = min(group_size, MAX_GROUP_SIZE)
+        self.max_in_flight = max_in_flight
+        self.linger = linger
+        self.params = params or _chain_params
+        self.stats = BatcherStats()
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="group-sender")
+        self._thread = None
+
+    def submit(self, call):
+        future = Future()
+        self._queue.put((call, future))
+        self.stats.incr("calls_submitted")
+        return future
+
+    def submit_many(self, calls):
+        return [self.submit(call) for call in calls]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="group-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Drains what is already queued, then waits for in-flight groups
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + self.linger
+            stop = False
+            while len(group) < self.group_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+            # Bounded window: wait for a free slot before signing the next group
+            self._slots.acquire()
+            self._pool.submit(self._send, group)
+            if stop:
+                return
+
+    def _send(self, group):
+        try:
+            self._send_group(group)
+        except Exception as e:
+            logger.exception(f"Group of {len(group)} calls failed unexpectedly: {e}")
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _send_group(self, group):
+        calls = [call for call, _ in group]
+        sp = self.params()
+        self.stats.incr("groups_sent")
+        start = time.monotonic()
+        try:
+            confirmed_round = self.sender.send(calls, sp)
+        except GroupFailed as e:
+            self.stats.incr("groups_failed")
+            self._retry_without_culprit(group, e, sp)
+            return
+        self.stats.confirmed(len(group), time.monotonic() - start)
+        for _, future in group:
+            future.set_result(confirmed_round)
+
+    def _retry_without_culprit(self, group, failure, sp):
+        if len(group) == 1:
+            self.stats.incr("calls_failed")
+            group[0][1].set_exception(failure)
+            return
+
+        index = failure.failed_index
+        if index is None:
+            self.stats.incr("simulations")
+            try:
+                index = self.sender.simulate([call for call, _ in group], sp)
+            except Exception as e:
+                logger.warning(f"Simulating a failed group of {len(group)} calls failed: {e}")
+
+        if index is not None and 0 <= index < len(group):
+            call, future = group[index]
+            logger.warning(f"{call.method} on app {call.app_id} failed its group: {failure}")
+            self.stats.incr("calls_failed")
+            future.set_exception(failure)
+            rest = group[:index] + group[index + 1:]
+            self._send_group(rest)
+            return
+
+        # Simulation passed (transient failure) or could not say: bisect
+        middle = len(group) // 2
+        self._send_group(group[:middle])
+        self._send_group(group[middle:])
+
+
+def _chain_params():
+    from chain import get_chain
+
+    return get_chain().suggested_params()
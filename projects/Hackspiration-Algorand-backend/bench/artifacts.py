@@ -0,0 +1,51 @@
+"""
+Cold compile vs. warm load of the SubSharePool artifacts.
+
+    python -m bench.artifacts [--runs 5]
+
+Run from the backend directory. Cold builds go to a throwaway cache directory;
+warm loads read the entry back from disk with the in-process memo cleared, which
+is what a freshly started worker does. Programs are not assembled (no algod).
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifacts.ARTIFACT_DIR = Path(tmp)
+        key = artifacts.fingerprint()
+
+        cold = []
+        for _ in range(args.runs):
+            artifacts._loaded.clear()
+            artifacts.artifact_path(key).unlink(missing_ok=True)
+            start = time.perf_counter()
+            artifacts.load()
+            cold.append(time.perf_counter() - start)
+
+        warm = []
+        for _ in range(args.runs):
+            artifacts._loaded.clear()
+            start = time.perf_counter()
+            artifacts.load()
+            warm.append(time.perf_counter() - start)
+
+        size = artifacts.artifact_path(key).stat().st_size
+
+    # The first cold run also pays for importing pyteal/beaker
+    print(f"cold compile: first {cold[0] * 1000:8.1f} ms, median {statistics.median(cold) * 1000:8.1f} ms")
+    print(f"warm load:    median {statistics.median(warm) * 1000:8.3f} ms ({size} bytes on disk)")
+
+
+if __name__ == "__main__":
+    main()
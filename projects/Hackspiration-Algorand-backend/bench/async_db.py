@@ -0,0 +1,151 @@
+"""
+Compares requests/s of the sync (threadpool) and async DB paths.
+
+    python -m bench.async_db [--clients 500] [--seconds 10]
+
+Run from the backend directory. Both apps serve the same pool lookup; the sync
+one uses SessionLocal in a plain `def` route, the async one AsyncSessionLocal in
+an `async def` route. Uses ./bench.db unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import select
+
+import migrations
+import models
+from database import SessionLocal, AsyncSessionLocal, engine
+
+POOLS = 1000
+
+
+def seed():
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Pool).count() >= POOLS:
+            return
+        db.add_all(
+            models.Pool(
+                contract_address=f"BENCH_{i}",
+                subscription_name=f"Bench {i}",
+                admin_wallet="BENCH",
+                cost_per_cycle=1_000_000,
+                max_members=4,
+                cycle_duration=86400,
+                renewal_timestamp=int(time.time()) + 86400,
+                status=0,
+            )
+            for i in range(POOLS)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def build_sync_app():
+    app = FastAPI()
+
+    @app.get("/pool/{pool_id}")
+    def get_pool(pool_id: int):
+        db = SessionLocal()
+        try:
+            pool = db.query(models.Pool).filter(models.Pool.id == pool_id).first()
+            if not pool:
+                raise HTTPException(status_code=404)
+            return {"id": pool.id, "subscription_name": pool.subscription_name}
+        finally:
+            db.close()
+
+    return app
+
+
+def build_async_app():
+    app = FastAPI()
+
+    @app.get("/pool/{pool_id}")
+    async def get_pool(pool_id: int):
+        async with AsyncSessionLocal() as db:
+            pool = await db.scalar(select(models.Pool).where(models.Pool.id == pool_id))
+            if not pool:
+                raise HTTPException(status_code=404)
+            return {"id": pool.id, "subscription_name": pool.subscription_name}
+
+    return app
+
+
+def serve(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def load(port, clients, seconds):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        async def worker(n):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"/pool/{i % POOLS + 1}")
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+                i += clients
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    seed()
+    for name, app, port in (("sync", build_sync_app(), 8101), ("async", build_async_app(), 8102)):
+        server, thread = serve(app, port)
+        try:
+            result = asyncio.run(load(port, args.clients, args.seconds))
+        finally:
+            server.should_exit = True
+            thread.join()
+        print(
+            f"{name:>5}: {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+            f"p99 {result['p99_ms']:7.1f} ms  ({result['requests']} ok, {result['errors']} errors, "
+            f"{args.clients} clients)"
+        )
+
+
+if __name__ == "__main__":
+    main()
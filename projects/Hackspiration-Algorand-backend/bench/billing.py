@@ -0,0 +1,230 @@
+"""
+Billing run over a month-boundary spike: every pool due at once.
+
+    python -m bench.billing [--members 1000000] [--per-pool 10] [--check 2000]
+
+Run from the backend directory. Seeds a fresh SQLite database with
+`--members` members spread over pools of up to `--per-pool` members (random
+costs, catch-up cycles, exits and balances), then times billing.bill_due()
+split into load, compute and write. The NumPy results are checked against a
+plain-Python split of `--check` random pools, and every pool's shares must sum
+to exactly what it owes. A three-cycle run of one pool checks that charges and
+refunds come off the members' balances. Exits 1 on a mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import billing
+import ledger
+import migrations
+from database import build_engine
+from renewals import RenewalEngine
+
+NOW = 2_000_000_000
+
+
+def seed(engine, members, per_pool, seed=22):
+    rng = random.Random(seed)
+    pools, rows = [], []
+    pool_id = 0
+    while len(rows) < members:
+        pool_id += 1
+        duration = rng.choice((3600, 86400, 2592000))
+        pools.append({
+            "id": pool_id,
+            "cost": rng.randrange(1, 50_000_000),
+            # Mostly one cycle due, some pools several cycles behind
+            "ts": NOW - rng.randrange(0, duration * rng.choice((1, 1, 1, 3))),
+            "duration": duration,
+            "cycle": rng.randrange(0, 24),
+        })
+        for n in range(min(rng.randint(1, per_pool), members - len(rows))):
+            rows.append({
+                "pool_id": pool_id,
+                "wallet": f"W{pool_id}-{n}",
+                "active": rng.random() > 0.1,
+                "deposited": rng.choice((0, rng.randrange(0, 20_000_000), rng.randrange(0, 200_000_000))),
+            })
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+                "renewal_timestamp, status, cycle) VALUES (:id, 'Bench', 'A', :cost, :max, :duration, :ts, 1, :cycle)"
+            ),
+            [dict(p, max=per_pool) for p in pools],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO pool_members (pool_id, wallet_address, is_active, deposited_amount) "
+                "VALUES (:pool_id, :wallet, :active, :deposited)"
+            ),
+            rows,
+        )
+        # Balances as the ledger compactor leaves them
+        conn.execute(
+            text(
+                "INSERT INTO member_balances (pool_id, wallet_address, deposited, refunded, balance, last_event_id) "
+                "VALUES (:pool_id, :wallet, :deposited, 0, :deposited, 0)"
+            ),
+            rows,
+        )
+    return pools, rows
+
+
+def reference(pool, members):
+    """Plain-Python split of one pool: {wallet: (share, charged, shortfall, refund)}."""
+    cycles = (NOW - pool["ts"]) // pool["duration"] + 1
+    due = pool["cost"] * cycles
+    payers = [m for m in members if m["active"]]
+    result = {}
+    for rank, m in enumerate(payers):
+        share = due // len(payers) + (1 if rank < due % len(payers) else 0)
+        charged = min(max(m["deposited"], 0), share)
+        result[m["wallet"]] = (share, charged, share - charged, 0)
+    for m in members:
+        if not m["active"]:
+            result[m["wallet"]] = (0, 0, 0, max(m["deposited"], 0))
+    return result
+
+
+def check(bill, pools, rows, sample, rng):
+    ok = True
+    # Shares add up to the amount due in every pool with an active member
+    sums = np.zeros(len(bill.pool_ids), dtype=np.int64)
+    np.add.at(sums, bill.member_pool, bill.share)
+    billed = bill.payers > 0
+    if not np.array_equal(sums[billed], bill.due[billed]) or sums[~billed].any():
+        print("FAIL shares do not sum to the amount due")
+        ok = False
+
+    by_pool = {}
+    for row in rows:
+        by_pool.setdefault(row["pool_id"], []).append(row)
+    index = {pool_id: i for i, pool_id in enumerate(bill.pool_ids.tolist())}
+    where = {}
+    for i, pool in enumerate(bill.member_pool.tolist()):
+        where.setdefault(pool, []).append(i)
+    for pool in rng.sample(pools, min(sample, len(pools))):
+        expected = reference(pool, by_pool.get(pool["id"], []))
+        got = {
+            bill.wallets[i]: (int(bill.share[i]), int(bill.charged[i]), int(bill.shortfall[i]), int(bill.refund[i]))
+            for i in where.get(index[pool["id"]], [])
+        }
+        if got != expected:
+            print(f"FAIL pool {pool['id']}: {got} != {expected}")
+            ok = False
+            break
+    return ok
+
+
+def check_cycles(tmp):
+    """
+    Three renewals of one pool (200 per cycle): A deposited 300, B deposited 50
+    and exited. Balances must go down cycle by cycle, whether or not the
+    compactor ran in between.
+    """
+    engine = build_engine(f"sqlite:///{os.path.join(tmp, 'cycles.db')}", "production", False)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+            "renewal_timestamp, status, cycle) VALUES (1, 'Cycles', 'A', 200, 2, 100, 100, 1, 0)"
+        ))
+        conn.execute(text(
+            "INSERT INTO pool_members (pool_id, wallet_address, is_active, deposited_amount) "
+            "VALUES (1, 'A', 1, 0), (1, 'B', 0, 0)"
+        ))
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    ledger.record_deposit(db, 1, "A", 300)
+    ledger.record_deposit(db, 1, "B", 50)
+    db.commit()
+    db.close()
+
+    compactor = ledger.LedgerCompactor(Session)
+    renewals = RenewalEngine(Session, billing=billing.bill_due)
+    renewals.load()
+    for now in (100, 200, 300):
+        renewals.run_due(now)
+        if now == 200:
+            compactor.compact_once()  # cycle 0 billed from the uncompacted tail, cycle 1 from the rollup
+    compactor.compact_once()
+
+    with engine.connect() as conn:
+        invoices = conn.execute(text(
+            "SELECT cycle, wallet_address, charged, shortfall, refund FROM invoices ORDER BY cycle, wallet_address"
+        )).all()
+        final = dict(conn.execute(text("SELECT wallet_address, balance FROM member_balances")).all())
+    engine.dispose()
+    expected = [(0, "A", 200, 0, 0), (0, "B", 0, 0, 50), (1, "A", 100, 100, 0), (2, "A", 0, 200, 0)]
+    if [tuple(row) for row in invoices] != expected or final != {"A": 0, "B": 0}:
+        print(f"FAIL multi-cycle billing: {invoices}, balances {final}")
+        return False
+    print("multi-cycle billing: charges and refunds come off the ledger balance")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=1_000_000)
+    parser.add_argument("--per-pool", type=int, default=10)
+    parser.add_argument("--check", type=int, default=2000, help="pools to compare against the plain-Python split")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cycles_ok = check_cycles(tmp)
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'billing.db')}", "production", False)
+        migrations.upgrade(engine)
+        start = time.perf_counter()
+        pools, rows = seed(engine, args.members, args.per_pool)
+        print(f"seeded {len(pools)} pools / {len(rows)} members in {time.perf_counter() - start:.1f} s")
+
+        db = sessionmaker(bind=engine)()
+        try:
+            start = time.perf_counter()
+            bill = billing.load_due(db, NOW)
+            loaded = time.perf_counter()
+            billing.compute(bill)
+            computed = time.perf_counter()
+            invoices = billing.write_invoices(db, bill)
+            db.commit()
+            written = time.perf_counter()
+            booked = db.execute(text("SELECT COUNT(*) FROM deposit_events")).scalar()
+            billing.bill_due(db, NOW)
+            db.commit()
+            stored = db.execute(text("SELECT COUNT(*) FROM invoices")).scalar()
+            rebooked = db.execute(text("SELECT COUNT(*) FROM deposit_events")).scalar()
+        finally:
+            db.close()
+        engine.dispose()
+
+    summary = bill.summary()
+    total = written - start
+    print(f"load:    {loaded - start:6.2f} s")
+    print(f"compute: {computed - loaded:6.3f} s")
+    print(f"write:   {written - computed:6.2f} s ({invoices} invoices)")
+    print(f"total:   {total:6.2f} s, {len(bill) / total:,.0f} members/s")
+    print(
+        f"{summary['billed']} due, {summary['charged']} charged, {summary['shortfall']} short in "
+        f"{len(summary['underfunded'])} pools, {summary['refunds']} refunded, {len(summary['empty'])} pools without payers"
+    )
+
+    ok = check(bill, pools, rows, args.check, random.Random(1)) and cycles_ok
+    if stored != invoices or rebooked != booked:
+        print(f"FAIL rerun wrote duplicates: {stored} invoices for {invoices}, {rebooked} ledger events for {booked}")
+        ok = False
+    if not ok:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
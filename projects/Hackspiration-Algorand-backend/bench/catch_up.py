@@ -0,0 +1,119 @@
+"""
+Year-long outage simulation for multi-cycle catch-up.
+
+    python -m bench.catch_up [--pools 5000]
+
+Run from the backend directory. Seeds active pools with hourly, daily and
+30-day cycles whose deadlines are a year in the past, runs the renewal engine
+once and checks that every pool was renewed exactly once and landed on its
+next future deadline. The same pools are then settled with the contracts'
+settle() arithmetic to check payouts and underfunded marking. Exits 1 on any
+mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+from database import build_engine
+from renewals import RenewalEngine, catch_up
+
+YEAR = 365 * 86400
+CYCLES = (3600, 86400, 30 * 86400)
+
+
+def renew_cycle(now, renewal_timestamp, cycle_duration, total_deposited, cost_per_cycle):
+    """
+    Python mirror of the contracts' renew_cycle() (cycles_due + settle).
+    Returns (amount paid to the admin, new renewal_timestamp, total_deposited, status).
+    """
+    assert now >= renewal_timestamp
+    cycles = (now - renewal_timestamp) // cycle_duration + 1
+    paid = min(cycles, total_deposited // cost_per_cycle)
+    return (
+        paid * cost_per_cycle,
+        renewal_timestamp + cycles * cycle_duration,
+        total_deposited - paid * cost_per_cycle,
+        1 if paid == cycles else 3,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pools", type=int, default=5000)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    random.seed(14)
+    pools = [
+        (i + 1, random.choice(CYCLES), now - YEAR - random.randrange(86400))
+        for i in range(args.pools)
+    ]
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'catch_up.db')}", "production", False)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, "
+                    "cycle_duration, renewal_timestamp, status) VALUES (:id, 'Outage', 'A', 1000000, 4, :cycle, :ts, 1)"
+                ),
+                [{"id": pool_id, "cycle": cycle, "ts": ts} for pool_id, cycle, ts in pools],
+            )
+
+        batches = []
+        renewal_engine = RenewalEngine(sessionmaker(bind=engine), on_renewed=batches.append)
+        renewal_engine.load()
+        start = time.perf_counter()
+        renewed = renewal_engine.run_due(now)
+        elapsed = time.perf_counter() - start
+
+        with engine.connect() as conn:
+            stored = dict(conn.execute(text("SELECT id, renewal_timestamp FROM pools")).all())
+        engine.dispose()
+
+    if sorted(renewed) != [pool_id for pool_id, _, _ in pools]:
+        failures.append(f"renewed {len(renewed)} pools, expected each of {len(pools)} exactly once")
+    if renewal_engine.run_due(now):
+        failures.append("pools were still due after one run")
+
+    missed = underfunded = 0
+    for pool_id, cycle, ts in pools:
+        cycles, expected = catch_up(ts, cycle, now)
+        missed += cycles
+        if not now < stored[pool_id] <= now + cycle or stored[pool_id] != expected:
+            failures.append(f"pool {pool_id}: renewal_timestamp {stored[pool_id]}, expected {expected}")
+        if renewal_engine._pools[pool_id][0] != expected:
+            failures.append(f"pool {pool_id}: queue deadline out of sync with the database")
+
+        # Contract side: one renew_cycle call must land on the same deadline,
+        # paying what the deposits cover (here: anywhere from 0 to all cycles)
+        cost = 1_000_000
+        deposited = random.randrange(cycles + 2) * cost + random.randrange(cost)
+        amount, chain_ts, left, status = renew_cycle(now, ts, cycle, deposited, cost)
+        paid = min(cycles, deposited // cost)
+        if chain_ts != stored[pool_id]:
+            failures.append(f"pool {pool_id}: contract deadline {chain_ts}, database {stored[pool_id]}")
+        if amount != paid * cost or left != deposited - amount or status != (1 if paid == cycles else 3):
+            failures.append(f"pool {pool_id}: settled {(amount, left, status)} for {cycles} cycles / {deposited}")
+        underfunded += status == 3
+
+    print(f"{len(pools)} pools, {missed} missed cycles settled in {len(batches)} batches / {elapsed * 1000:.1f} ms")
+    print(f"one cycle per run would have needed {missed} renewals; {underfunded} pools end up underfunded")
+    for line in failures[:20]:
+        print(f"FAIL {line}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Chain sync throughput as the number of pools grows, replayed from synthetic
+indexer fixtures through fakes.FakeIndexer.
+
+    python -m bench.chain_sync [--calls 20000] [--pools 10,1000,10000] [--save fixture.json]
+
+Run from the backend directory. Each run generates the same number of app
+calls (opt-ins, deposits, exits, withdrawals) spread over a different number
+of pools, syncs them into a fresh SQLite database, compacts the deposit
+ledger and checks the resulting deposits and flags against the generator's
+own bookkeeping. Exits 1 on a
+mismatch.
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+from algosdk import abi
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import fakes
+import ledger
+import migrations
+from chain_sync import ChainSync
+from database import build_engine
+
+
+def _arg(signature):
+    return base64.b64encode(abi.Method.from_signature(signature).get_selector()).decode()
+
+
+def _uint_delta(key, value):
+    return {"key": base64.b64encode(key.encode()).decode(), "value": {"action": 2, "uint": value}}
+
+
+def generate(pools, calls, members_per_pool=8, txns_per_round=40, seed=16):
+    """Returns (indexer transactions, expected {(app_id, wallet): (deposited, is_active)})."""
+    rng = random.Random(seed)
+    state = {}
+    txns = []
+    for n in range(calls):
+        app_id = 1001 + rng.randrange(pools)
+        wallet = f"W{app_id}-{rng.randrange(members_per_pool)}"
+        key = (app_id, wallet)
+        if key not in state:
+            method, local = "opt_in()void", {}
+            state[key] = (0, True)
+        else:
+            deposited, active = state[key]
+            roll = rng.random()
+            if roll < 0.8:
+                method = "deposit_share(pay)void"
+                deposited += rng.randrange(1, 1_000_000)
+                local = {"deposited_amount": deposited}
+            elif roll < 0.9:
+                method, local, active = "exit_next_cycle()void", {"is_active": 0}, False
+            else:
+                method, local, deposited = "withdraw()void", {"deposited_amount": 0}, 0
+            state[key] = (deposited, active)
+        txns.append({
+            "id": f"TX{n}",
+            "tx-type": "appl",
+            "sender": wallet,
+            "confirmed-round": 1 + n // txns_per_round,
+            "intra-round-offset": n % txns_per_round,
+            "application-transaction": {
+                "application-id": app_id,
+                "application-arguments": [_arg(method)],
+                "on-completion": "optin" if method == "opt_in()void" else "noop",
+            },
+            "local-state-delta": [
+                {"address": wallet, "delta": [_uint_delta(k, v) for k, v in local.items()]}
+            ] if local else [],
+        })
+    return txns, state
+
+
+def run(pools, calls, page_size):
+    txns, expected = generate(pools, calls)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'sync.db')}", "production", False)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, "
+                    "cycle_duration, renewal_timestamp, status, app_id) VALUES (:id, 'Sync', 'A', 1, 8, 60, 0, 1, :app_id)"
+                ),
+                [{"id": i + 1, "app_id": 1001 + i} for i in range(pools)],
+            )
+
+        indexer = fakes.FakeIndexer(txns)
+        sync = ChainSync(sessionmaker(bind=engine), indexer=indexer, page_size=page_size, start_round=0)
+        start = time.perf_counter()
+        applied = sync.sync_once()
+        elapsed = time.perf_counter() - start
+        again = sync.sync_once()
+        ledger.LedgerCompactor(sessionmaker(bind=engine)).compact_once()
+
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT pool_id, wallet_address, deposited_amount, is_active FROM pool_members")).all()
+        engine.dispose()
+
+    stored = {(pool_id + 1000, wallet): (deposited, bool(active)) for pool_id, wallet, deposited, active in rows}
+    ok = stored == expected and applied == calls and again == 0
+    return elapsed, sync.stats, indexer.calls, ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--pools", default="10,1000,10000")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--save", help="also write the first fixture for fakes.FakeIndexer.load()")
+    args = parser.parse_args()
+
+    if args.save:
+        import json
+
+        txns, _ = generate(int(args.pools.split(",")[0]), args.calls)
+        with open(args.save, "w") as f:
+            json.dump({"round": txns[-1]["confirmed-round"], "transactions": txns}, f)
+
+    failed = False
+    for pools in (int(p) for p in args.pools.split(",")):
+        elapsed, stats, indexer_calls, ok = run(pools, args.calls, args.page_size)
+        failed |= not ok
+        print(
+            f"{pools:>6} pools: {args.calls / elapsed:9.0f} calls/s, {stats['commits']} commits, "
+            f"{indexer_calls} indexer requests, checkpoint {stats['last_round']} [{'ok' if ok else 'MISMATCH'}]"
+        )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
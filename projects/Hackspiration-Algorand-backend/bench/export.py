@@ -0,0 +1,128 @@
+"""
+Peak memory and throughput of export.stream() as the table grows.
+
+    python -m bench.export [--rows 200000 1000000]
+
+Run from the backend directory. For each size, seeds a fresh SQLite file with
+that many deposit events and exports them in every format, each in its own
+process, reporting rows/s and the process's peak RSS. For comparison, the
+smallest size is also loaded the way clients did before: all rows as ORM
+objects. Exits 1 if an export drops rows or the peak RSS of an export grows
+by more than 50% from the smallest size to the largest.
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+
+import export
+import migrations
+import models
+from database import build_engine
+
+
+def peak_rss_mib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def seed(engine, rows):
+    with engine.begin() as conn:
+        for start in range(0, rows, 100000):
+            conn.execute(
+                text(
+                    "INSERT INTO deposit_events (pool_id, wallet_address, kind, amount, cycle, txid, round, created_at) "
+                    "VALUES (:pool, :wallet, 'deposit', :amount, :cycle, :txid, :round, CURRENT_TIMESTAMP)"
+                ),
+                [
+                    {
+                        "pool": i // 10, "wallet": f"WALLET{i % 50000:052d}", "amount": 1_000_000 + i,
+                        "cycle": i % 12, "txid": f"TX{i:050d}", "round": 30_000_000 + i,
+                    }
+                    for i in range(start, min(start + 100000, rows))
+                ],
+            )
+
+
+def child(url, fmt):
+    """Runs in its own process: one export (or the ORM load) and its numbers on stdout."""
+    # Default SQLite profile: the production mmap and page cache would count the database file into RSS
+    engine = build_engine(url, "default", False)
+    start = time.perf_counter()
+    size = 0
+    if fmt == "orm":
+        db = sessionmaker(bind=engine)()
+        db.scalars(select(models.DepositEvent)).all()
+    else:
+        for chunk in export.stream(engine, "deposits", fmt):
+            size += len(chunk)
+    print(f"{time.perf_counter() - start} {peak_rss_mib()} {size}")
+
+
+def run_child(url, fmt):
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.export", "--child", url, fmt], capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), float(output[1]), int(output[2])
+
+
+def count_rows(engine, fmt):
+    """Rows in a full export, read back in process (not timed)."""
+    chunks = export.stream(engine, "deposits", fmt)
+    if fmt == "parquet":
+        import pyarrow.parquet
+        return pyarrow.parquet.read_metadata(io.BytesIO(b"".join(chunks))).num_rows
+    lines = sum(chunk.count(b"\n") for chunk in chunks)
+    return lines - 1 if fmt == "csv" else lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[200000, 1000000])
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    formats = [fmt for fmt in export.FORMATS if fmt != "parquet" or export.HAVE_PYARROW]
+    ok = True
+    peaks = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, rows in enumerate(sorted(args.rows)):
+            url = f"sqlite:///{os.path.join(tmp, f'export{n}.db')}"
+            engine = build_engine(url, "production", False)
+            migrations.upgrade(engine)
+            seed(engine, rows)
+            for fmt in formats + (["orm"] if n == 0 else []):
+                seconds, peak, size = run_child(url, fmt)
+                peaks.setdefault(fmt, []).append(peak)
+                label = "ORM load (before)" if fmt == "orm" else f"export {fmt}"
+                detail = f", {size / 1024 / 1024:7.1f} MiB out" if size else ""
+                print(f"{rows:>9} rows  {label:18} {rows / seconds:>10,.0f} rows/s, peak RSS {peak:6.0f} MiB{detail}")
+                if fmt != "orm" and count_rows(engine, fmt) != rows:
+                    print(f"FAIL {fmt} export of {rows} rows is missing rows")
+                    ok = False
+            engine.dispose()
+
+    if len(args.rows) > 1:
+        for fmt in formats:
+            if peaks[fmt][-1] > peaks[fmt][0] * 1.5:
+                print(f"FAIL {fmt} export memory grows with the table: {peaks[fmt][0]:.0f} -> {peaks[fmt][-1]:.0f} MiB")
+                ok = False
+    if not ok:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Renewal throughput as worker processes are added, all sharing one SQLite file
+and claiming due pools through row leases (leases.claim_due).
+
+    python -m bench.leases [--pools 2000] [--workers 1,2,4] [--latency 0.05]
+
+Run from the backend directory. Every pool is overdue; each worker process
+runs a lease-mode RenewalEngine whose renew_cycle calls go through a
+GroupBatcher over fakes.FakeAlgodClient with `--latency` seconds of simulated
+confirmation. Checks that every pool was renewed exactly once, on chain and in
+the database, and landed on its next future deadline. Exits 1 on a mismatch.
+"""
+import argparse
+import collections
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import fakes
+import migrations
+from batcher import GroupBatcher
+from database import build_engine
+from renewals import RenewalEngine, catch_up
+
+CYCLE = 3600
+
+
+def worker(url, owner, now, latency, batch, go, results):
+    import logging
+
+    logging.disable(logging.WARNING)
+    engine = build_engine(url, "production", False)
+    algod = fakes.FakeAlgodClient(confirm_latency=latency)
+    params = SimpleNamespace(min_fee=1000)
+    batcher = GroupBatcher(fakes.FakeGroupSender(algod), params=lambda: params)
+    renewed = []
+    renewals = RenewalEngine(
+        sessionmaker(bind=engine), max_batch=batch, batcher=batcher, owner=owner, on_renewed=renewed.extend,
+    )
+    batcher.start()
+    go.wait()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        renewals.run_due(now)
+    batcher.stop()
+    engine.dispose()
+    results.put((owner, renewed, [app_id for _, app_id, _ in algod.app_calls]))
+
+
+def seed(url, pools, now):
+    rng = random.Random(17)
+    engine = build_engine(url, "production", False)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        migrations.upgrade(engine)
+    deadlines = {i + 1: now - rng.randrange(0, 30 * CYCLE) for i in range(pools)}
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, "
+                "cycle_duration, renewal_timestamp, status, app_id) VALUES (:id, 'Lease', 'A', 1, 8, :cycle, :ts, 1, :app_id)"
+            ),
+            [{"id": pool_id, "cycle": CYCLE, "ts": ts, "app_id": 1000 + pool_id} for pool_id, ts in deadlines.items()],
+        )
+    engine.dispose()
+    return deadlines
+
+
+def run(workers, pools, latency, batch):
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'leases.db')}"
+        deadlines = seed(url, pools, now)
+
+        go = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(url, f"w{n}", now, latency, batch, go, results))
+            for n in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        time.sleep(0.5)  # let every process import and connect before the clock starts
+        start = time.perf_counter()
+        go.set()
+        outcome = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for proc in procs:
+            proc.join()
+
+        engine = build_engine(url, "production", False)
+        with engine.connect() as conn:
+            rows = dict(conn.execute(text("SELECT id, renewal_timestamp FROM pools")).all())
+            leased = conn.execute(text("SELECT count(*) FROM pools WHERE lease_owner IS NOT NULL")).scalar()
+        engine.dispose()
+
+    renewed = collections.Counter(pool_id for _, ids, _ in outcome for pool_id in ids)
+    calls = collections.Counter(app_id - 1000 for _, _, app_ids in outcome for app_id in app_ids)
+    expected = {pool_id: catch_up(ts, CYCLE, now)[1] for pool_id, ts in deadlines.items()}
+    ok = (
+        set(renewed) == set(deadlines) and max(renewed.values()) == 1
+        and calls == renewed and rows == expected and leased == 0
+    )
+    shares = sorted(len(ids) for _, ids, _ in outcome)
+    return elapsed, shares, ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pools", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    failed = False
+    for workers in (int(w) for w in args.workers.split(",")):
+        elapsed, shares, ok = run(workers, args.pools, args.latency, args.batch)
+        failed |= not ok
+        print(
+            f"{workers} workers: {args.pools / elapsed:8.1f} renewals/s in {elapsed:.2f}s, "
+            f"pools per worker {shares} [{'ok' if ok else 'MISMATCH'}]"
+        )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
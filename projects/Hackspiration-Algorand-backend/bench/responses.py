@@ -0,0 +1,131 @@
+"""
+Bytes and CPU per request of GET /pools, before and after the ETag/orjson path.
+
+    python -m bench.responses [--pools 50000] [--requests 20]
+
+Run from the backend directory. Seeds a fresh SQLite file with `--pools`
+pools, then calls, in process over ASGI:
+
+- before: the old route, ORM rows validated by pydantic (from_attributes) and
+  encoded by the stdlib JSON encoder
+- after:  main.app, row tuples encoded by orjson; plain, gzip, and a
+  revalidation with If-None-Match (304)
+
+for the whole table (paginate=false) and for one 50-row page. CPU is process
+time per request (client and server). Exits 1 if the two paths return
+different data or the revalidation is not a 304.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Before database.py builds its engines; removed at exit
+TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP.name, 'responses.db')}"
+
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import migrations
+import models
+import schemas
+from database import engine, get_async_db
+from main import app
+
+legacy = FastAPI()
+
+
+@legacy.get("/pools", response_model=List[schemas.Pool])
+async def legacy_pools(limit: int = 0, db: AsyncSession = Depends(get_async_db)):
+    query = select(models.Pool).order_by(models.Pool.id)
+    if limit:
+        query = query.limit(limit)
+    return (await db.scalars(query)).all()
+
+
+def seed(pools):
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+                "renewal_timestamp, status, contract_address, app_id, deployment_status, storage, created_at) "
+                "VALUES (:id, :name, :admin, :cost, 5, 2592000, :ts, :status, :address, :app, 'deployed', 'local', "
+                "CURRENT_TIMESTAMP)"
+            ),
+            [
+                {
+                    "id": i, "name": f"Subscription {i}", "admin": f"ADMIN{i % 997:054d}", "cost": 1_000_000 + i,
+                    "ts": 1_800_000_000 + i, "status": i % 3, "address": f"APP{i:055d}", "app": 10_000 + i,
+                }
+                for i in range(1, pools + 1)
+            ],
+        )
+
+
+async def measure(app, path, requests, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(path, headers=headers)  # warm-up
+        start = time.process_time()
+        for _ in range(requests):
+            response = await client.get(path, headers=headers)
+        cpu = (time.process_time() - start) / requests
+    return response, response.num_bytes_downloaded, cpu
+
+
+async def run(requests):
+    ok = True
+    rows = []
+    for label, before_path, after_path, n in (
+        ("whole table", "/pools", "/pools?paginate=false", max(requests // 4, 3)),
+        ("50-row page", "/pools?limit=50", "/pools?limit=50", requests * 10),
+    ):
+        before, before_bytes, before_cpu = await measure(legacy, before_path, n, {"Accept-Encoding": "identity"})
+        after, after_bytes, after_cpu = await measure(app, after_path, n, {"Accept-Encoding": "identity"})
+        zipped, zipped_bytes, zipped_cpu = await measure(app, after_path, n, {"Accept-Encoding": "gzip"})
+        tag = after.headers["etag"]
+        cached, cached_bytes, cached_cpu = await measure(app, after_path, n, {"If-None-Match": tag})
+
+        items = after.json()
+        items = items if isinstance(items, list) else items["items"]
+        if items != before.json() or zipped.json() != after.json():
+            print(f"FAIL {label}: responses differ")
+            ok = False
+        if cached.status_code != 304:
+            print(f"FAIL {label}: revalidation returned {cached.status_code}")
+            ok = False
+        rows += [
+            (label, "before (pydantic + json)", before_bytes, before_cpu),
+            (label, "after (orjson)", after_bytes, after_cpu),
+            (label, "after (orjson + gzip)", zipped_bytes, zipped_cpu),
+            (label, "after (304)", cached_bytes, cached_cpu),
+        ]
+    return rows, ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pools", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.pools)
+    rows, ok = asyncio.run(run(args.requests))
+    print(f"{args.pools} pools")
+    for label, path, size, cpu in rows:
+        print(f"{label:12} {path:26} {size:>12,} bytes {cpu * 1000:9.2f} ms CPU/request")
+    if not ok:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
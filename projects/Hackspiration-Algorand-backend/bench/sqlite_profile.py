@@ -0,0 +1,113 @@
+"""
+Read/write throughput of the SQLite engine profiles while renewal-style bulk
+UPDATEs run alongside concurrent readers.
+
+    python -m bench.sqlite_profile [--readers 16] [--seconds 10] [--pools 20000]
+
+Run from the backend directory. Each profile gets a fresh database file under
+./bench_<profile>.db so journal modes do not leak between runs.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import migrations
+from database import build_engine
+
+
+def seed(engine, pools):
+    migrations.upgrade(engine)
+    now = int(time.time())
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (contract_address, subscription_name, admin_wallet, cost_per_cycle, "
+                "max_members, cycle_duration, renewal_timestamp, status) "
+                "VALUES (:addr, :name, 'BENCH', 1000000, 4, 86400, :ts, 1)"
+            ),
+            [{"addr": f"BENCH_{i}", "name": f"Bench {i}", "ts": now + i} for i in range(pools)],
+        )
+
+
+def run(engine, pools, readers, seconds, batch):
+    stop = time.perf_counter() + seconds
+    counts = {"reads": 0, "writes": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def reader():
+        n = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < stop:
+                try:
+                    conn.execute(text("SELECT * FROM pools WHERE id = :id"), {"id": random.randint(1, pools)}).fetchone()
+                    conn.commit()
+                    n += 1
+                except OperationalError:
+                    conn.rollback()
+                    with lock:
+                        counts["busy"] += 1
+        with lock:
+            counts["reads"] += n
+
+    def writer():
+        # Same shape as RenewalEngine._renew_batch: one bulk UPDATE + one commit
+        n = 0
+        while time.perf_counter() < stop:
+            ids = random.sample(range(1, pools + 1), batch)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text(
+                            "UPDATE pools SET renewal_timestamp = renewal_timestamp + cycle_duration "
+                            f"WHERE status = 1 AND id IN ({', '.join(map(str, ids))})"
+                        )
+                    )
+                n += 1
+            except OperationalError:
+                with lock:
+                    counts["busy"] += 1
+        with lock:
+            counts["writes"] += n
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pools", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500, help="pools per renewal UPDATE")
+    args = parser.parse_args()
+
+    for profile in ("default", "production"):
+        path = f"./bench_{profile}.db"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        engine = build_engine(f"sqlite:///{path}", profile=profile)
+        seed(engine, args.pools)
+        with engine.connect() as conn:
+            mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+        counts, elapsed = run(engine, args.pools, args.readers, args.seconds, args.batch)
+        engine.dispose()
+        print(
+            f"{profile:>10} ({mode}): {counts['reads'] / elapsed:9.1f} reads/s  "
+            f"{counts['writes'] / elapsed:7.1f} renewal batches/s  {counts['busy']} busy errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Worker boot time: `import main` under `python -X importtime`, then the
+lifespan start-up (migrations, worker threads) on a fresh SQLite file.
+
+    python -m bench.startup [--runs 5] [--budget-ms 0]
+
+Run from the backend directory. Each run is a fresh interpreter. Prints the
+median import and start-up times and the heaviest top-level imports. Exits 1
+if importing main pulls in the chain stack (algosdk, algokit_utils, pyteal,
+beaker), or if `--budget-ms` is set and the median import time exceeds it.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHAIN_STACK = ("algosdk", "algokit_utils", "pyteal", "beaker", "chain", "deploy", "contract", "contract_boxes")
+
+BOOT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+loaded = sorted(m for m in {chain_stack!r} if m in sys.modules)
+
+async def boot():
+    async with main.lifespan(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(boot())
+print(json.dumps({{"import_ms": (imported - start) * 1000, "lifespan_ms": (ready - imported) * 1000, "chain_stack": loaded}}))
+"""
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT.format(chain_stack=CHAIN_STACK)],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    # main's own imports are indented one level below it and listed before it;
+    # anything after is imported later by the worker threads
+    top = {}
+    for match in IMPORTTIME.finditer(result.stderr):
+        _, cumulative, indent, name = match.groups()
+        if len(indent) == 1 and name == "main":
+            break
+        if len(indent) == 3:
+            top[name] = top.get(name, 0) + int(cumulative) / 1000
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report, top
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail if the median import time exceeds this")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    reports, tops = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.runs):
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, f'boot{n}.db')}",
+                CHAIN_SYNC_INTERVAL="3600",
+            )
+            report, top = run_once(env)
+            reports.append(report)
+            tops.append(top)
+
+    import_ms = statistics.median(r["import_ms"] for r in reports)
+    lifespan_ms = statistics.median(r["lifespan_ms"] for r in reports)
+    chain_stack = sorted({m for r in reports for m in r["chain_stack"]})
+    print(f"import main: {import_ms:7.1f} ms (median of {args.runs})")
+    print(f"lifespan:    {lifespan_ms:7.1f} ms (migrations on a fresh database, worker threads)")
+    heaviest = sorted(tops[-1].items(), key=lambda item: -item[1])[:args.top]
+    print("heaviest imports of main: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in heaviest))
+
+    failed = False
+    if chain_stack:
+        print(f"FAIL importing main pulls in the chain stack: {', '.join(chain_stack)}")
+        failed = True
+    if args.budget_ms and import_ms > args.budget_ms:
+        print(f"FAIL import time {import_ms:.1f} ms over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Idle stream connections per worker, and fan-out latency once they are open.
+
+    python -m bench.stream [--clients 10000] [--pools 100]
+
+Run from the backend directory. Starts one uvicorn worker on a fresh SQLite
+file, opens `--clients` SSE connections to /pools/stream (spread over
+`--pools` pools, raw sockets so the client side stays cheap) and reports the
+worker's memory per connection. A join then has to reach every subscriber of
+its pool. Also checks in-process that a subscriber which stops reading is
+evicted once its queue is full. Exits 1 if a connection is refused, an event
+goes missing or the slow subscriber is not evicted.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+import migrations
+import stream
+from database import build_engine
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_kib(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def request(port, method, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+class Client:
+    def __init__(self, pool_id):
+        self.pool_id = pool_id
+        self.reader = self.writer = None
+        self.received = None
+
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(f"GET /pools/stream?pool={self.pool_id} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+        await self.writer.drain()
+        while not (await self.reader.readline()).startswith(b"event: subscribed"):
+            pass
+
+    async def wait_for(self, event):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if line.startswith(event):
+                self.received = time.perf_counter()
+                return
+
+
+async def run_server_bench(port, pid, clients, pools):
+    baseline = rss_kib(pid)
+    conns = [Client(1 + n % pools) for n in range(clients)]
+    start = time.perf_counter()
+    for i in range(0, clients, 500):
+        await asyncio.gather(*(c.connect(port) for c in conns[i:i + 500]))
+    connected = time.perf_counter() - start
+    await asyncio.sleep(1)
+    loaded = rss_kib(pid)
+
+    # A join on pool 1 reaches every subscriber of pool 1
+    target = [c for c in conns if c.pool_id == 1]
+    waiters = [asyncio.create_task(c.wait_for(b"event: member")) for c in target]
+    body = json.dumps({"pool_id": 1, "wallet_address": "BENCH", "is_active": True, "deposited_amount": 0})
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    sent = time.perf_counter()
+    writer.write(
+        f"POST /join-pool HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}".encode()
+    )
+    await writer.drain()
+    await asyncio.wait(waiters, timeout=10)
+    writer.close()
+    latencies = sorted((c.received - sent) * 1000 for c in target if c.received is not None)
+
+    _, stats = await request(port, "GET", "/stream/stats")
+    for c in conns:
+        c.writer.close()
+    return {
+        "connected_s": connected,
+        "rss_per_client_kib": (loaded - baseline) / clients,
+        "rss_mib": loaded / 1024,
+        "subscribers": len(target),
+        "latencies": latencies,
+        "stats": json.loads(stats),
+    }
+
+
+async def check_eviction():
+    hub = stream.Hub(queue_size=4)
+    hub.bind(asyncio.get_running_loop())
+    slow = hub.subscribe([stream.pool_topic(1)])
+    fast = hub.subscribe([stream.pool_topic(1)])
+    for n in range(10):
+        hub.publish([((stream.pool_topic(1),), "pool", {"pool_id": 1, "n": n})])
+        await fast.get()
+    return slow.closed == "slow consumer" and fast.closed is None and hub.stats["evicted"] == 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--pools", type=int, default=100)
+    args = parser.parse_args()
+
+    ok = asyncio.run(check_eviction())
+    print(f"slow subscriber evicted at a full queue: {'yes' if ok else 'NO'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'stream.db')}"
+        engine = build_engine(url, "production", False)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, "
+                    "cycle_duration, renewal_timestamp, status) VALUES (:id, 'Stream', 'A', 1000000, 10, 86400, 0, 0)"
+                ),
+                [{"id": i + 1} for i in range(args.pools)],
+            )
+        engine.dispose()
+
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=url, CHAIN_SYNC_INTERVAL="3600", STREAM_MAX_CLIENTS=str(args.clients + 10))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+             "--no-access-log", "--backlog", "4096"],
+            env=env,
+        )
+        try:
+            deadline = time.time() + 30
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.time() > deadline or server.poll() is not None:
+                        print("FAIL server did not start")
+                        sys.exit(1)
+                    time.sleep(0.2)
+            result = asyncio.run(run_server_bench(port, server.pid, args.clients, args.pools))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    latencies = result["latencies"]
+    print(f"{args.clients} idle SSE clients connected in {result['connected_s']:.1f} s")
+    print(f"worker RSS {result['rss_mib']:.0f} MiB, {result['rss_per_client_kib']:.1f} KiB per idle client")
+    if latencies:
+        print(
+            f"join fan-out to {result['subscribers']} subscribers: p50 {statistics.median(latencies):.1f} ms, "
+            f"max {latencies[-1]:.1f} ms"
+        )
+    print(f"hub: {result['stats']}")
+
+    if result["stats"]["clients"] < args.clients or result["stats"]["rejected"]:
+        print("FAIL not every client stayed subscribed")
+        ok = False
+    if len(latencies) != result["subscribers"]:
+        print(f"FAIL {result['subscribers'] - len(latencies)} subscribers missed the join")
+        ok = False
+    if not ok:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Marker for "not in cache", since None can be a legitimate cached value
+MISSING = object()
+
+
+class CacheBackend:
+    """Minimal interface every cache backend implements."""
+
+    evictions = 0
+    blocking = False  # True if calls go over the network; the async paths then run them in a thread
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU with a per-entry TTL. Thread-safe."""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """Shared backend so every worker sees the same entries and invalidations."""
+
+    blocking = True
+
+    def __init__(self, url, ttl=30.0, prefix="subshare:"):
+        import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class FakeSharedCache(CacheBackend):
+    """
+    Local stand-in for a shared backend, for tests. Instances built on the same
+    `store` dict behave like several workers talking to one server, and values
+    go through JSON just like they would with Redis.
+    """
+
+    def __init__(self, store=None, ttl=30.0):
+        self.store = {} if store is None else store
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = self.store.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, raw = entry
+        if expires_at < time.monotonic():
+            self.store.pop(key, None)
+            return MISSING
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.store[key] = (time.monotonic() + self.ttl, json.dumps(value))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def clear(self):
+        self.store.clear()
+
+
+class ReadThroughCache:
+    """
+    Read-through wrapper around a backend.
+
+    Concurrent misses on the same key are collapsed into a single loader call
+    (the other callers wait for its result). An invalidation that lands while a
+    load is in flight bumps the key's generation, so the possibly stale result
+    is returned to the waiting callers but not stored. Generations only exist
+    while a load of the key is in flight.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> _Flight
+        self._ainflight = {}  # key -> _AsyncFlight, for loads started from the event loop
+        self._generations = {}  # key -> int
+
+    def get_or_load(self, key, loader):
+        value = self.backend.get(key)
+        if value is not MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight(self._generations.get(key, 0))
+                self._inflight[key] = flight
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            with self._lock:
+                self.loads += 1
+            value = loader()
+        except BaseException as e:
+            flight.fail(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                fresh = self._landed(key, flight)
+
+        # Misses (None) are not cached so a newly created row shows up at once
+        if value is not None and fresh:
+            self.backend.set(key, value)
+        flight.resolve(value)
+        return value
+
+    async def aget_or_load(self, key, loader):
+        """Same as get_or_load() for coroutine loaders called from the event loop."""
+        value = await self._call(self.backend.get, key)
+        if value is not MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+            flight = self._ainflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _AsyncFlight(self._generations.get(key, 0))
+                self._ainflight[key] = flight
+                self.loads += 1
+
+        if not leader:
+            # shield() so a cancelled waiter does not cancel the shared load
+            return await asyncio.shield(flight.future)
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            flight.fail(e)
+            raise
+        finally:
+            with self._lock:
+                self._ainflight.pop(key, None)
+                fresh = self._landed(key, flight)
+
+        if value is not None and fresh:
+            await self._call(self.backend.set, key, value)
+        flight.future.set_result(value)
+        return value
+
+    def _landed(self, key, flight):
+        # Under self._lock, once `flight` is out of the in-flight maps: True if no
+        # invalidation hit it. The generation goes once no load of the key is left.
+        fresh = self._generations.get(key, 0) == flight.generation
+        if key not in self._inflight and key not in self._ainflight:
+            self._generations.pop(key, None)
+        return fresh
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _bump(self, keys):
+        with self._lock:
+            for key in keys:
+                # Only a load in flight can store a stale value
+                if key in self._inflight or key in self._ainflight:
+                    self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate(self, *keys):
+        self._bump(keys)
+        self.backend.delete(*keys)
+
+    async def ainvalidate(self, *keys):
+        """invalidate() for the event loop."""
+        self._bump(keys)
+        await self._call(self.backend.delete, *keys)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.backend.evictions,
+        }
+
+
+class _Flight:
+    def __init__(self, generation):
+        self.generation = generation
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def resolve(self, value):
+        self._value = value
+        self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class _AsyncFlight:
+    def __init__(self, generation):
+        self.generation = generation
+        self.future = asyncio.get_running_loop().create_future()
+
+    def fail(self, error):
+        self.future.set_exception(error)
+        # Mark as retrieved so a load nobody waited on does not log a warning
+        self.future.exception()
+
+
+def pool_key(pool_id):
+    return f"pool:{pool_id}"
+
+
+def user_key(wallet_address):
+    return f"user:{wallet_address}"
+
+
+def build_cache():
+    ttl = float(os.getenv("CACHE_TTL", "30"))
+    kind = os.getenv("CACHE_BACKEND", "lru")
+    if kind == "redis":
+        backend = RedisCache(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    elif kind == "fake":
+        backend = FakeSharedCache(ttl=ttl)
+    else:
+        backend = LRUCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "4096")), ttl=ttl)
+    return ReadThroughCache(backend)
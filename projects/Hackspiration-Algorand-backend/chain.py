@@ -0,0 +1,274 @@
+"""
+Process-wide chain context: algod/indexer clients on pooled HTTP connections,
+the deployer account resolved once, and short-lived cached suggested params.
+
+Everything that talks to the chain (deployments, renewals, deposit checks)
+goes through get_chain() instead of building clients per call.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from urllib import parse
+
+import httpx
+from algosdk import constants, error
+from algosdk.v2client import algod, indexer
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/v2"
+
+KMD_WALLET = os.getenv("KMD_WALLET", "unencrypted-default-wallet")
+
+
+def _funded(account):
+    # The localnet dispenser: the online account holding the genesis Algos
+    return account["status"] != "Offline" and account["amount"] > 1_000_000_000
+
+
+def kmd_account(algod_client, wallet=KMD_WALLET, predicate=_funded):
+    """First account of a KMD wallet matching `predicate`; KMD runs next to algod (KMD_PORT, default 4002)."""
+    from algokit_utils import get_kmd_client_from_algod_client, get_kmd_wallet_account
+
+    kmd_client = get_kmd_client_from_algod_client(algod_client)
+    account = get_kmd_wallet_account(algod_client, kmd_client, wallet, predicate)
+    if account is None:
+        raise RuntimeError(f"No matching account in KMD wallet {wallet!r}")
+    return account
+
+
+class ChainStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "algod_calls": 0,
+            "indexer_calls": 0,
+            "kmd_lookups": 0,
+            "params_hits": 0,
+            "params_misses": 0,
+        }
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def _request(http, stats, counter, base_url, auth_header, token, extra_headers, method, requrl, params, data, headers, timeout):
+    # Mirrors algosdk's urllib-based request code, but on a keep-alive httpx pool
+    header = {"User-Agent": "py-algorand-sdk"}
+    if extra_headers:
+        header.update(extra_headers)
+    if headers:
+        header.update(headers)
+    if requrl not in constants.no_auth and token:
+        header[auth_header] = token
+    if requrl not in constants.unversioned_paths:
+        requrl = API_PREFIX + requrl
+    if params:
+        requrl = requrl + "?" + parse.urlencode(params)
+
+    stats.incr(counter)
+    with metrics.span(counter.split("_")[0], f"{method.upper()} {metrics.endpoint_label(requrl)}"):
+        return http.request(method, base_url + requrl, headers=header, content=data, timeout=timeout)
+
+
+class PooledAlgodClient(algod.AlgodClient):
+    def __init__(self, algod_token, algod_address, headers=None, http=None, stats=None):
+        super().__init__(algod_token, algod_address, headers)
+        self.http = http or httpx.Client()
+        self.stats = stats or ChainStats()
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json", timeout=30):
+        resp = _request(
+            self.http, self.stats, "algod_calls", self.algod_address, constants.algod_auth_header,
+            self.algod_token, self.headers, method, requrl, params, data, headers, timeout,
+        )
+        if resp.status_code >= 400:
+            body = {}
+            message = resp.text
+            try:
+                body = resp.json()
+                message = body["message"]
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise error.AlgodHTTPError(message, resp.status_code, body.get("data") if isinstance(body, dict) else None)
+        if response_format == "json":
+            if not resp.content:
+                return {}
+            return resp.json()
+        return resp.content
+
+
+class PooledIndexerClient(indexer.IndexerClient):
+    def __init__(self, indexer_token, indexer_address, headers=None, http=None, stats=None):
+        super().__init__(indexer_token, indexer_address, headers)
+        self.http = http or httpx.Client()
+        self.stats = stats or ChainStats()
+
+    def indexer_request(self, method, requrl, params=None, data=None, headers=None, timeout=30):
+        resp = _request(
+            self.http, self.stats, "indexer_calls", self.indexer_address, constants.indexer_auth_header,
+            self.indexer_token, self.headers, method, requrl, params, data, headers, timeout,
+        )
+        if resp.status_code >= 400:
+            message = resp.text
+            try:
+                message = json.loads(message)["message"]
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise error.IndexerHTTPError(message)
+        return resp.json()
+
+
+def _algod_config():
+    # Same env names and localnet defaults as algokit_utils.get_algod_client()
+    server = os.getenv("ALGOD_SERVER", "http://localhost")
+    port = os.getenv("ALGOD_PORT", "4001")
+    token = os.getenv("ALGOD_TOKEN", "a" * 64)
+    return token, f"{server}:{port}" if port else server
+
+
+def _indexer_config():
+    server = os.getenv("INDEXER_SERVER", "http://localhost")
+    port = os.getenv("INDEXER_PORT", "8980")
+    token = os.getenv("INDEXER_TOKEN", "a" * 64)
+    return token, f"{server}:{port}" if port else server
+
+
+class ChainContext:
+    """
+    Shared clients and cached chain state for the whole process.
+
+    Clients are built on first use and reuse one httpx connection pool each.
+    The deployer account is resolved once (DEPLOYER_MNEMONIC, or the localnet
+    KMD wallet). Suggested params are cached for `params_ttl` seconds; they are
+    valid for 1000 rounds, so a few seconds of reuse is always safe.
+    """
+
+    def __init__(self, algod_client=None, indexer_client=None, deployer=None, params_ttl=None):
+        self.stats = ChainStats()
+        self.params_ttl = float(os.getenv("SUGGESTED_PARAMS_TTL", "5")) if params_ttl is None else params_ttl
+        self._algod = algod_client
+        self._indexer = indexer_client
+        self._deployer = deployer
+        self._params = None
+        self._params_at = 0.0
+        # Re-entrant: resolving the deployer builds the algod client under the same lock
+        self._lock = threading.RLock()
+        self._http = None
+
+    def _pool(self):
+        if self._http is None:
+            limits = httpx.Limits(
+                max_connections=int(os.getenv("CHAIN_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("CHAIN_HTTP_MAX_KEEPALIVE", "10")),
+            )
+            self._http = httpx.Client(limits=limits)
+        return self._http
+
+    @property
+    def algod(self):
+        if self._algod is None:
+            with self._lock:
+                if self._algod is None:
+                    token, address = _algod_config()
+                    self._algod = PooledAlgodClient(token, address, http=self._pool(), stats=self.stats)
+        return self._algod
+
+    @property
+    def indexer(self):
+        if self._indexer is None:
+            with self._lock:
+                if self._indexer is None:
+                    token, address = _indexer_config()
+                    self._indexer = PooledIndexerClient(token, address, http=self._pool(), stats=self.stats)
+        return self._indexer
+
+    @property
+    def deployer(self):
+        if self._deployer is None:
+            with self._lock:
+                if self._deployer is None:
+                    self._deployer = self._resolve_deployer()
+        return self._deployer
+
+    def _resolve_deployer(self):
+        from algokit_utils import Account
+        from algosdk.mnemonic import to_private_key
+
+        mnemonic = os.getenv("DEPLOYER_MNEMONIC")
+        if mnemonic:
+            return Account(private_key=to_private_key(mnemonic))
+        # Localnet/testnet MVP: the default KMD wallet
+        self.stats.incr("kmd_lookups")
+        with metrics.span("kmd", "get_wallet_account"):
+            return kmd_account(self.algod)
+
+    def suggested_params(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._params is not None and now - self._params_at < self.params_ttl:
+                self.stats.incr("params_hits")
+                return self._params
+        params = self.algod.suggested_params()
+        with self._lock:
+            self._params, self._params_at = params, time.monotonic()
+        self.stats.incr("params_misses")
+        return params
+
+    def invalidate_params(self):
+        # Call after a submission fails with a round/fee error
+        with self._lock:
+            self._params = None
+
+    def verify_payment(self, txid, sender, receiver, amount):
+        """True if `txid` is a confirmed payment of at least `amount` from sender to receiver."""
+        try:
+            # Recently confirmed transactions are still served by algod
+            info = self.algod.pending_transaction_info(txid)
+            txn = info.get("txn", {}).get("txn", {})
+            confirmed = info.get("confirmed-round", 0) > 0
+            paid = (txn.get("type"), txn.get("snd"), txn.get("rcv"), txn.get("amt", 0))
+        except error.AlgodHTTPError:
+            # Older ones only through the indexer
+            try:
+                txn = self.indexer.transaction(txid)["transaction"]
+            except error.IndexerHTTPError:
+                return False
+            payment = txn.get("payment-transaction", {})
+            confirmed = txn.get("confirmed-round", 0) > 0
+            paid = (txn.get("tx-type"), txn.get("sender"), payment.get("receiver"), payment.get("amount", 0))
+        return confirmed and paid[:3] == ("pay", sender, receiver) and paid[3] >= amount
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+
+_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_chain():
+    global _chain
+    if _chain is None:
+        with _chain_lock:
+            if _chain is None:
+                _chain = ChainContext()
+    return _chain
+
+
+def set_chain(chain):
+    """Swap the process-wide context, e.g. for one built on fakes.FakeAlgodClient."""
+    global _chain
+    with _chain_lock:
+        _chain = chain
@@ -0,0 +1,447 @@
+"""
+Indexer-driven sync of pool memberships and deposits.
+
+One worker reads the app calls confirmed since the last checkpoint: a
+single paged search over that round range, one query per page whatever the
+number of pools. It keeps the calls to known SubSharePool apps and decodes
+them by ABI selector. The decoded calls become bulk upserts on
+pool_members/pools and deposit ledger events (ledger.py), committed together
+with the new checkpoint round, so each round is applied exactly once.
+
+A fresh database has no checkpoint: the first pass stores the tip (or
+SYNC_START_ROUND, to rebuild a database from chain history) and syncs on from
+there. Pools are deployed after that, so their calls all come after it.
+
+    python chain_sync.py                        # sync once from the indexer
+    python chain_sync.py record FIXTURE.json    # save indexer pages as a fixture for fakes.FakeIndexer
+"""
+import base64
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, select, update
+
+import ledger
+import metrics
+import models
+from database import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "indexer"
+
+# Round a fresh database starts syncing after; unset: the indexer tip
+SYNC_START_ROUND = int(os.environ["SYNC_START_ROUND"]) if os.getenv("SYNC_START_ROUND") else None
+
+# Calls the sync understands, across both contract variants
+METHODS = {
+    "opt_in()void": "opt_in",
+    "join(pay)void": "join",
+    "deposit_share(pay)void": "deposit_share",
+    "withdraw()void": "withdraw",
+    "exit_next_cycle()void": "exit_next_cycle",
+    "refund_batch(uint64,uint64)void": "refund_batch",
+    "dissolve_pool()void": "dissolve_pool",
+    "payout()void": "payout",
+    "renew_cycle()void": "renew_cycle",
+}
+
+
+def _selectors():
+    from algosdk import abi
+
+    return {abi.Method.from_signature(sig).get_selector(): name for sig, name in METHODS.items()}
+
+
+def _delta_uints(deltas):
+    # {"key": b64, "value": {"action": 2, "uint": n}} -> {key: n}; action 2 is "set uint"
+    return {
+        base64.b64decode(d["key"]).decode(errors="replace"): d["value"].get("uint", 0)
+        for d in deltas or []
+        if d["value"].get("action") == 2
+    }
+
+
+class MemberChange:
+    __slots__ = ("is_active", "deposited", "payments", "txid", "round")
+
+    def __init__(self):
+        self.is_active = None  # None: unchanged
+        self.deposited = None  # absolute amount, or None: unchanged
+        self.payments = []  # (amount, txid, round) added on top of `deposited` (or of the stored balance)
+        self.txid = None  # call that last set `deposited`
+        self.round = None
+
+
+class ChangeSet:
+    """
+    Net effect of a run of decoded calls. Member flags are applied with a
+    handful of executemany statements; deposits become deposit ledger events.
+    """
+
+    def __init__(self):
+        self.members = {}  # (pool_id, wallet) -> MemberChange
+        self.pools = {}  # pool_id -> {column: value}
+        self.calls = 0
+
+    def member(self, pool_id, wallet):
+        key = (pool_id, wallet)
+        if key not in self.members:
+            self.members[key] = MemberChange()
+        return self.members[key]
+
+    def set_deposit(self, pool_id, wallet, amount, txid=None, round=None):
+        change = self.member(pool_id, wallet)
+        change.deposited, change.payments = amount, []
+        change.txid, change.round = txid, round
+
+    def events(self, db):
+        """Ledger events for the deposit changes: refunds, payments, and corrections to absolute on-chain deposits."""
+        absolute = [key for key, c in self.members.items() if c.deposited]
+        # deposited_amount on chain is gross: billing's charges come off the balance, not off it
+        current = ledger.deposited(db, absolute) if absolute else {}
+        events = []
+        for (pool_id, wallet), c in self.members.items():
+            member = {"pool_id": pool_id, "wallet_address": wallet}
+            if c.deposited == 0:
+                events.append({**member, "kind": ledger.REFUND, "amount": None, "txid": c.txid, "round": c.round})
+            elif c.deposited:
+                delta = c.deposited - current[(pool_id, wallet)]
+                if delta:
+                    kind = ledger.DEPOSIT if delta > 0 else ledger.ADJUST
+                    events.append({**member, "kind": kind, "amount": delta, "txid": c.txid, "round": c.round})
+            for amount, txid, round in c.payments:
+                events.append({**member, "kind": ledger.DEPOSIT, "amount": amount, "txid": txid, "round": round})
+        return events
+
+    def apply(self, db):
+        members = models.PoolMember.__table__
+        if self.members:
+            # Rows first (a no-op for known members), then the flags in one executemany
+            db.execute(
+                dialect_insert(db, members).on_conflict_do_nothing(index_elements=["pool_id", "wallet_address"]),
+                [
+                    {"pool_id": pool_id, "wallet_address": wallet, "is_active": True, "deposited_amount": 0}
+                    for pool_id, wallet in self.members
+                ],
+            )
+            flags = [(key, c.is_active) for key, c in self.members.items() if c.is_active is not None]
+            if flags:
+                db.execute(
+                    update(members)
+                    .where(members.c.pool_id == bindparam("b_pool_id"), members.c.wallet_address == bindparam("b_wallet"))
+                    .values(is_active=bindparam("b_value")),
+                    [{"b_pool_id": pool_id, "b_wallet": wallet, "b_value": value} for (pool_id, wallet), value in flags],
+                )
+            ledger.append(db, self.events(db))
+
+        pools = models.Pool.__table__
+        for columns in {tuple(sorted(values)) for values in self.pools.values()}:
+            db.execute(
+                update(pools).where(pools.c.id == bindparam("b_id")).values(**{c: bindparam(f"b_{c}") for c in columns}),
+                [
+                    {"b_id": pool_id, **{f"b_{c}": v for c, v in values.items()}}
+                    for pool_id, values in self.pools.items()
+                    if tuple(sorted(values)) == columns
+                ],
+            )
+
+
+class ChainSync:
+    """
+    Keeps pool_members/pools in line with the chain.
+
+    Each pass reads the indexer tip and pages through the app calls from the
+    checkpoint up to it. A page that ends mid-round carries that round over to
+    the next page, so checkpoints always fall on round boundaries. `indexer` is injectable:
+    fakes.FakeIndexer replays a recorded fixture offline.
+
+    With several replicas, pass a leases.LeaderLease: only its holder syncs.
+    Each commit also moves the checkpoint only from the round the pass started
+    at, so a replica that lost its lease mid-pass cannot apply a page twice.
+    """
+
+    def __init__(self, session_factory, indexer=None, page_size=1000, interval=5.0, on_synced=None, leader=None, start_round=SYNC_START_ROUND):
+        self.session_factory = session_factory
+        self.start_round = start_round
+        self._indexer = indexer
+        self.page_size = page_size
+        self.interval = interval
+        self.on_synced = on_synced  # called with (pool ids, wallets) touched by each commit
+        self.leader = leader
+        self._selectors = None
+        self.stats = {"txns_seen": 0, "calls_applied": 0, "pages": 0, "commits": 0, "last_round": 0, "lag_rounds": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def selectors(self):
+        # Built on first decode: algosdk stays out of the import path
+        if self._selectors is None:
+            self._selectors = _selectors()
+        return self._selectors
+
+    @property
+    def indexer(self):
+        if self._indexer is None:
+            from chain import get_chain
+
+            self._indexer = get_chain().indexer
+        return self._indexer
+
+    # ------------------------------------------------------------------ #
+    # Checkpoint and app ids
+    # ------------------------------------------------------------------ #
+
+    def checkpoint(self, db):
+        """Last synced round, or None before the first sync."""
+        row = db.get(models.SyncCheckpoint, CHECKPOINT)
+        return row.last_round if row else None
+
+    def _save_checkpoint(self, db, last_round, expected):
+        """Moves the checkpoint from `expected` to `last_round`. False if another worker moved it first."""
+        table = models.SyncCheckpoint.__table__
+        stmt = dialect_insert(db, table).values(name=CHECKPOINT, last_round=last_round, updated_at=datetime.utcnow())
+        result = db.execute(stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"last_round": stmt.excluded.last_round, "updated_at": stmt.excluded.updated_at},
+            where=table.c.last_round == expected,
+        ))
+        return result.rowcount == 1
+
+    def known_apps(self, db):
+        return {app_id: pool_id for pool_id, app_id in db.query(models.Pool.id, models.Pool.app_id).filter(models.Pool.app_id.isnot(None))}
+
+    # ------------------------------------------------------------------ #
+    # Decoding
+    # ------------------------------------------------------------------ #
+
+    def decode(self, txns, apps, changes):
+        """Folds a run of indexer transactions into `changes`. Returns the number of calls used."""
+        used = 0
+        payments = self._payments(txns, apps)
+        for txn in txns:
+            call = txn.get("application-transaction")
+            if call is None or call.get("application-id") not in apps:
+                continue
+            pool_id = apps[call["application-id"]]
+            sender = txn["sender"]
+            args = call.get("application-arguments") or []
+            method = self.selectors.get(base64.b64decode(args[0])[:4]) if args else None
+            if method is None and call.get("on-completion") != "optin":
+                continue
+            used += 1
+
+            local = {d["address"]: _delta_uints(d["delta"]) for d in txn.get("local-state-delta") or []}
+            txid, round = txn.get("id"), txn.get("confirmed-round")
+            if method in ("opt_in", "join") or call.get("on-completion") == "optin":
+                changes.member(pool_id, sender).is_active = True
+            elif method == "deposit_share" and "deposited_amount" not in local.get(sender, {}):
+                # Box variant: no local delta, the deposit is the payment argument
+                changes.member(pool_id, sender).payments.extend(
+                    (amount, payment_txid, round) for amount, payment_txid in payments.get(txn.get("group"), ())
+                )
+            elif method == "exit_next_cycle":
+                changes.member(pool_id, sender).is_active = False
+
+            # Local-state variant: deltas carry the members' new values outright
+            for address, values in local.items():
+                if "deposited_amount" in values:
+                    changes.set_deposit(pool_id, address, values["deposited_amount"], txid, round)
+                if "is_active" in values:
+                    changes.member(pool_id, address).is_active = bool(values["is_active"])
+
+            # Refunds (withdraw, refund_batch) show up as inner payments back to members
+            if method in ("withdraw", "refund_batch"):
+                for inner in txn.get("inner-txns") or []:
+                    receiver = inner.get("payment-transaction", {}).get("receiver")
+                    if receiver:
+                        changes.set_deposit(pool_id, receiver, 0, txid, round)
+
+            updates = {
+                column: value for column, value in _delta_uints(txn.get("global-state-delta")).items()
+                if column in ("status", "renewal_timestamp")
+            }
+            if updates:
+                changes.pools.setdefault(pool_id, {}).update(updates)
+        changes.calls += used
+        return used
+
+    def _payments(self, txns, apps):
+        """
+        {group: [(amount, txid)]} of the payments grouped with box-variant
+        deposit_share calls in `txns`: one paged query per app over the rounds
+        involved, payments to the app's address. The payment's txid is the one
+        /deposit records, so the ledger drops the second copy.
+        """
+        from algosdk.logic import get_application_address
+
+        selector = next(s for s, name in self.selectors.items() if name == "deposit_share")
+        wanted = {}  # app_id -> (groups, first round, last round)
+        for txn in txns:
+            call = txn.get("application-transaction")
+            args = (call or {}).get("application-arguments") or []
+            group = txn.get("group")
+            if not group or not args or call.get("application-id") not in apps or base64.b64decode(args[0])[:4] != selector:
+                continue
+            groups, first, last = wanted.get(call["application-id"], (set(), txn["confirmed-round"], txn["confirmed-round"]))
+            groups.add(group)
+            wanted[call["application-id"]] = (groups, min(first, txn["confirmed-round"]), max(last, txn["confirmed-round"]))
+
+        payments = {}
+        for app_id, (groups, first, last) in wanted.items():
+            for pay in self._search(
+                txn_type="pay", address=get_application_address(app_id), address_role="receiver", min_round=first, max_round=last,
+            ):
+                if pay.get("group") in groups:
+                    payments.setdefault(pay["group"], []).append((pay["payment-transaction"]["amount"], pay.get("id")))
+        return payments
+
+    def _search(self, **params):
+        """Every transaction of a paged indexer search."""
+        next_page = None
+        while True:
+            page = self.indexer.search_transactions(limit=self.page_size, next_page=next_page, **params)
+            self.stats["pages"] += 1
+            yield from page.get("transactions", [])
+            next_page = page.get("next-token")
+            if not page.get("transactions") or not next_page:
+                return
+
+    # ------------------------------------------------------------------ #
+    # Paging
+    # ------------------------------------------------------------------ #
+
+    def sync_once(self):
+        """Syncs up to the current indexer tip. Returns the number of calls applied."""
+        db = self.session_factory()
+        try:
+            start = self.checkpoint(db)
+            apps = self.known_apps(db)
+            tip = self.indexer.health()["round"]
+            if start is None:
+                # Stored right away, apps or not: pools deployed from here on are synced from their first call
+                if apps and self.start_round is None:
+                    logger.warning(f"No sync checkpoint, syncing {len(apps)} existing pools from the tip ({tip}); set SYNC_START_ROUND to replay history")
+                self._save_checkpoint(db, tip if self.start_round is None else self.start_round, None)
+                db.commit()
+                start = self.checkpoint(db)
+        finally:
+            db.close()
+        self.stats["lag_rounds"] = max(0, tip - start)
+        if tip <= start or not apps:
+            return 0
+
+        applied = 0
+        expected = start
+        for txns, done_round in self._calls(start, tip):
+            used = self._commit(txns, apps, expected, done_round)
+            if used is None:
+                logger.info(f"Checkpoint moved past round {expected} by another worker, ending this pass")
+                return applied
+            applied += used
+            expected = done_round
+        return applied
+
+    def _calls(self, start, tip):
+        """(app calls, last complete round) per page of every app call on the network."""
+        carry = []
+        next_page = None
+        while True:
+            page = self.indexer.search_transactions(
+                txn_type="appl", min_round=start + 1, max_round=tip, limit=self.page_size, next_page=next_page,
+            )
+            txns = carry + page.get("transactions", [])
+            self.stats["pages"] += 1
+            self.stats["txns_seen"] += len(page.get("transactions", []))
+            next_page = page.get("next-token") if page.get("transactions") else None
+
+            if next_page:
+                # Hold back the last (possibly partial) round for the next page
+                last = txns[-1]["confirmed-round"]
+                carry = [t for t in txns if t["confirmed-round"] == last]
+                txns = [t for t in txns if t["confirmed-round"] != last]
+                if txns:
+                    yield txns, last - 1
+            else:
+                yield txns, tip
+                return
+
+    def _commit(self, txns, apps, expected, done_round):
+        changes = ChangeSet()
+        used = self.decode(txns, apps, changes)
+        db = self.session_factory()
+        try:
+            changes.apply(db)
+            if not self._save_checkpoint(db, done_round, expected):
+                db.rollback()
+                return None
+            db.commit()
+        finally:
+            db.close()
+        self.stats["calls_applied"] += used
+        self.stats["commits"] += 1
+        self.stats["last_round"] = done_round
+        if self.on_synced is not None and (changes.members or changes.pools):
+            pool_ids = {pool_id for pool_id, _ in changes.members} | set(changes.pools)
+            self.on_synced(pool_ids, {wallet for _, wallet in changes.members})
+        return used
+
+    # ------------------------------------------------------------------ #
+    # Worker thread
+    # ------------------------------------------------------------------ #
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            try:
+                if self.leader is None or self.leader.acquire():
+                    with metrics.span("job", "chain_sync"):
+                        self.sync_once()
+                delay = self.interval
+            except Exception as e:
+                # Back off while the indexer is unreachable
+                logger.warning(f"Chain sync failed: {e}")
+                delay = min(delay * 2, 60.0)
+            self._stop.wait(delay)
+
+
+def record(path, indexer, min_round=0, page_size=1000):
+    """Saves indexer app-call pages (and the tip) as a fakes.FakeIndexer fixture."""
+    tip = indexer.health()["round"]
+    txns, next_page = [], None
+    while True:
+        page = indexer.search_transactions(txn_type="appl", min_round=min_round, max_round=tip, limit=page_size, next_page=next_page)
+        txns.extend(page.get("transactions", []))
+        next_page = page.get("next-token")
+        if not page.get("transactions") or not next_page:
+            break
+    with open(path, "w") as f:
+        json.dump({"round": tip, "transactions": txns}, f, indent=1)
+    return len(txns)
+
+
+if __name__ == "__main__":
+    from chain import get_chain
+    from database import SessionLocal
+
+    if sys.argv[1:2] == ["record"]:
+        print(f"Recorded {record(sys.argv[2], get_chain().indexer)} transactions to {sys.argv[2]}")
+    else:
+        sync = ChainSync(SessionLocal)
+        print(f"Applied {sync.sync_once()} calls, now at round {sync.stats['last_round']}")
@@ -6,6 +6,7 @@ import beaker
 STATUS_FORMING = Int(0)
 STATUS_ACTIVE = Int(1)
 STATUS_DISSOLVED = Int(2)
+STATUS_UNDERFUNDED = Int(3)
 
 class SubShareState:
     # Global State
@@ -28,6 +29,8 @@ app = Application("SubSharePool", state=SubShareState())
 @app.create
 def create(subscription_name: abi.String, admin_address: abi.Address, cost_per_cycle: abi.Uint64, max_members: abi.Uint64, cycle_duration: abi.Uint64):
     return Seq(
+        # cycles_due() divides by it
+        Assert(cycle_duration.get() > Int(0)),
         app.state.subscription_name.set(subscription_name.get()),
         app.state.admin_address.set(admin_address.get()),
         app.state.cost_per_cycle.set(cost_per_cycle.get()),
@@ -57,34 +60,53 @@ def deposit_share(payment: abi.PaymentTransaction):
         app.state.total_deposited.set(app.state.total_deposited + payment.get().amount()),
     )
 
+@Subroutine(TealType.uint64)
+def cycles_due():
+    # Deadlines passed since renewal_timestamp, including the current one
+    return If(
+        Global.latest_timestamp() >= app.state.renewal_timestamp,
+        (Global.latest_timestamp() - app.state.renewal_timestamp) / app.state.cycle_duration + Int(1),
+        Int(0),
+    )
+
+@Subroutine(TealType.none)
+def settle(cycles):
+    # Pays as many of `cycles` as the deposits cover in one inner payment and
+    # jumps renewal_timestamp past all of them; a shortfall marks the pool underfunded
+    paid = ScratchVar(TealType.uint64)
+    return Seq(
+        paid.store(app.state.total_deposited / app.state.cost_per_cycle),
+        If(paid.load() > cycles).Then(paid.store(cycles)),
+        If(paid.load() > Int(0)).Then(
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: app.state.admin_address,
+                TxnField.amount: paid.load() * app.state.cost_per_cycle,
+            })
+        ),
+        app.state.total_deposited.set(app.state.total_deposited - paid.load() * app.state.cost_per_cycle),
+        app.state.renewal_timestamp.set(app.state.renewal_timestamp + cycles * app.state.cycle_duration),
+        app.state.status.set(If(paid.load() == cycles, STATUS_ACTIVE, STATUS_UNDERFUNDED)),
+    )
+
 @app.external
 def payout():
+    due = ScratchVar(TealType.uint64)
     return Seq(
-        Assert(app.state.total_deposited == app.state.cost_per_cycle),
-        InnerTxnBuilder.Execute({
-            TxnField.type_enum: TxnType.Payment,
-            TxnField.receiver: app.state.admin_address,
-            TxnField.amount: app.state.total_deposited,
-        }),
-        app.state.status.set(STATUS_ACTIVE),
-        app.state.renewal_timestamp.set(app.state.renewal_timestamp + app.state.cycle_duration),
-        app.state.total_deposited.set(Int(0)),
+        # A dissolved pool only pays members back (withdraw/refund_batch)
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(app.state.total_deposited >= app.state.cost_per_cycle),
+        # Early payout settles the upcoming cycle
+        due.store(cycles_due()),
+        settle(If(due.load() > Int(0), due.load(), Int(1))),
     )
 
 @app.external
 def renew_cycle():
     return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
         Assert(Global.latest_timestamp() >= app.state.renewal_timestamp),
-        # Reuse payout logic if possible manually or duplicate
-        Assert(app.state.total_deposited == app.state.cost_per_cycle),
-        InnerTxnBuilder.Execute({
-            TxnField.type_enum: TxnType.Payment,
-            TxnField.receiver: app.state.admin_address,
-            TxnField.amount: app.state.total_deposited,
-        }),
-        app.state.status.set(STATUS_ACTIVE),
-        app.state.renewal_timestamp.set(app.state.renewal_timestamp + app.state.cycle_duration),
-        app.state.total_deposited.set(Int(0)),
+        settle(cycles_due()),
     )
 
 @app.external
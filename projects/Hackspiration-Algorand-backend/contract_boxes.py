@@ -0,0 +1,244 @@
+from pyteal import *
+from beaker import *
+import beaker
+
+# Box-storage variant of SubSharePool for large pools.
+#
+# Members live in boxes instead of local state, so joining needs no opt-in
+# and the contract can walk its own member list to refund everyone:
+#   <address>          -> slot (uint64)
+#   "s" + itob(slot)   -> address (32) | deposited (8) | is_active (8) | cycle (8)
+# Deposits only count for the cycle they were made in, so payouts do not
+# have to reset every member. What a payout leaves over (deposits beyond whole
+# cycles) stays in total_deposited as carry-over; on dissolve it is split
+# evenly over the member slots and each refund pays the member's current
+# deposit plus that share once. A refunded record is marked with
+# cycle = pool cycle + 1, which no live record can have once dissolved.
+
+# Constants
+STATUS_FORMING = Int(0)
+STATUS_ACTIVE = Int(1)
+STATUS_DISSOLVED = Int(2)
+STATUS_UNDERFUNDED = Int(3)
+
+# Record layout
+ADDRESS = Int(0)
+DEPOSITED = Int(32)
+IS_ACTIVE = Int(40)
+CYCLE = Int(48)
+RECORD_SIZE = 56
+
+# Slots one refund_batch call may walk; refunds.MEMBERS_PER_CALL and the
+# max_iterations in teal_budgets.json match it
+REFUND_BATCH_MAX = Int(4)
+
+# Box MBR is 2500 + 400 * (key + value) microAlgo per box; joining creates two
+MEMBER_MBR = Int((2500 + 400 * (32 + 8)) + (2500 + 400 * (9 + RECORD_SIZE)))
+
+class SubShareBoxState:
+    # Global State
+    subscription_name = GlobalStateValue(stack_type=TealType.bytes)
+    admin_address = GlobalStateValue(stack_type=TealType.bytes)
+    cost_per_cycle = GlobalStateValue(stack_type=TealType.uint64)
+    max_members = GlobalStateValue(stack_type=TealType.uint64)
+    current_members = GlobalStateValue(stack_type=TealType.uint64)
+    cycle_duration = GlobalStateValue(stack_type=TealType.uint64)
+    renewal_timestamp = GlobalStateValue(stack_type=TealType.uint64)
+    total_deposited = GlobalStateValue(stack_type=TealType.uint64)
+    status = GlobalStateValue(stack_type=TealType.uint64)
+    cycle = GlobalStateValue(stack_type=TealType.uint64)
+    cycle_deposits = GlobalStateValue(stack_type=TealType.uint64)  # deposits made in the current cycle
+    carry_share = GlobalStateValue(stack_type=TealType.uint64)  # per-member carry-over, set on dissolve
+
+app = Application("SubSharePoolBoxes", state=SubShareBoxState())
+
+def slot_key(slot):
+    return Concat(Bytes("s"), Itob(slot))
+
+@Subroutine(TealType.uint64)
+def member_slot(address):
+    slot = BoxGet(address)
+    return Seq(slot, Assert(slot.hasValue()), Btoi(slot.value()))
+
+@Subroutine(TealType.uint64)
+def current_deposit(key):
+    # Deposits from earlier (already paid out) cycles no longer count
+    return If(
+        Btoi(BoxExtract(key, CYCLE, Int(8))) == app.state.cycle,
+        Btoi(BoxExtract(key, DEPOSITED, Int(8))),
+        Int(0),
+    )
+
+@Subroutine(TealType.none)
+def refund(key):
+    # Dissolved pools only: the current deposit plus the carry-over share, once per member
+    current = ScratchVar(TealType.uint64)
+    amount = ScratchVar(TealType.uint64)
+    return Seq(
+        If(Btoi(BoxExtract(key, CYCLE, Int(8))) != app.state.cycle + Int(1)).Then(Seq(
+            current.store(current_deposit(key)),
+            amount.store(current.load() + app.state.carry_share),
+            If(amount.load() > Int(0)).Then(
+                InnerTxnBuilder.Execute({
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.receiver: BoxExtract(key, ADDRESS, Int(32)),
+                    TxnField.amount: amount.load(),
+                    TxnField.fee: Int(0),
+                })
+            ),
+            BoxReplace(key, DEPOSITED, Itob(Int(0))),
+            BoxReplace(key, CYCLE, Itob(app.state.cycle + Int(1))),
+            app.state.cycle_deposits.set(app.state.cycle_deposits - current.load()),
+            app.state.total_deposited.set(app.state.total_deposited - amount.load()),
+        )),
+    )
+
+@Subroutine(TealType.uint64)
+def cycles_due():
+    # Deadlines passed since renewal_timestamp, including the current one
+    return If(
+        Global.latest_timestamp() >= app.state.renewal_timestamp,
+        (Global.latest_timestamp() - app.state.renewal_timestamp) / app.state.cycle_duration + Int(1),
+        Int(0),
+    )
+
+@Subroutine(TealType.none)
+def settle(cycles):
+    # Pays as many of `cycles` as the deposits cover in one inner payment and
+    # jumps renewal_timestamp past all of them; a shortfall marks the pool
+    # underfunded. Deposits beyond whole cycles carry over into the next total.
+    paid = ScratchVar(TealType.uint64)
+    return Seq(
+        paid.store(app.state.total_deposited / app.state.cost_per_cycle),
+        If(paid.load() > cycles).Then(paid.store(cycles)),
+        If(paid.load() > Int(0)).Then(Seq(
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: app.state.admin_address,
+                TxnField.amount: paid.load() * app.state.cost_per_cycle,
+            }),
+            app.state.cycle.increment(),
+            # Everything left is carry-over now
+            app.state.cycle_deposits.set(Int(0)),
+        )),
+        app.state.total_deposited.set(app.state.total_deposited - paid.load() * app.state.cost_per_cycle),
+        app.state.renewal_timestamp.set(app.state.renewal_timestamp + cycles * app.state.cycle_duration),
+        app.state.status.set(If(paid.load() == cycles, STATUS_ACTIVE, STATUS_UNDERFUNDED)),
+    )
+
+@app.create
+def create(subscription_name: abi.String, admin_address: abi.Address, cost_per_cycle: abi.Uint64, max_members: abi.Uint64, cycle_duration: abi.Uint64):
+    return Seq(
+        # cycles_due() divides by it
+        Assert(cycle_duration.get() > Int(0)),
+        app.state.subscription_name.set(subscription_name.get()),
+        app.state.admin_address.set(admin_address.get()),
+        app.state.cost_per_cycle.set(cost_per_cycle.get()),
+        app.state.max_members.set(max_members.get()),
+        app.state.current_members.set(Int(0)),
+        app.state.cycle_duration.set(cycle_duration.get()),
+        app.state.renewal_timestamp.set(Global.latest_timestamp() + cycle_duration.get()),
+        app.state.total_deposited.set(Int(0)),
+        app.state.status.set(STATUS_FORMING),
+        app.state.cycle.set(Int(0)),
+        app.state.cycle_deposits.set(Int(0)),
+        app.state.carry_share.set(Int(0)),
+    )
+
+@app.external
+def join(payment: abi.PaymentTransaction):
+    # Replaces opt_in: the payment funds the two member boxes
+    slot = ScratchVar(TealType.uint64)
+    existing = BoxLen(Txn.sender())
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(app.state.current_members < app.state.max_members),
+        Assert(payment.get().receiver() == Global.current_application_address()),
+        Assert(payment.get().amount() >= MEMBER_MBR),
+        existing,
+        Assert(Not(existing.hasValue())),
+        slot.store(app.state.current_members),
+        BoxPut(Txn.sender(), Itob(slot.load())),
+        BoxPut(slot_key(slot.load()), Concat(Txn.sender(), Itob(Int(0)), Itob(Int(1)), Itob(app.state.cycle))),
+        app.state.current_members.increment(),
+    )
+
+@app.external
+def deposit_share(payment: abi.PaymentTransaction):
+    key = ScratchVar(TealType.bytes)
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(payment.get().receiver() == Global.current_application_address()),
+        key.store(slot_key(member_slot(Txn.sender()))),
+        BoxReplace(key.load(), DEPOSITED, Itob(current_deposit(key.load()) + payment.get().amount())),
+        BoxReplace(key.load(), CYCLE, Itob(app.state.cycle)),
+        app.state.total_deposited.set(app.state.total_deposited + payment.get().amount()),
+        app.state.cycle_deposits.set(app.state.cycle_deposits + payment.get().amount()),
+    )
+
+@app.external
+def payout():
+    due = ScratchVar(TealType.uint64)
+    return Seq(
+        # A dissolved pool only pays members back (withdraw/refund_batch)
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(app.state.total_deposited >= app.state.cost_per_cycle),
+        # Early payout settles the upcoming cycle
+        due.store(cycles_due()),
+        settle(If(due.load() > Int(0), due.load(), Int(1))),
+    )
+
+@app.external
+def renew_cycle():
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(Global.latest_timestamp() >= app.state.renewal_timestamp),
+        settle(cycles_due()),
+    )
+
+@app.external
+def dissolve_pool():
+    return Seq(
+        Assert(Txn.sender() == app.state.admin_address),
+        # Carry-over is fixed once, before any refund moves total_deposited
+        If(And(app.state.status != STATUS_DISSOLVED, app.state.current_members > Int(0))).Then(
+            app.state.carry_share.set(
+                (app.state.total_deposited - app.state.cycle_deposits) / app.state.current_members
+            )
+        ),
+        app.state.status.set(STATUS_DISSOLVED),
+    )
+
+@app.external
+def refund_batch(start: abi.Uint64, count: abi.Uint64):
+    # Anyone may call this: it only ever pays members back their own deposit
+    # and carry-over share.
+    # Callers pass the slot boxes and member accounts as references and cover
+    # the inner payment fees (fee pooling).
+    i = ScratchVar(TealType.uint64)
+    end = ScratchVar(TealType.uint64)
+    return Seq(
+        Assert(app.state.status == STATUS_DISSOLVED),
+        Assert(count.get() <= REFUND_BATCH_MAX),
+        end.store(start.get() + count.get()),
+        If(end.load() > app.state.current_members).Then(end.store(app.state.current_members)),
+        For(i.store(start.get()), i.load() < end.load(), i.store(i.load() + Int(1))).Do(
+            refund(slot_key(i.load()))
+        ),
+    )
+
+@app.external
+def withdraw():
+    return Seq(
+        Assert(app.state.status == STATUS_DISSOLVED),
+        refund(slot_key(member_slot(Txn.sender()))),
+    )
+
+@app.external
+def exit_next_cycle():
+    return BoxReplace(slot_key(member_slot(Txn.sender())), IS_ACTIVE, Itob(Int(0)))
+
+if __name__ == "__main__":
+    import json
+    spec = app.build()
+    print(json.dumps(spec.dict(), indent=2))
@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
@@ -8,17 +11,92 @@ load_dotenv()
 # Use SQLite for MVP simplicity if Postgres is not available
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./subshare.db")
 
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# "production" applies the SQLite pragmas below; "default" leaves the driver defaults
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+
+# Applied to every new SQLite connection under the production profile
+SQLITE_PRAGMAS = {
+    # Readers no longer block on the writer (and vice versa)
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # Safe with WAL: only the last commits can be lost on power failure, never corrupted
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Wait for the writer lock instead of failing with "database is locked"
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative means KiB rather than pages
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+def to_async_url(url: str) -> str:
+    # Swap the sync driver for its async counterpart: aiosqlite / asyncpg
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+def pool_options(url: str, is_async: bool = False) -> dict:
+    # Sized for FastAPI's threadpool (40) plus background workers by default
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:")):
+        return {}  # in-memory databases use a single static connection
+    return {
+        "poolclass": AsyncAdaptedQueuePool if is_async else QueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "30")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "false").lower() == "true",
+    }
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def build_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE, is_async: bool = False):
+    options = pool_options(url, is_async)
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+
+    if is_async:
+        engine = create_async_engine(url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+
+    if url.startswith("sqlite") and profile == "production":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+# Sync engine: used by the scheduler and other background threads
+engine = build_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine: used by the request handlers
+async_engine = build_engine(ASYNC_DATABASE_URL, is_async=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def dialect_insert(db, table):
+    # INSERT that supports on_conflict_do_update/do_nothing for the session's backend
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
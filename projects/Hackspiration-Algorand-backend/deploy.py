@@ -1,22 +1,40 @@
 import logging
 import base64
+import os
 from algosdk.v2client import algod
 from algosdk.mnemonic import to_private_key
+from algosdk.logic import get_application_address
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer, TransactionWithSigner
+from algosdk.transaction import PaymentTxn
+from algosdk.error import AlgodHTTPError
 from algokit_utils import (
     Account,
     ApplicationSpecification,
     ApplicationClient,
     get_algod_client,
     get_indexer_client,
-    get_kmd_wallet_account,
 )
-from contract import app
+import artifacts
+from chain import kmd_account
 
 logger = logging.getLogger(__name__)
 
+# Base minimum balance of the app account. Without it the first join (box
+# variant) or the first payout would take the account below its minimum;
+# member boxes are paid for by each join payment (contract_boxes.MEMBER_MBR)
+APP_ACCOUNT_FUNDING = int(os.getenv("APP_ACCOUNT_FUNDING", "100000"))
+
+class FundingError(RuntimeError):
+    """The app was created but its account could not be funded; carries the new app's id."""
+
+    def __init__(self, message, app_id, app_address):
+        super().__init__(message)
+        self.app_id = app_id
+        self.app_address = app_address
+
 def get_deployer_account(algod_client: algod.AlgodClient) -> Account:
     # Use KMD for localnet/testnet MVP
-    return get_kmd_wallet_account(algod_client, "unencrypted-default-wallet", "test")
+    return kmd_account(algod_client)
     # In production, load from env
     # import os
     # mnemonic = os.getenv("DEPLOYER_MNEMONIC")
@@ -26,24 +44,148 @@ def deploy(
     app_spec: ApplicationSpecification, 
     algod_client: algod.AlgodClient,
     deployer: Account,
-) -> None:
+    subscription_name: str = "Netflix Share",
+    admin_address: str | None = None,
+    cost_per_cycle: int = 1000000, # 1 Algo
+    max_members: int = 4,
+    cycle_duration: int = 60*60*24*30, # 30 days
+    suggested_params=None,
+) -> int:
     app_client = ApplicationClient(
         algod_client=algod_client,
         app_spec=app_spec,
         signer=deployer,
+        suggested_params=suggested_params,
     )
 
     app_id, app_addr, tx_id = app_client.create(
-        subscription_name="Netflix Share",
-        admin_address=deployer.address,
-        cost_per_cycle=1000000, # 1 Algo
-        max_members=4,
-        cycle_duration=60*60*24*30 # 30 days
+        subscription_name=subscription_name,
+        admin_address=admin_address or deployer.address,
+        cost_per_cycle=cost_per_cycle,
+        max_members=max_members,
+        cycle_duration=cycle_duration,
     )
     
     logger.info(f"Deployed app_id: {app_id}, app_addr: {app_addr}")
     return app_id
 
+# Transactions per atomic group (the protocol maximum)
+MAX_GROUP_SIZE = 16
+
+def _rejected(error) -> bool:
+    # algod answers 400 when it refuses a transaction; an overspend is the
+    # deployer's balance, not the pool's fault
+    return isinstance(error, AlgodHTTPError) and error.code == 400 and "overspend" not in str(error)
+
+def _grouped(items, send):
+    """
+    Calls send(chunk) for chunks of up to MAX_GROUP_SIZE items, each sent as
+    one atomic group, and pairs every item with its result. When algod rejects
+    a group, nothing in it happened, so its items are sent one by one to fail
+    only the culprit. Returns [(item, result or exception)].
+    """
+    out = []
+    for start in range(0, len(items), MAX_GROUP_SIZE):
+        chunk = items[start:start + MAX_GROUP_SIZE]
+        try:
+            out.extend(zip(chunk, send(chunk)))
+        except Exception as e:
+            if len(chunk) == 1 or not _rejected(e):
+                out.extend((item, e) for item in chunk)
+                continue
+            logger.warning(f"Group of {len(chunk)} rejected, sending one by one: {e}")
+            for item in chunk:
+                try:
+                    out.append((item, send([item])[0]))
+                except Exception as e:
+                    out.append((item, e))
+    return out
+
+def _create(contracts, algod_client, deployer, pools, sp) -> list[tuple[int, str]]:
+    # Programs come pre-assembled from the artifact cache, so there are no
+    # compile round-trips here
+    atc = AtomicTransactionComposer()
+    for pool in pools:
+        contract = contracts[pool.storage or "local"]
+        if not contract.compiled:
+            artifacts.assemble(contract, algod_client)
+        app_spec = contract.app_spec
+        atc.add_method_call(
+            app_id=0,
+            method=app_spec.contract.get_method_by_name("create"),
+            sender=deployer.address,
+            sp=sp,
+            signer=deployer.signer,
+            method_args=[
+                pool.subscription_name,
+                pool.admin_wallet,
+                pool.cost_per_cycle,
+                pool.max_members,
+                pool.cycle_duration,
+            ],
+            approval_program=contract.approval_bin,
+            clear_program=contract.clear_bin,
+            global_schema=app_spec.global_state_schema,
+            local_schema=app_spec.local_state_schema,
+            # Keeps two identical pools from being identical transactions
+            note=f"subshare:pool:{pool.id}".encode(),
+        )
+    result = atc.execute(algod_client, 4)
+    app_ids = [r.tx_info["application-index"] for r in result.abi_results]
+    return [(app_id, get_application_address(app_id)) for app_id in app_ids]
+
+def _fund(algod_client, deployer, addresses, sp) -> list[None]:
+    atc = AtomicTransactionComposer()
+    for address in addresses:
+        atc.add_transaction(TransactionWithSigner(
+            PaymentTxn(deployer.address, sp, address, APP_ACCOUNT_FUNDING), deployer.signer,
+        ))
+    atc.execute(algod_client, 4)
+    return [None] * len(addresses)
+
+def deploy_pools(contracts: dict[str, artifacts.ContractArtifacts], algod_client: algod.AlgodClient, deployer: Account, pools,
+                 suggested_params=None, on_created=None) -> dict:
+    """
+    Deploys SubSharePools for `models.Pool` rows from cached artifacts
+    (`contracts` by storage variant): the creates go out in atomic groups of
+    up to MAX_GROUP_SIZE, then the funding payments do. A group cannot hold
+    both, as a payment's receiver is derived from an app id that only exists
+    once the create is confirmed; on_created(pool, app_id, app_address) is
+    called in between so the caller can record the apps. Pools that already
+    have an app (their funding failed before) are only funded, if need be.
+
+    Returns {pool id: (app_id, app_address) or the exception for that pool}:
+    deployments.Rejected when the chain refused the pool itself, FundingError
+    when its app exists but is not funded.
+    """
+    from deployments import Rejected
+
+    sp = suggested_params or algod_client.suggested_params()
+    results = {}
+    apps = {pool.id: (pool.app_id, pool.contract_address) for pool in pools if pool.app_id}
+    # An earlier attempt may have funded them without getting to record it
+    funded = {pool_id for pool_id, (_, address) in apps.items() if algod_client.account_info(address)["amount"] >= APP_ACCOUNT_FUNDING}
+
+    new = [pool for pool in pools if not pool.app_id]
+    for pool, result in _grouped(new, lambda chunk: _create(contracts, algod_client, deployer, chunk, sp)):
+        if isinstance(result, Exception):
+            results[pool.id] = Rejected(f"Pool {pool.id} rejected: {result}") if _rejected(result) else result
+            continue
+        apps[pool.id] = result
+        if on_created is not None:
+            on_created(pool, *result)
+
+    unfunded = [pool for pool in pools if pool.id in apps and pool.id not in funded]
+    for pool, result in _grouped(unfunded, lambda chunk: _fund(algod_client, deployer, [apps[p.id][1] for p in chunk], sp)):
+        if isinstance(result, Exception):
+            app_id, app_address = apps.pop(pool.id)
+            results[pool.id] = FundingError(f"Created app {app_id} for pool {pool.id} but could not fund it: {result}", app_id, app_address)
+
+    for pool_id, (app_id, app_address) in apps.items():
+        logger.info(f"Deployed and funded app_id: {app_id} for pool {pool_id}")
+        results[pool_id] = (app_id, app_address)
+    return results
+
 if __name__ == "__main__":
     import json
     
@@ -54,8 +196,7 @@ if __name__ == "__main__":
     # Get deployer account
     deployer = get_deployer_account(algod_client)
 
-    app_spec = app.build(client=algod_client) # Adjust build based on Beaker version usage
-    # Wait, app.build() signature?
-    # Spec might just be app.build()
+    # Reuses the compiled artifacts unless contract.py changed
+    app_spec = artifacts.load(algod_client).app_spec
     
     deploy(app_spec, algod_client, deployer)
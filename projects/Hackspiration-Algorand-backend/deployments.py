@@ -0,0 +1,254 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import and_, or_, update
+
+import metrics
+import models
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DEPLOYING = "deploying"
+DEPLOYED = "deployed"
+FAILED = "failed"
+
+# Pools this large keep members in boxes (contract_boxes.py) so they can be refunded in batches
+BOX_STORAGE_MIN_MEMBERS = int(os.getenv("BOX_STORAGE_MIN_MEMBERS", "16"))
+
+# How long a deploying claim holds; past it the process that made it is taken
+# to be gone and the pool can be claimed again. Well above a create + fund.
+DEPLOY_CLAIM_SECONDS = int(os.getenv("DEPLOY_CLAIM_SECONDS", "600"))
+
+# Backoff for deployments that failed for reasons outside the pool (algod/KMD down, funding)
+DEPLOY_RETRY_SECONDS = int(os.getenv("DEPLOY_RETRY_SECONDS", "15"))
+DEPLOY_RETRY_MAX_SECONDS = int(os.getenv("DEPLOY_RETRY_MAX_SECONDS", "900"))
+
+
+class Rejected(Exception):
+    """The chain refused this pool's app itself (e.g. the contract's checks failed); retrying cannot help."""
+
+
+def choose_storage(max_members, requested=None):
+    if requested:
+        return requested
+    return "box" if max_members >= BOX_STORAGE_MIN_MEMBERS else "local"
+
+
+def default_chain():
+    """Resolves the algod client, deployer account and compiled contract variants for a batch."""
+    import artifacts
+    from chain import get_chain
+
+    chain = get_chain()
+    return chain.algod, chain.deployer, {variant: artifacts.load(chain.algod, variant) for variant in artifacts.VARIANTS}
+
+
+def default_deploy(contracts, algod_client, deployer, pools, on_created=None):
+    from chain import get_chain
+    from deploy import deploy_pools
+
+    return deploy_pools(
+        contracts, algod_client, deployer, pools, suggested_params=get_chain().suggested_params(), on_created=on_created,
+    )
+
+
+class DeploymentQueue:
+    """
+    Runs pool contract deployments off the request path.
+
+    create_pool inserts a row with deployment_status=pending and enqueues its
+    id. A fixed number of worker threads pick up ids, grouping whatever is
+    already queued (up to max_batch). A group's pools are claimed (pending ->
+    deploying, for DEPLOY_CLAIM_SECONDS), then created and funded together
+    (deploy.deploy_pools: one atomic group of creates, one of payments). Each
+    app id is committed as soon as the app exists.
+
+    Only a pool the chain rejects is marked failed. Anything else (algod or
+    KMD unreachable, funding) puts the pool back to pending for a retry after
+    an exponential backoff; a pool whose app was created keeps it and is only
+    funded on the next attempt.
+
+    `chain` and `deploy_fn` are injectable; pass fakes.FakeAlgodClient-backed
+    ones to run without a network. On start, pending pools and deploying
+    pools whose claim expired are queued again; with several replicas, pass a
+    leases.LeaderLease so only one of them scans for them.
+    """
+
+    def __init__(self, session_factory, workers=4, max_batch=8, chain=default_chain, deploy_fn=default_deploy, on_deployed=None, leader=None,
+                 claim_seconds=DEPLOY_CLAIM_SECONDS, retry_seconds=DEPLOY_RETRY_SECONDS, retry_max_seconds=DEPLOY_RETRY_MAX_SECONDS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_batch = max_batch
+        self.chain = chain
+        self.deploy_fn = deploy_fn
+        self.on_deployed = on_deployed  # called with the list of finished pool ids
+        self.leader = leader
+        self.claim_seconds = claim_seconds
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._queue = queue.Queue()
+        self._threads = []
+        self._timers = set()
+        self._timers_lock = threading.Lock()
+
+    def submit(self, pool_id):
+        self._queue.put(pool_id)
+
+    def submit_later(self, pool_id, delay):
+        def fire():
+            with self._timers_lock:
+                self._timers.discard(timer)
+            self.submit(pool_id)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self._timers_lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def start(self):
+        # Re-queue anything a previous process accepted but did not finish
+        if self.leader is None or self.leader.acquire():
+            now = int(time.time())
+            db = self.session_factory()
+            try:
+                # Live claims belong to workers that are still deploying them
+                rows = db.query(models.Pool.id, models.Pool.deployment_status, models.Pool.deployment_claim_expires).filter(
+                    or_(self._claimable(now), models.Pool.deployment_status == PENDING)
+                ).order_by(models.Pool.id).all()
+            finally:
+                db.close()
+            for pool_id, status, expires in rows:
+                if status == PENDING and expires is not None and expires >= now:
+                    # Still backing off from a failed attempt
+                    self.submit_later(pool_id, expires - now + 1)
+                else:
+                    self.submit(pool_id)
+
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"deploy-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._timers_lock:
+            for timer in self._timers:
+                timer.cancel()
+            self._timers.clear()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            pool_id = self._queue.get()
+            if pool_id is None:
+                return
+            batch = [pool_id]
+            while len(batch) < self.max_batch:
+                try:
+                    next_id = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_id is None:
+                    # Keep the stop marker for the next loop iteration
+                    self._queue.put(None)
+                    break
+                batch.append(next_id)
+            try:
+                with metrics.span("job", "deployments"):
+                    self.deploy_batch(batch)
+            except Exception as e:
+                logger.exception(f"Deployment batch {batch} failed: {e}")
+
+    @staticmethod
+    def _claimable(now):
+        Pool = models.Pool
+        # On a pending pool the expiry is the end of its retry backoff
+        ready = and_(Pool.deployment_status == PENDING, or_(Pool.deployment_claim_expires.is_(None), Pool.deployment_claim_expires < now))
+        expired = and_(Pool.deployment_status == DEPLOYING, Pool.deployment_claim_expires < now)
+        return or_(ready, expired)
+
+    def _claim(self, db, pool_id):
+        # Compare-and-set, so a pool queued twice (or by two replicas) is sent once
+        now = int(time.time())
+        claimed = db.execute(
+            update(models.Pool)
+            .where(models.Pool.id == pool_id, self._claimable(now))
+            .values(deployment_status=DEPLOYING, deployment_claim_expires=now + self.claim_seconds)
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def deploy_batch(self, pool_ids):
+        db = self.session_factory()
+        done, retries = [], []
+        try:
+            pools = [db.get(models.Pool, pool_id) for pool_id in dict.fromkeys(pool_ids) if self._claim(db, pool_id)]
+            if not pools:
+                return done
+
+            def created(pool, app_id, app_address):
+                # Committed before funding: a crash from here on cannot lose an app that exists on chain
+                pool.app_id = app_id
+                pool.contract_address = app_address
+                db.commit()
+
+            try:
+                algod_client, deployer, contracts = self.chain()
+                results = self.deploy_fn(contracts, algod_client, deployer, pools, on_created=created)
+            except Exception as e:
+                # Nothing reached the chain, so no pool is to blame
+                logger.error(f"Could not deploy pools {[pool.id for pool in pools]}: {e}")
+                results = dict.fromkeys((pool.id for pool in pools), e)
+
+            for pool in pools:
+                result = results[pool.id]
+                if isinstance(result, Exception):
+                    delay = self._failed(pool, result)
+                    if delay is not None:
+                        retries.append((pool.id, delay))
+                    continue
+                pool.app_id, pool.contract_address = result
+                pool.deployment_status = DEPLOYED
+                pool.deployment_error = None
+                pool.deployment_claim_expires = None
+                done.append(pool.id)
+            db.commit()
+        finally:
+            db.close()
+
+        for pool_id, delay in retries:
+            self.submit_later(pool_id, delay)
+        if done and self.on_deployed is not None:
+            self.on_deployed(done)
+        return done
+
+    def _failed(self, pool, error):
+        """Records a failed attempt. Returns the retry delay, or None if the pool failed for good."""
+        pool.deployment_error = str(error)
+        if getattr(error, "app_id", None) is not None:
+            # Created but unfunded (deploy.FundingError): the retry only funds it
+            pool.app_id = error.app_id
+            pool.contract_address = error.app_address
+        if isinstance(error, Rejected):
+            logger.error(f"Deployment of pool {pool.id} failed: {error}")
+            pool.deployment_status = FAILED
+            pool.deployment_claim_expires = None
+            return None
+        attempts = (pool.deployment_attempts or 0) + 1
+        delay = min(self.retry_seconds * 2 ** min(attempts - 1, 16), self.retry_max_seconds)
+        logger.warning(f"Deployment of pool {pool.id} failed (attempt {attempts}), retrying in {delay}s: {error}")
+        pool.deployment_status = PENDING
+        pool.deployment_attempts = attempts
+        pool.deployment_claim_expires = int(time.time()) + delay
+        return delay
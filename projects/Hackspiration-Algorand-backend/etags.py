@@ -0,0 +1,94 @@
+"""
+Conditional, compressed JSON responses for the list endpoints.
+
+- Row versions: pools and pool_members carry a row_version that every
+  SQLAlchemy UPDATE bumps (Column.onupdate, ORM flushes included). A
+  response's version aggregates the ids and row versions of exactly the rows
+  its query returns (same filters, cursor and limit), so it moves when those
+  rows change or the set of rows does, and writes elsewhere leave it alone.
+  There is no shared counter for writers to queue on.
+- Weak ETags from that version plus the path and query. A matching
+  If-None-Match is answered with 304 before the route runs its query.
+- Bodies are encoded with orjson from plain dicts built from row tuples, and
+  compressed (brotli when installed and accepted, else gzip) above
+  COMPRESS_MIN_BYTES.
+
+Raw SQL (exec_driver_sql, text()) and the SET of ON CONFLICT DO UPDATE skip
+onupdate; code that changes row data that way must bump row_version itself.
+"""
+import gzip
+import hashlib
+import os
+
+import orjson
+from fastapi import Response
+from sqlalchemy import func, select
+
+import migrations
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+try:
+    import brotli  # optional dependency; gzip only without it
+except ImportError:
+    brotli = None
+
+
+def version_query(query, model):
+    """Select of the version of the `model` rows `query` returns; run it before `query` itself."""
+    rows = query.with_only_columns(model.id, model.row_version).subquery()
+    return select(
+        func.count(), func.max(rows.c.id), func.coalesce(func.sum(rows.c.id), 0), func.coalesce(func.sum(rows.c.row_version), 0)
+    )
+
+
+def etag(request, version):
+    # The schema version is part of the tag: migrations rewrite rows without bumping
+    key = f"{request.url.path}?{request.url.query}|{tuple(version)}|{migrations.MIGRATIONS[-1][0]}"
+    return 'W/"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+
+
+def not_modified(request, tag):
+    """304 response if the request's If-None-Match matches `tag` (weak comparison), else None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    opaque = tag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
+    return None
+
+
+def _accepts(request, coding):
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def records(columns, rows):
+    """Row tuples of a select(*columns) as dicts keyed by column name, skipping pydantic."""
+    keys = [column.key for column in columns]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def json_response(request, payload, tag=None):
+    """orjson-encoded `payload`, compressed when large enough and accepted by the client."""
+    body = orjson.dumps(payload)
+    headers = {"Vary": "Accept-Encoding"}
+    if tag is not None:
+        headers["ETag"] = tag
+        headers["Cache-Control"] = "no-cache"  # cache, but revalidate every time
+    if len(body) >= COMPRESS_MIN_BYTES:
+        if brotli is not None and _accepts(request, "br"):
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif _accepts(request, "gzip"):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,231 @@
+"""
+Bulk export of pools, members and deposit events, served by GET /export/{dataset}.
+
+Rows come off a server-side cursor (stream_results, yield_per) in batches of
+EXPORT_BATCH and are encoded batch by batch straight into the response, so
+memory stays flat whatever the table size:
+
+- ndjson:  one JSON object per line (orjson)
+- csv:     header row, then one line per row
+- parquet: one row group of PARQUET_ROW_GROUP rows per batch; needs pyarrow
+
+Filters: `status` (pools: 0-3 or forming/active/dissolved/underfunded;
+members: active/inactive; deposits: deposit/refund/adjust/charge) and a
+[since, until) range on the row's timestamp (created_at, joined_at for
+members). Rows are exported in id order.
+
+    python export.py pools|members|deposits [--format ndjson] [--status S]
+                     [--since ISO] [--until ISO] [-o FILE]
+"""
+import csv
+import importlib.util
+import io
+import os
+from datetime import datetime
+
+import orjson
+from sqlalchemy import select
+
+import ledger
+import models
+
+# Optional dependency, imported on the first parquet export so workers boot without it
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "5000"))
+PARQUET_ROW_GROUP = int(os.getenv("PARQUET_ROW_GROUP", "100000"))
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+POOL_STATUSES = {"forming": 0, "active": 1, "dissolved": 2, "underfunded": 3}
+DEPOSIT_KINDS = (ledger.DEPOSIT, ledger.REFUND, ledger.ADJUST, ledger.CHARGE)
+
+_pools = models.Pool
+_members = models.PoolMember
+_deposits = models.DepositEvent
+
+# dataset -> (exported columns, timestamp column for since/until); lease columns stay internal
+DATASETS = {
+    "pools": (
+        (
+            _pools.id, _pools.subscription_name, _pools.admin_wallet, _pools.cost_per_cycle, _pools.max_members,
+            _pools.cycle_duration, _pools.renewal_timestamp, _pools.status, _pools.cycle, _pools.contract_address,
+            _pools.app_id, _pools.deployment_status, _pools.storage, _pools.created_at,
+        ),
+        _pools.created_at,
+    ),
+    "members": (
+        (
+            _members.id, _members.pool_id, _members.wallet_address, _members.is_active, _members.deposited_amount,
+            _members.joined_at,
+        ),
+        _members.joined_at,
+    ),
+    "deposits": (
+        (
+            _deposits.id, _deposits.pool_id, _deposits.wallet_address, _deposits.kind, _deposits.amount,
+            _deposits.cycle, _deposits.txid, _deposits.round, _deposits.created_at,
+        ),
+        _deposits.created_at,
+    ),
+}
+
+
+def _status_filter(dataset, status):
+    if dataset == "pools":
+        value = POOL_STATUSES.get(status.lower()) if not status.isdigit() else int(status)
+        if value is None:
+            raise ValueError(f"Pool status must be 0-3 or one of {', '.join(POOL_STATUSES)}")
+        return _pools.status == value
+    if dataset == "members":
+        if status not in ("active", "inactive"):
+            raise ValueError("Member status must be active or inactive")
+        return _members.is_active.is_(status == "active")
+    if status not in DEPOSIT_KINDS:
+        raise ValueError(f"Deposit status must be one of {', '.join(DEPOSIT_KINDS)}")
+    return _deposits.kind == status
+
+
+def build_query(dataset, status=None, since=None, until=None):
+    """The export's select; ValueError for an unknown dataset or status."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}, expected one of {', '.join(DATASETS)}")
+    columns, timestamp = DATASETS[dataset]
+    query = select(*columns)
+    if status is not None:
+        query = query.where(_status_filter(dataset, status))
+    if since is not None:
+        query = query.where(timestamp >= since)
+    if until is not None:
+        query = query.where(timestamp < until)
+    return query.order_by(columns[0])
+
+
+def _batches(engine, query, size):
+    # Server-side cursor on PostgreSQL; SQLite steps its cursor lazily anyway
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=size).execute(query)
+        yield from result.partitions()
+
+
+def _ndjson(keys, batches):
+    for rows in batches:
+        yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+
+def _csv(keys, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(keys)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only file for ParquetWriter that hands back what was written since the last drain()."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _arrow_schema(columns):
+    import pyarrow
+
+    fields = []
+    for column in columns:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            arrow_type = pyarrow.timestamp("us")
+        else:
+            arrow_type = {int: pyarrow.int64(), str: pyarrow.string(), bool: pyarrow.bool_()}[python_type]
+        fields.append(pyarrow.field(column.key, arrow_type))
+    return pyarrow.schema(fields)
+
+
+def _parquet(columns, batches):
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = _arrow_schema(columns)
+    sink = _Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema), row_group_size=len(rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()  # footer
+
+
+def stream(engine, dataset, fmt="ndjson", status=None, since=None, until=None):
+    """
+    Iterator of encoded chunks for the export. Arguments are checked before
+    anything runs: ValueError for a bad dataset, format or status,
+    RuntimeError for parquet without pyarrow.
+    """
+    query = build_query(dataset, status, since, until)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    columns = DATASETS[dataset][0]
+    if fmt == "parquet":
+        if not HAVE_PYARROW:
+            raise RuntimeError("Parquet export needs pyarrow installed")
+        return _parquet(columns, _batches(engine, query, PARQUET_ROW_GROUP))
+    encode = _ndjson if fmt == "ndjson" else _csv
+    return encode([column.key for column in columns], _batches(engine, query, EXPORT_BATCH))
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from database import engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("--format", default="ndjson", choices=list(FORMATS))
+    parser.add_argument("--status")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="ISO timestamp, inclusive")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="ISO timestamp, exclusive")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    try:
+        chunks = stream(engine, args.dataset, args.format, args.status, args.since, args.until)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
@@ -0,0 +1,169 @@
+"""
+In-process stand-ins for the chain services, so background jobs can run offline.
+
+Nothing here talks to the network; state lives in plain dicts on the instance.
+"""
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeAlgodClient:
+    """The subset of algod the backend uses, backed by in-memory state."""
+
+    def __init__(self, start_round=1000, confirm_latency=0.0):
+        self.round = start_round
+        self.confirm_latency = confirm_latency
+        self.apps = {}  # app_id -> {"creator": ..., "global_state": {...}}
+        self.failing_apps = set()  # app calls to these apps fail their group
+        self.app_calls = []  # (round, app_id, method) of every confirmed app call
+        self.calls = 0
+        self._ids = itertools.count(1001)
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+
+    def status(self):
+        self._call()
+        return {"last-round": self.round}
+
+    def suggested_params(self):
+        self._call()
+        return SimpleNamespace(fee=1000, min_fee=1000, flat_fee=False, first=self.round, last=self.round + 1000, gh="", gen="fake")
+
+    def create_app(self, creator, global_state):
+        """Used by fake_deploy in place of an app-create transaction."""
+        self._call()
+        if self.confirm_latency:
+            time.sleep(self.confirm_latency)
+        with self._lock:
+            app_id = next(self._ids)
+            self.apps[app_id] = {"creator": creator, "global_state": dict(global_state)}
+            self.round += 1
+        return app_id
+
+
+    def execute_group(self, calls):
+        """Confirms a group of batcher.AppCalls atomically, or fails it on the first failing call."""
+        self._call()
+        if self.confirm_latency:
+            time.sleep(self.confirm_latency)
+        with self._lock:
+            for n, call in enumerate(calls):
+                if call.app_id in self.failing_apps:
+                    return n
+            self.round += 1
+            self.app_calls.extend((self.round, call.app_id, call.method) for call in calls)
+        return None
+
+
+class FakeGroupSender:
+    """batcher.GroupBatcher sender backed by a FakeAlgodClient."""
+
+    def __init__(self, algod_client, report_index=False):
+        self.algod_client = algod_client
+        self.report_index = report_index  # False: make the batcher simulate to find the culprit
+
+    def send(self, calls, sp):
+        from batcher import GroupFailed
+
+        failed = self.algod_client.execute_group(calls)
+        if failed is not None:
+            raise GroupFailed(f"app {calls[failed].app_id}: logic eval error", failed if self.report_index else None)
+        return self.algod_client.round
+
+    def simulate(self, calls, sp):
+        self.algod_client._call()
+        for n, call in enumerate(calls):
+            if call.app_id in self.algod_client.failing_apps:
+                return n
+        return None
+
+
+class FakeAccount:
+    def __init__(self, address="FAKEDEPLOYER"):
+        self.address = address
+
+
+def fake_deploy(contracts, algod_client, deployer, pools, on_created=None):
+    """Drop-in for deploy.deploy_pools against a FakeAlgodClient; rejects pools the contract would."""
+    from deployments import Rejected
+
+    results = {}
+    for pool in pools:
+        if pool.app_id:
+            results[pool.id] = (pool.app_id, pool.contract_address)
+            continue
+        if not pool.cycle_duration or pool.cycle_duration <= 0:
+            results[pool.id] = Rejected(f"Pool {pool.id} rejected: create assert failed")
+            continue
+        app_id = algod_client.create_app(
+            deployer.address,
+            {
+                "subscription_name": pool.subscription_name,
+                "admin_address": pool.admin_wallet,
+                "cost_per_cycle": pool.cost_per_cycle,
+                "max_members": pool.max_members,
+                "cycle_duration": pool.cycle_duration,
+            },
+        )
+        results[pool.id] = (app_id, f"FAKEAPP{app_id}")
+        if on_created is not None:
+            on_created(pool, *results[pool.id])
+    return results
+
+
+def _involves(txn, address, role=None):
+    receiver = txn.get("payment-transaction", {}).get("receiver")
+    if role == "receiver":
+        return receiver == address
+    if role == "sender":
+        return txn.get("sender") == address
+    return address in (receiver, txn.get("sender"))
+
+
+class FakeIndexer:
+    """
+    Replays indexer transactions (e.g. a fixture from `python chain_sync.py record`)
+    through the search_transactions/health subset the sync worker uses.
+    """
+
+    def __init__(self, transactions=(), round=None):
+        self.transactions = sorted(transactions, key=lambda t: (t["confirmed-round"], t.get("intra-round-offset", 0)))
+        self.round = round if round is not None else max((t["confirmed-round"] for t in self.transactions), default=0)
+        self.calls = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            fixture = json.load(f)
+        return cls(fixture["transactions"], fixture.get("round"))
+
+    def health(self):
+        self.calls += 1
+        return {"round": self.round}
+
+    def search_transactions(
+        self, txn_type=None, min_round=None, max_round=None, limit=1000, next_page=None, group_id=None,
+        application_id=None, address=None, address_role=None, **kwargs
+    ):
+        self.calls += 1
+        matches = [
+            t for t in self.transactions
+            if (txn_type is None or t.get("tx-type") == txn_type)
+            and (min_round is None or t["confirmed-round"] >= min_round)
+            and (max_round is None or t["confirmed-round"] <= max_round)
+            and (group_id is None or t.get("group") == group_id)
+            and (application_id is None or t.get("application-transaction", {}).get("application-id") == application_id)
+            and (address is None or _involves(t, address, address_role))
+        ]
+        offset = int(next_page or 0)
+        page = matches[offset:offset + limit]
+        result = {"current-round": self.round, "transactions": page}
+        if offset + limit < len(matches):
+            result["next-token"] = str(offset + limit)
+        return result
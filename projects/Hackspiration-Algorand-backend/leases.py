@@ -0,0 +1,87 @@
+"""
+Database-backed coordination between worker processes and replicas.
+
+- Row leases: due pools are claimed in batches by stamping lease_owner and
+  lease_expires. Postgres uses SELECT ... FOR UPDATE SKIP LOCKED, so
+  concurrent claimers never wait on each other. On SQLite, which has a single
+  writer, a conditional UPDATE does the claim. Renewals then only touch rows
+  the worker still owns, so a pool is never advanced twice even when a lease
+  expires mid-batch.
+- Leader leases: one named row per job that must run in a single place
+  (chain sync, deployment recovery, or renewals in leader mode). Whoever holds
+  an unexpired lease is the leader and keeps extending it.
+"""
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import or_, select, update
+
+import models
+import queries
+from database import dialect_insert
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def claim_due(db, owner, now, limit, lease_seconds):
+    """
+    Leases up to `limit` due active pools to `owner` and commits.
+    Returns [(pool_id, renewal_timestamp, cycle_duration)] of the rows claimed
+    by this call only (UPDATE ... RETURNING; SQLite 3.35+).
+    """
+    Pool = models.Pool
+    expires = now + lease_seconds
+    due = queries.due_pools(now, limit)
+    # row_version set to itself: leases are not in any response, so they leave ETags alone
+    claim = update(Pool).values(lease_owner=owner, lease_expires=expires, row_version=Pool.row_version).returning(
+        Pool.id, Pool.renewal_timestamp, Pool.cycle_duration
+    )
+    if db.bind.dialect.name == "postgresql":
+        ids = db.scalars(due.with_for_update(skip_locked=True)).all()
+        claimed = db.execute(claim.where(Pool.id.in_(ids))).all() if ids else []
+    else:
+        # SQLite: the UPDATE takes the write lock, so the subquery and the claim are atomic
+        claimed = db.execute(claim.where(Pool.id.in_(due), queries.lease_free(now))).all()
+    db.commit()
+    return claimed
+
+
+class LeaderLease:
+    """A named lease row; acquire() returns True while this owner holds it."""
+
+    def __init__(self, session_factory, name, owner=None, ttl=30):
+        self.session_factory = session_factory
+        self.name = name
+        self.owner = owner or worker_id()
+        self.ttl = ttl
+
+    def acquire(self, now=None):
+        """Takes the lease if it is free or expired, or extends it if already held."""
+        now = int(time.time()) if now is None else now
+        table = models.LeaderLease.__table__
+        db = self.session_factory()
+        try:
+            stmt = dialect_insert(db, table).values(name=self.name, owner=self.owner, expires_at=now + self.ttl)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+                where=or_(table.c.expires_at < now, table.c.owner == self.owner),
+            ))
+            db.commit()
+            holder = db.scalar(select(table.c.owner).where(table.c.name == self.name))
+        finally:
+            db.close()
+        return holder == self.owner
+
+    def release(self):
+        table = models.LeaderLease.__table__
+        db = self.session_factory()
+        try:
+            db.execute(update(table).where(table.c.name == self.name, table.c.owner == self.owner).values(expires_at=0))
+            db.commit()
+        finally:
+            db.close()
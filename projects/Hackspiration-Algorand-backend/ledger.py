@@ -0,0 +1,498 @@
+"""
+Append-only deposit ledger and its rollups.
+
+Writers never touch a member row: every deposit, refund or correction is a
+new deposit_events row (pool, wallet, amount, cycle, txid, round), inserted in
+batches. A single compactor folds new events, in id order, into three rollups:
+
+- member_balances        (pool, wallet) -> deposited, refunded, balance
+- pool_cycle_totals      (pool, cycle)  -> deposited, refunded, deposits, payers
+- member_cycle_deposits  (pool, cycle, wallet) -> amount ("who paid for cycle N")
+
+pool_members.deposited_amount is kept as a projection of member_balances.balance,
+written by the compactor only. The rollups and the compaction checkpoint are
+committed together, so each event is applied exactly once.
+
+The checkpoint (ledger_checkpoints) is the highest compacted event id plus the
+gaps: ids below it the compactor has not seen. On Postgres a smaller id can
+commit after a larger one, so a gap is retried on every pass until its event
+shows up. Most never will (rolled back, or spent by an ON CONFLICT DO NOTHING
+replay): the pass after a gap is found notes the snapshot's xmax, and once
+every transaction below it has ended (snapshot xmin past it) the gap is
+dropped. At most MAX_GAPS are kept, and none longer than
+GAP_RETENTION_SECONDS, so the gap list in uncompacted() stays short. SQLite
+commits one writer at a time in id order and leaves no gaps.
+
+Event kinds:
+- deposit: `amount` is added to the balance and to the cycle's deposits.
+- refund: the whole balance is paid out, as the contracts' withdraw and
+  refund_batch do. `amount` is NULL; the compactor books the balance it finds.
+- adjust: a signed correction, e.g. chain sync reconciling to on-chain state.
+- charge: `amount` billed for a cycle and taken off the balance (billing.py).
+  billing.py also books exit refunds as refund events with an explicit
+  `amount`, which pay out at most the balance.
+
+    python ledger.py    # compact everything pending once
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, String, and_, bindparam, func, literal, or_, select, text, tuple_, update
+
+import metrics
+import models
+from database import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "deposit_ledger"
+DEPOSIT, REFUND, ADJUST, CHARGE = "deposit", "refund", "adjust", "charge"
+
+# Safety nets for gaps whose transactions cannot be tracked; far beyond any open transaction and retry burst
+GAP_RETENTION_SECONDS = int(os.getenv("LEDGER_GAP_RETENTION_SECONDS", "3600"))
+MAX_GAPS = int(os.getenv("LEDGER_MAX_GAPS", "256"))
+
+
+def apply(balance, kind, amount):
+    """(balance after the event, amount refunded by it); the one place the kinds' arithmetic lives."""
+    if kind == REFUND:
+        refunded = max(balance, 0) if amount is None else min(amount, max(balance, 0))
+        return balance - refunded, refunded
+    if kind == CHARGE:
+        return balance - amount, 0
+    return balance + amount, 0
+
+
+def append(db, events):
+    """
+    Inserts events in one executemany; replays of a (txid, pool, wallet, kind) are dropped.
+    `events` are dicts with pool_id, wallet_address, kind, amount and optionally
+    txid, round and cycle (looked up from the pool when missing). Returns the
+    number of events inserted. Does not commit.
+    """
+    if not events:
+        return 0
+    missing = {e["pool_id"] for e in events if e.get("cycle") is None}
+    cycles = dict(db.execute(select(models.Pool.id, models.Pool.cycle).where(models.Pool.id.in_(missing))).all()) if missing else {}
+    now = datetime.utcnow()
+    table = models.DepositEvent.__table__
+    result = db.execute(
+        dialect_insert(db, table).on_conflict_do_nothing().returning(table.c.id),
+        [
+            {
+                "pool_id": e["pool_id"],
+                "wallet_address": e["wallet_address"],
+                "kind": e["kind"],
+                "amount": e.get("amount"),
+                "cycle": e["cycle"] if e.get("cycle") is not None else cycles.get(e["pool_id"]) or 0,
+                "txid": e.get("txid"),
+                "round": e.get("round"),
+                "created_at": now,
+            }
+            for e in events
+        ],
+    )
+    return len(result.all())
+
+
+def record_deposit(db, pool_id, wallet, amount, txid=None, round=None):
+    """
+    Appends one deposit in a single INSERT ... SELECT that also checks the
+    membership and books the pool's current cycle. False if the wallet is not a
+    member or the txid was already recorded. Does not commit.
+    """
+    events = models.DepositEvent.__table__
+    members = models.PoolMember.__table__
+    pools = models.Pool.__table__
+    source = (
+        select(
+            members.c.pool_id, members.c.wallet_address, literal(DEPOSIT), literal(amount, BigInteger),
+            pools.c.cycle, literal(txid, String), literal(round, BigInteger), literal(datetime.utcnow(), DateTime),
+        )
+        .join(pools, pools.c.id == members.c.pool_id)
+        .where(members.c.pool_id == pool_id, members.c.wallet_address == wallet)
+    )
+    stmt = dialect_insert(db, events).from_select(
+        ["pool_id", "wallet_address", "kind", "amount", "cycle", "txid", "round", "created_at"], source,
+    )
+    return db.execute(stmt.on_conflict_do_nothing()).rowcount == 1
+
+
+def _checkpoint(db):
+    """(last compacted event id, {gap id: (unix time first missed, xid horizon or None)})."""
+    row = db.get(models.LedgerCheckpoint, CHECKPOINT)
+    if row is None:
+        return 0, {}
+    return row.last_event_id, {gap[0]: (gap[1], gap[2] if len(gap) > 2 else None) for gap in json.loads(row.gaps or "[]")}
+
+
+def _snapshot(db):
+    """(xmin, xmax) of the current Postgres snapshot, or None where ids commit in order."""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return tuple(db.execute(text(
+        "SELECT pg_snapshot_xmin(s)::text::bigint, pg_snapshot_xmax(s)::text::bigint FROM pg_current_snapshot() s"
+    )).one())
+
+
+def _pending(last_id, gaps):
+    events = models.DepositEvent
+    return or_(events.id > last_id, events.id.in_(sorted(gaps))) if gaps else events.id > last_id
+
+
+def uncompacted(db):
+    """Condition on deposit_events for the events the rollups do not include yet."""
+    return _pending(*_checkpoint(db))
+
+
+def balances(db, keys):
+    """
+    Current {(pool_id, wallet): balance}: the member rollup plus events not yet
+    compacted. Members without any event are 0.
+    """
+    keys = list(set(keys))
+    result = dict.fromkeys(keys, 0)
+    if not keys:
+        return result
+    rollup = models.MemberBalance
+    events = models.DepositEvent
+    pending = uncompacted(db)
+    for chunk in _chunks(keys, 500):
+        result.update({
+            (pool_id, wallet): balance for pool_id, wallet, balance in db.execute(
+                select(rollup.pool_id, rollup.wallet_address, rollup.balance)
+                .where(tuple_(rollup.pool_id, rollup.wallet_address).in_(chunk))
+            )
+        })
+        tail = db.execute(
+            select(events.pool_id, events.wallet_address, events.kind, events.amount)
+            .where(pending, tuple_(events.pool_id, events.wallet_address).in_(chunk))
+            .order_by(events.id)
+        ).all()
+        for pool_id, wallet, kind, amount in tail:
+            key = (pool_id, wallet)
+            result[key] = apply(result[key], kind, amount)[0]
+    return result
+
+
+def deposited(db, keys):
+    """
+    {(pool_id, wallet): deposits and corrections since the member's last full
+    refund}, i.e. what the local-state contract keeps in deposited_amount: its
+    payouts and billing's charges never reduce it. Chain sync reconciles
+    against this, not against the balance. Members without any event are 0.
+    """
+    keys = list(set(keys))
+    result = dict.fromkeys(keys, 0)
+    events = models.DepositEvent
+    for chunk in _chunks(keys, 500):
+        member = tuple_(events.pool_id, events.wallet_address)
+        # withdraw/refund_batch (amount NULL) zero deposited_amount on chain
+        reset = (
+            select(events.pool_id, events.wallet_address, func.max(events.id).label("id"))
+            .where(member.in_(chunk), events.kind == REFUND, events.amount.is_(None))
+            .group_by(events.pool_id, events.wallet_address)
+            .subquery()
+        )
+        result.update({
+            (pool_id, wallet): total for pool_id, wallet, total in db.execute(
+                select(events.pool_id, events.wallet_address, func.sum(events.amount))
+                .outerjoin(reset, and_(reset.c.pool_id == events.pool_id, reset.c.wallet_address == events.wallet_address))
+                .where(member.in_(chunk), events.kind.in_((DEPOSIT, ADJUST)), events.id > func.coalesce(reset.c.id, 0))
+                .group_by(events.pool_id, events.wallet_address)
+            )
+        })
+    return result
+
+
+class _Fold:
+    """Net effect of a run of events on the three rollups."""
+
+    def __init__(self, balances):
+        self.balances = balances  # (pool, wallet) -> balance before the run, updated as events fold in
+        self.members = {}  # (pool, wallet) -> [deposited, refunded, last_event_id]
+        self.cycles = {}  # (pool, cycle) -> [deposited, refunded, deposits]
+        self.member_cycles = {}  # (pool, cycle, wallet) -> amount
+
+    def add(self, event_id, pool_id, wallet, kind, amount, cycle):
+        key = (pool_id, wallet)
+        member = self.members.setdefault(key, [0, 0, 0])
+        totals = self.cycles.setdefault((pool_id, cycle), [0, 0, 0])
+        member[2] = event_id
+        self.balances[key], refunded = apply(self.balances[key], kind, amount)
+        if kind == REFUND:
+            member[1] += refunded
+            totals[1] += refunded
+            return
+        if kind == CHARGE:
+            return
+        if kind == DEPOSIT:
+            member[0] += amount
+            totals[0] += amount
+            totals[2] += 1
+            self.member_cycles[(pool_id, cycle, wallet)] = self.member_cycles.get((pool_id, cycle, wallet), 0) + amount
+        elif amount >= 0:
+            member[0] += amount
+        else:
+            member[1] -= amount
+
+
+class LedgerCompactor:
+    """
+    Folds new deposit_events into the rollups, `batch_size` events per transaction.
+
+    The checkpoint (last compacted event id and gaps, see above) only moves
+    from the value a pass started at, so two compactors never apply a batch
+    twice. With several replicas, pass a leases.LeaderLease as well so only one
+    of them does the work.
+    """
+
+    def __init__(self, session_factory, batch_size=5000, interval=1.0, on_compacted=None, leader=None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_compacted = on_compacted  # called with (pool ids, wallets) touched by each batch
+        self.leader = leader
+        self.stats = {"events": 0, "batches": 0, "last_event_id": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def compact_once(self):
+        """Compacts everything pending. Returns the number of events applied."""
+        applied = 0
+        while True:
+            n = self._compact_batch()
+            applied += n
+            if n < self.batch_size:
+                return applied
+
+    def _compact_batch(self):
+        events = models.DepositEvent
+        db = self.session_factory()
+        try:
+            start = _checkpoint(db)
+            last_id, gaps = start
+            query = select(
+                events.id, events.pool_id, events.wallet_address, events.kind, events.amount, events.cycle
+            ).where(_pending(last_id, gaps))
+            # Gaps sort first: they are below last_id
+            rows = db.execute(query.order_by(events.id).limit(self.batch_size)).all()
+            now = int(time.time())
+            snapshot = _snapshot(db)
+            # Every transaction that was open when the horizon was noted has ended: the id is gone for good
+            settled = {
+                event_id for event_id, (_, horizon) in gaps.items()
+                if snapshot is not None and horizon is not None and horizon <= snapshot[0]
+            }
+            expired = [
+                event_id for event_id, (first, _) in gaps.items()
+                if event_id not in settled and now - first > GAP_RETENTION_SECONDS
+            ]
+            unnoted = snapshot is not None and any(horizon is None for _, horizon in gaps.values())
+            if not rows and not settled and not expired and not unnoted:
+                return 0
+
+            # Ids passed over on the way to the new last_id have not committed (yet)
+            seen = {row[0] for row in rows}
+            new_last = max([last_id] + [event_id for event_id in seen if event_id > last_id])
+            missed = set(range(last_id + 1, new_last)) - seen
+            new_gaps = {
+                # Noted a pass after the gap was found, so the writer holding the id already has its xid
+                event_id: (first, horizon if horizon is not None or snapshot is None else snapshot[1])
+                for event_id, (first, horizon) in gaps.items()
+                if event_id not in seen and event_id not in settled and event_id not in expired
+            }
+            new_gaps.update(dict.fromkeys(missed, (now, None)))
+            if len(new_gaps) > MAX_GAPS:
+                # Oldest first; the newest ids are the likeliest still to commit
+                expired += sorted(new_gaps, key=lambda event_id: (new_gaps[event_id][0], event_id))[:len(new_gaps) - MAX_GAPS]
+                for event_id in expired:
+                    new_gaps.pop(event_id, None)
+            if expired:
+                logger.warning(f"Ledger gave up waiting for event ids {sorted(expired)[:20]}{'...' if len(expired) > 20 else ''}")
+
+            rollup = models.MemberBalance
+            keys = {(pool_id, wallet) for _, pool_id, wallet, _, _, _ in rows}
+            fold = _Fold(dict.fromkeys(keys, 0))
+            for chunk in _chunks(list(keys), 500):
+                fold.balances.update({
+                    (pool_id, wallet): balance for pool_id, wallet, balance in db.execute(
+                        select(rollup.pool_id, rollup.wallet_address, rollup.balance)
+                        .where(tuple_(rollup.pool_id, rollup.wallet_address).in_(chunk))
+                    )
+                })
+            for row in rows:
+                fold.add(*row)
+
+            if rows:
+                self._apply(db, fold)
+            if not self._save_checkpoint(db, (new_last, new_gaps), start):
+                db.rollback()
+                logger.info(f"Ledger checkpoint moved past {start} by another compactor")
+                return 0
+            db.commit()
+        finally:
+            db.close()
+
+        self.stats["events"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["last_event_id"] = new_last
+        if rows and self.on_compacted is not None:
+            self.on_compacted({pool_id for pool_id, _ in keys}, {wallet for _, wallet in keys})
+        return len(rows)
+
+    def _apply(self, db, fold):
+        balances = models.MemberBalance.__table__
+        stmt = dialect_insert(db, balances)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["pool_id", "wallet_address"],
+                set_={
+                    "deposited": balances.c.deposited + stmt.excluded.deposited,
+                    "refunded": balances.c.refunded + stmt.excluded.refunded,
+                    "balance": stmt.excluded.balance,
+                    "last_event_id": stmt.excluded.last_event_id,
+                },
+            ),
+            [
+                {
+                    "pool_id": pool_id, "wallet_address": wallet, "deposited": deposited, "refunded": refunded,
+                    "balance": fold.balances[(pool_id, wallet)], "last_event_id": last_id,
+                }
+                for (pool_id, wallet), (deposited, refunded, last_id) in fold.members.items()
+            ],
+        )
+
+        # Payers count distinct wallets, so find which (pool, cycle, wallet) rows are new first
+        member_cycles = models.MemberCycleDeposit.__table__
+        existing = set()
+        for chunk in _chunks(list(fold.member_cycles), 500):
+            existing.update(tuple(row) for row in db.execute(
+                select(member_cycles.c.pool_id, member_cycles.c.cycle, member_cycles.c.wallet_address)
+                .where(tuple_(member_cycles.c.pool_id, member_cycles.c.cycle, member_cycles.c.wallet_address).in_(chunk))
+            ))
+        if fold.member_cycles:
+            stmt = dialect_insert(db, member_cycles)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["pool_id", "cycle", "wallet_address"],
+                    set_={"amount": member_cycles.c.amount + stmt.excluded.amount},
+                ),
+                [
+                    {"pool_id": pool_id, "cycle": cycle, "wallet_address": wallet, "amount": amount}
+                    for (pool_id, cycle, wallet), amount in fold.member_cycles.items()
+                ],
+            )
+        payers = {}
+        for pool_id, cycle, wallet in fold.member_cycles:
+            if (pool_id, cycle, wallet) not in existing:
+                payers[(pool_id, cycle)] = payers.get((pool_id, cycle), 0) + 1
+
+        totals = models.PoolCycleTotal.__table__
+        stmt = dialect_insert(db, totals)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["pool_id", "cycle"],
+                set_={
+                    "deposited": totals.c.deposited + stmt.excluded.deposited,
+                    "refunded": totals.c.refunded + stmt.excluded.refunded,
+                    "deposits": totals.c.deposits + stmt.excluded.deposits,
+                    "payers": totals.c.payers + stmt.excluded.payers,
+                },
+            ),
+            [
+                {
+                    "pool_id": pool_id, "cycle": cycle, "deposited": deposited, "refunded": refunded,
+                    "deposits": deposits, "payers": payers.get((pool_id, cycle), 0),
+                }
+                for (pool_id, cycle), (deposited, refunded, deposits) in fold.cycles.items()
+            ],
+        )
+
+        # The member row's deposited_amount is the projection readers already use
+        members = models.PoolMember.__table__
+        db.execute(
+            update(members)
+            .where(members.c.pool_id == bindparam("b_pool_id"), members.c.wallet_address == bindparam("b_wallet"))
+            .values(deposited_amount=bindparam("b_balance")),
+            [
+                {"b_pool_id": pool_id, "b_wallet": wallet, "b_balance": fold.balances[(pool_id, wallet)]}
+                for pool_id, wallet in fold.members
+            ],
+        )
+
+    def _save_checkpoint(self, db, checkpoint, expected):
+        """Moves the checkpoint from `expected` to `checkpoint`. False if another compactor moved it first."""
+        table = models.LedgerCheckpoint.__table__
+        last_id, gaps = checkpoint
+        stmt = dialect_insert(db, table).values(
+            name=CHECKPOINT, last_event_id=last_id, gaps=_gaps_json(gaps), updated_at=datetime.utcnow(),
+        )
+        result = db.execute(stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"last_event_id": stmt.excluded.last_event_id, "gaps": stmt.excluded.gaps, "updated_at": stmt.excluded.updated_at},
+            where=(table.c.last_event_id == expected[0]) & (table.c.gaps == _gaps_json(expected[1])),
+        ))
+        return result.rowcount == 1
+
+    def pending(self):
+        db = self.session_factory()
+        try:
+            return db.scalar(select(func.count()).select_from(models.DepositEvent).where(uncompacted(db)))
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------ #
+    # Worker thread
+    # ------------------------------------------------------------------ #
+
+    def wake(self):
+        """Compacts right away instead of at the next interval, e.g. after a deposit."""
+        self._wake.set()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if self.leader is None or self.leader.acquire():
+                    with metrics.span("job", "ledger_compaction"):
+                        self.compact_once()
+            except Exception as e:
+                logger.exception(f"Ledger compaction failed: {e}")
+            self._wake.wait(self.interval)
+
+
+def _gaps_json(gaps):
+    return json.dumps(
+        [[event_id, first] if horizon is None else [event_id, first, horizon] for event_id, (first, horizon) in sorted(gaps.items())],
+        separators=(",", ":"),
+    )
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    compactor = LedgerCompactor(SessionLocal)
+    print(f"Compacted {compactor.compact_once()} events, checkpoint at event {compactor.stats['last_event_id']}")
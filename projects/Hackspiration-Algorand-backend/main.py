@@ -1,19 +1,76 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException
+import sys
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, BackgroundTasks, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import select, tuple_, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from apscheduler.schedulers.background import BackgroundScheduler
-from typing import List
+from typing import List, Optional, Union
 
-from database import engine, Base, get_db
-import models, schemas
-from deploy import deploy, get_deployer_account, get_algod_client
+from database import engine, async_engine, get_async_db, dialect_insert
+import models, schemas, migrations
+import metrics
+import deployments
+import refunds
+import leases
+import ledger
+import stream
+import etags
+import export
+import queries
+from batcher import AtcSender, GroupBatcher
+from chain_sync import ChainSync
+import artifacts
+from renewals import RenewalEngine
+from cache import build_cache, pool_key, user_key
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# The chain stack (algosdk, algokit_utils, pyteal/beaker) is imported on first
+# use, so workers boot without it; see bench/startup.py
+def get_chain():
+    from chain import get_chain
 
-app = FastAPI(title="SubShare API")
+    return get_chain()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Bring the schema up to date (versioned, see migrations.py), then start the workers
+    await asyncio.to_thread(migrations.upgrade, engine)
+    hub.bind(asyncio.get_running_loop())
+    chain_batcher.start()
+    renewal_engine.start()
+    # Warm the compiled-contract cache with one file read per variant, if entries exist
+    for variant in artifacts.VARIANTS:
+        artifacts.read_cached(variant)
+    deployment_queue.start()
+    chain_sync.start()
+    ledger_compactor.start()
+    yield
+    # Ends the open streams so the server does not wait on them
+    hub.close_all()
+    chain_sync.stop()
+    ledger_compactor.stop()
+    deployment_queue.stop()
+    renewal_engine.stop()
+    chain_batcher.stop()
+    # Hand the leader leases over right away instead of letting them expire
+    for lease in (chain_sync.leader, ledger_compactor.leader, deployment_queue.leader, renewal_engine.leader):
+        if lease is not None:
+            await asyncio.to_thread(lease.release)
+
+app = FastAPI(title="SubShare API", lifespan=lifespan)
+
+# Read-through cache for the single-pool and per-wallet lookups
+cache = build_cache()
+
+# Pushes pool and membership diffs to /pools/stream clients (see stream.py)
+hub = stream.Hub(
+    max_clients=int(os.getenv("STREAM_MAX_CLIENTS", "10000")),
+    queue_size=int(os.getenv("STREAM_QUEUE_SIZE", "256")),
+)
+STREAM_MAX_POOLS = 100
 
 # CORS
 app.add_middleware(
@@ -22,8 +79,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Spans"],
 )
 
+# Per-route latency and queries per request; send X-Profile: 1 for a span breakdown
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+
 # Dependency to get DB session
 def get_db_session():
     db = SessionLocal()
@@ -34,39 +98,11 @@ def get_db_session():
 
 from database import SessionLocal
 
-@app.post("/create-pool", response_model=schemas.Pool)
-def create_pool(pool: schemas.PoolCreate, db: Session = Depends(get_db)):
-    # 1. Deploy Smart Contract
-    # In a real app, we might want the user to deploy. 
-    # For MVP, backend deploys on behalf of user (or checks pre-deployed ID if frontend deploys).
-    # Here we assume backend deploys.
-    
-    try:
-        algod_client = get_algod_client()
-        deployer = get_deployer_account(algod_client)
-        
-        # We need to import the contract spec. 
-        # Ideally this comes from the contract file or artifact.
-        # For simplicity, we assume we can import the app spec here or use a dummy one if file not present in backend context.
-        # In a real monorepo, backend would import from contracts package.
-        # Here we will just place a placeholder or assume the contract file is copied.
-        # For this MVP, we will simulate the deployment ID or use a simplified deploy if files aren't shared.
-        
-        # REAL IMPLEMENTATION:
-        # app_id = deploy(pool.subscription_name, pool.admin_wallet, pool.cost_per_cycle, pool.max_members, pool.cycle_duration)
-        
-        # Mocking app_id for MVP if contract code isn't directly importable in backend env without package setup
-        # But we will try to do it right if possible.
-        app_id = 123456 # Placeholder if deployment fails
-        contract_address = "mock_address"
-
-        # TO DO: Integrate actual deployment call here
-        
-    except Exception as e:
-        print(f"Deployment failed: {e}")
-        # Proceeding for MVP structure
-        pass
-        
+@app.post("/create-pool", response_model=schemas.Pool, status_code=202)
+async def create_pool(pool: schemas.PoolCreate, db: AsyncSession = Depends(get_async_db)):
+    # The contract is deployed by the backend on behalf of the admin. That takes
+    # several chain round-trips, so the row is created as pending and the
+    # deployment queue fills in app_id/contract_address in the background.
     db_pool = models.Pool(
         subscription_name=pool.subscription_name,
         admin_wallet=pool.admin_wallet,
@@ -75,85 +111,462 @@ def create_pool(pool: schemas.PoolCreate, db: Session = Depends(get_db)):
         cycle_duration=pool.cycle_duration,
         renewal_timestamp=int(datetime.utcnow().timestamp()) + pool.cycle_duration,
         status=0, # FORMING
-        contract_address="APP_ID_123" # Replace with actual
+        deployment_status=deployments.PENDING,
+        storage=deployments.choose_storage(pool.max_members, pool.storage),
     )
     db.add(db_pool)
-    db.commit()
-    db.refresh(db_pool)
+    await db.commit()
+    await db.refresh(db_pool)
+    deployment_queue.submit(db_pool.id)
+    renewal_engine.schedule_pool(db_pool)
+    await cache.ainvalidate(pool_key(db_pool.id))
     return db_pool
 
+@app.get("/pool/{pool_id}/deployment", response_model=schemas.Deployment)
+async def get_pool_deployment(pool_id: int, db: AsyncSession = Depends(get_async_db)):
+    pool = await db.get(models.Pool, pool_id)
+    if not pool:
+        raise HTTPException(status_code=404, detail="Pool not found")
+    return schemas.Deployment(
+        pool_id=pool.id,
+        status=pool.deployment_status,
+        app_id=pool.app_id,
+        contract_address=pool.contract_address,
+        error=pool.deployment_error,
+    )
+
+@app.post("/pool/{pool_id}/refunds", status_code=202)
+async def refund_pool(pool_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    # Box-storage pools are refunded by the backend once the admin has
+    # dissolved them on chain, 64 members per atomic group (see refunds.py)
+    pool = await db.get(models.Pool, pool_id)
+    if not pool:
+        raise HTTPException(status_code=404, detail="Pool not found")
+    if pool.storage != "box" or pool.app_id is None:
+        raise HTTPException(status_code=409, detail="Only deployed box-storage pools can be refunded in batches")
+    # The chain is the source of truth here; chain_sync brings the row's status in line
+    if not await asyncio.to_thread(refunds.is_dissolved, get_chain().algod, pool.app_id):
+        raise HTTPException(status_code=409, detail="Pool is not dissolved on chain")
+    renewal_engine.unschedule(pool_id)
+    background_tasks.add_task(asyncio.to_thread, refunds.refund_pool, pool.app_id)
+    return {"pool_id": pool_id, "app_id": pool.app_id}
+
 @app.get("/pool/{pool_id}", response_model=schemas.Pool)
-def get_pool(pool_id: int, db: Session = Depends(get_db)):
-    pool = db.query(models.Pool).filter(models.Pool.id == pool_id).first()
+async def get_pool(pool_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        pool = await db.get(models.Pool, pool_id)
+        return schemas.Pool.model_validate(pool).model_dump(mode="json") if pool else None
+
+    pool = await cache.aget_or_load(pool_key(pool_id), load)
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found")
     return pool
 
-@app.get("/pools", response_model=List[schemas.Pool])
-def list_pools(db: Session = Depends(get_db)):
-    return db.query(models.Pool).all()
+@app.get("/pool/{pool_id}/detail", response_model=schemas.PoolDetail)
+async def get_pool_detail(
+    pool_id: int,
+    wallet: Optional[str] = None,
+    members_limit: int = Query(1000, ge=0, le=5000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Two statements whatever the member count: the pool with its aggregates,
+    # then the member rows. No relationship is lazy-loaded.
+    members = models.PoolMember
+    row = (await db.execute(
+        select(
+            models.Pool,
+            func.count(members.id),
+            func.coalesce(func.sum(members.deposited_amount), 0),
+            func.coalesce(func.sum(case((members.is_active, 1), else_=0)), 0),
+        )
+        .outerjoin(members, members.pool_id == models.Pool.id)
+        .where(models.Pool.id == pool_id)
+        .group_by(models.Pool.id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Pool not found")
+    pool, member_count, total_deposited, active_members = row
+
+    query = select(members).where(members.pool_id == pool_id)
+    if wallet is not None:
+        # Caller first, so their membership is in the page however large the pool is
+        query = query.order_by((members.wallet_address == wallet).desc(), members.id)
+    else:
+        query = query.order_by(members.id)
+    # members_limit=0 with a wallet still fetches the caller's row
+    limit = max(members_limit, 1 if wallet is not None else 0)
+    rows = (await db.scalars(query.limit(limit))).all() if limit else []
+    membership = rows[0] if rows and wallet is not None and rows[0].wallet_address == wallet else None
+    rows = rows[:members_limit]
+
+    cost = pool.cost_per_cycle or 0
+    return schemas.PoolDetail(
+        pool=schemas.Pool.model_validate(pool),
+        stats=schemas.PoolStats(
+            member_count=member_count,
+            active_members=active_members,
+            total_deposited=total_deposited,
+            funding_progress=min(1.0, total_deposited / cost) if cost else 1.0,
+            funding_shortfall=max(0, cost - total_deposited),
+        ),
+        members=[schemas.PoolMember.model_validate(m) for m in rows],
+        membership=schemas.PoolMember.model_validate(membership) if membership else None,
+    )
+
+POOL_CARD_COLUMNS = (
+    models.Pool.id,
+    models.Pool.subscription_name,
+    models.Pool.cost_per_cycle,
+    models.Pool.max_members,
+    models.Pool.cycle_duration,
+    models.Pool.renewal_timestamp,
+    models.Pool.status,
+)
+
+# Every schemas.Pool field, in the schema's order
+POOL_COLUMNS = tuple(getattr(models.Pool, name) for name in schemas.Pool.model_fields)
+
+@app.get("/pools", response_model=Union[schemas.PoolPage, schemas.PoolCardPage, List[schemas.Pool], List[schemas.PoolCard]])
+async def list_pools(
+    request: Request,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    status: Optional[int] = None,
+    admin_wallet: Optional[str] = None,
+    subscription_name: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|card)$"),
+    paginate: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Plain column tuples straight to orjson; no ORM objects, no pydantic validation
+    columns = POOL_CARD_COLUMNS if view == "card" else POOL_COLUMNS
+    query = select(*columns)
+    if status is not None:
+        query = query.where(models.Pool.status == status)
+    if admin_wallet is not None:
+        query = query.where(models.Pool.admin_wallet == admin_wallet)
+    if subscription_name is not None:
+        query = query.where(models.Pool.subscription_name == subscription_name)
+    query = query.order_by(models.Pool.id)
+    # Legacy behaviour (paginate=false): the whole table as a plain list.
+    # Otherwise keyset pagination on id, with one extra row to know if there is a next page
+    if paginate:
+        if cursor is not None:
+            query = query.where(models.Pool.id > cursor)
+        query = query.limit(limit + 1)
+
+    # Unchanged since the client's copy: one aggregate over the page's rows, no list query
+    tag = etags.etag(request, (await db.execute(etags.version_query(query, models.Pool))).one())
+    not_modified = etags.not_modified(request, tag)
+    if not_modified is not None:
+        return not_modified
+
+    rows = (await db.execute(query)).all()
+    if not paginate:
+        return etags.json_response(request, etags.records(columns, rows), tag)
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return etags.json_response(request, {"items": etags.records(columns, rows[:limit]), "next_cursor": next_cursor}, tag)
 
 @app.post("/join-pool", response_model=schemas.PoolMember)
-def join_pool(member: schemas.PoolMemberCreate, db: Session = Depends(get_db)):
+async def join_pool(member: schemas.PoolMemberCreate, db: AsyncSession = Depends(get_async_db)):
     # Verify pool exists
-    pool = db.query(models.Pool).filter(models.Pool.id == member.pool_id).first()
+    pool = await db.get(models.Pool, member.pool_id)
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found")
         
-    # Check if already a member
-    existing = db.query(models.PoolMember).filter(
-        models.PoolMember.pool_id == member.pool_id, 
-        models.PoolMember.wallet_address == member.wallet_address
-    ).first()
-    
-    if existing:
-        return existing
-
-    new_member = models.PoolMember(
+    # Single-statement upsert: concurrent joins collapse onto one row. The no-op
+    # DO UPDATE (instead of DO NOTHING) makes RETURNING yield an existing row too.
+    stmt = dialect_insert(db, models.PoolMember).values(
         pool_id=member.pool_id,
         wallet_address=member.wallet_address,
         is_active=True,
         deposited_amount=0
     )
-    db.add(new_member)
-    db.commit()
-    db.refresh(new_member)
-    return new_member
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["pool_id", "wallet_address"],
+        set_={"pool_id": stmt.excluded.pool_id},
+    ).returning(models.PoolMember)
+    joined = await db.scalar(stmt)
+    await db.commit()
+    await cache.ainvalidate(user_key(member.wallet_address))
+    if hub.subscribed([stream.pool_topic(member.pool_id), stream.wallet_topic(member.wallet_address)]):
+        await asyncio.to_thread(stream.publish_members, hub, SessionLocal, [member.pool_id], [member.wallet_address])
+    return joined
 
 @app.post("/deposit")
-def track_deposit(pool_id: int, wallet_address: str, amount: int, db: Session = Depends(get_db)):
-    member = db.query(models.PoolMember).filter(
-        models.PoolMember.pool_id == pool_id, 
-        models.PoolMember.wallet_address == wallet_address
-    ).first()
-    if not member:
+async def track_deposit(pool_id: int, wallet_address: str, amount: int, txid: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    # With a txid, check the payment on chain before crediting it
+    if txid is not None:
+        pool = await db.get(models.Pool, pool_id)
+        if not pool:
+            raise HTTPException(status_code=404, detail="Pool not found")
+        verified = await asyncio.to_thread(get_chain().verify_payment, txid, wallet_address, pool.contract_address, amount)
+        if not verified:
+            raise HTTPException(status_code=400, detail="Payment not found on chain")
+
+    # Appended to the deposit ledger; the member row is left to the compactor
+    key = (pool_id, wallet_address)
+
+    def record(session):
+        inserted = ledger.record_deposit(session, pool_id, wallet_address, amount, txid)
+        if not inserted and not session.scalar(
+            queries.membership(pool_id, wallet_address)
+        ):
+            return None, None
+        return inserted, ledger.balances(session, [key])[key]
+
+    inserted, new_balance = await db.run_sync(record)
+    if inserted is None:
         raise HTTPException(status_code=404, detail="Member not found")
-    
-    member.deposited_amount += amount
-    db.commit()
-    return {"status": "updated", "new_balance": member.deposited_amount}
+
+    await db.commit()
+    ledger_compactor.wake()
+    if inserted:
+        # The pool aggregates follow once the compactor has folded the deposit in
+        hub.publish([stream.member_event(pool_id, wallet_address, deposited_amount=new_balance)])
+    return {"status": "updated" if inserted else "duplicate", "new_balance": new_balance}
+
+@app.post("/deposits/batch", response_model=schemas.DepositBatchResult)
+async def track_deposits_batch(batch: schemas.DepositBatch, db: AsyncSession = Depends(get_async_db)):
+    # One event per txid; a record repeated in the batch or sent before is dropped
+    records = {(r.txid, r.pool_id, r.wallet_address): r for r in batch.deposits}
+    if not records:
+        return {"applied": 0, "unknown": []}
+
+    # Look up which members exist, chunked to stay under the bind-parameter limit
+    members = models.PoolMember.__table__
+    keys = list({(r.pool_id, r.wallet_address) for r in records.values()})
+    known = set()
+    for i in range(0, len(keys), 500):
+        result = await db.execute(
+            select(members.c.pool_id, members.c.wallet_address)
+            .where(tuple_(members.c.pool_id, members.c.wallet_address).in_(keys[i:i + 500]))
+        )
+        known.update(tuple(row) for row in result)
+
+    # Appended with a single executemany; the ledger's txid index drops replays
+    events = [
+        {"pool_id": r.pool_id, "wallet_address": r.wallet_address, "kind": ledger.DEPOSIT, "amount": r.amount, "txid": r.txid}
+        for r in records.values()
+        if (r.pool_id, r.wallet_address) in known
+    ]
+    applied = await db.run_sync(ledger.append, events)
+    await db.commit()
+    ledger_compactor.wake()
+
+    unknown = [r for r in batch.deposits if (r.pool_id, r.wallet_address) not in known]
+    return {"applied": applied, "unknown": unknown}
+
+@app.get("/pool/{pool_id}/cycles", response_model=List[schemas.CycleTotal])
+async def get_pool_cycles(pool_id: int, limit: int = Query(50, ge=1, le=500), db: AsyncSession = Depends(get_async_db)):
+    # Precomputed by the ledger compactor, newest cycle first
+    totals = models.PoolCycleTotal
+    rows = await db.scalars(select(totals).where(totals.pool_id == pool_id).order_by(totals.cycle.desc()).limit(limit))
+    return rows.all()
+
+@app.get("/pool/{pool_id}/cycles/{cycle}/payers", response_model=List[schemas.CyclePayer])
+async def get_cycle_payers(pool_id: int, cycle: int, db: AsyncSession = Depends(get_async_db)):
+    payers = models.MemberCycleDeposit
+    rows = await db.scalars(
+        select(payers).where(payers.pool_id == pool_id, payers.cycle == cycle).order_by(payers.wallet_address)
+    )
+    return rows.all()
+
+@app.get("/pool/{pool_id}/invoices", response_model=List[schemas.Invoice])
+async def get_pool_invoices(pool_id: int, cycle: Optional[int] = None, db: AsyncSession = Depends(get_async_db)):
+    # Written by billing.py at renewal; defaults to the latest billed cycle
+    invoices = models.Invoice
+    if cycle is None:
+        cycle = await db.scalar(select(func.max(invoices.cycle)).where(invoices.pool_id == pool_id))
+        if cycle is None:
+            return []
+    rows = await db.scalars(
+        select(invoices).where(invoices.pool_id == pool_id, invoices.cycle == cycle).order_by(invoices.wallet_address)
+    )
+    return rows.all()
 
 @app.get("/user/{wallet_address}", response_model=List[schemas.PoolMember])
-def get_user_memberships(wallet_address: str, db: Session = Depends(get_db)):
-    return db.query(models.PoolMember).filter(models.PoolMember.wallet_address == wallet_address).all()
+async def get_user_memberships(wallet_address: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        # The version is read first and cached with the body, so the tag never claims newer data than it carries
+        query = queries.wallet_memberships(wallet_address)
+        version = (await db.execute(etags.version_query(query, models.PoolMember))).one()
+        rows = (await db.execute(query)).all()
+        # Cached values must be plain JSON for the shared backends
+        items = [dict(m, joined_at=m["joined_at"].isoformat() if m["joined_at"] else None) for m in etags.records(queries.MEMBER_COLUMNS, rows)]
+        return {"version": list(version), "items": items}
+
+    cached = await cache.aget_or_load(user_key(wallet_address), load)
+    tag = etags.etag(request, cached["version"])
+    not_modified = etags.not_modified(request, tag)
+    if not_modified is not None:
+        return not_modified
+    return etags.json_response(request, cached["items"], tag)
+
+@app.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv|parquet)$"),
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    # Streams from a server-side cursor on the sync engine; see export.py
+    if dataset not in export.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown export {dataset}")
+    try:
+        chunks = export.stream(engine, dataset, fmt, status, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=export.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{fmt}"'},
+    )
+
+def stream_topics(pool, wallet):
+    if len(pool) > STREAM_MAX_POOLS:
+        raise HTTPException(status_code=400, detail=f"At most {STREAM_MAX_POOLS} pools per stream")
+    topics = [stream.pool_topic(pool_id) for pool_id in pool]
+    if wallet:
+        topics.append(stream.wallet_topic(wallet))
+    if not topics:
+        raise HTTPException(status_code=400, detail="Subscribe to at least one pool or a wallet")
+    return topics
+
+@app.get("/pools/stream")
+async def stream_pools(pool: List[int] = Query([]), wallet: Optional[str] = None):
+    # Server-sent `pool` and `member` diffs instead of re-fetching after every change
+    topics = stream_topics(pool, wallet)
+    if hub.full():
+        raise HTTPException(status_code=503, detail="Too many stream clients on this worker")
+    return StreamingResponse(
+        stream.sse_events(hub, topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/pools/stream/ws")
+async def stream_pools_ws(websocket: WebSocket, pool: List[int] = Query([]), wallet: Optional[str] = None):
+    try:
+        topics = stream_topics(pool, wallet)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    sub = hub.subscribe(topics)
+    if sub is None:
+        await websocket.close(code=1013)
+        return
+    await stream.websocket_events(hub, sub, websocket)
+
+@app.get("/stream/stats")
+async def stream_stats():
+    return hub.stats
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/chain/stats")
+async def chain_stats():
+    return get_chain().stats.snapshot()
+
+@app.get("/chain/sync/stats")
+async def chain_sync_stats():
+    return chain_sync.stats
+
+@app.get("/chain/batcher/stats")
+async def chain_batcher_stats():
+    return chain_batcher.stats.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    body = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 # Scheduler for Renewal
+def invalidate_renewed(pool_ids):
+    cache.invalidate(*(pool_key(pool_id) for pool_id in pool_ids))
+    stream.publish_pools(hub, SessionLocal, pool_ids)
+
+# Backend-initiated app calls go out in atomic groups of up to 16
+chain_batcher = GroupBatcher(AtcSender(), max_in_flight=int(os.getenv("CHAIN_GROUPS_IN_FLIGHT", "4")))
+
+# Every worker process and replica shares the same rows. "lease" (default) lets all
+# of them renew, each claiming its own batches; "leader" renews from one at a time.
+WORKER_ID = leases.worker_id()
+if os.getenv("RENEWAL_COORDINATION", "lease") == "leader":
+    renewal_coordination = {"leader": leases.LeaderLease(SessionLocal, "renewals", WORKER_ID)}
+else:
+    renewal_coordination = {"owner": WORKER_ID}
+
+# Splits each renewing pool's cost across its active members (NumPy, imported on first use)
+def bill_renewals(db, now, pool_ids, owner):
+    import billing
+
+    return billing.bill_due(db, now, pool_ids, owner)
+
+renewal_engine = RenewalEngine(
+    SessionLocal,
+    on_renewed=invalidate_renewed,
+    batcher=chain_batcher,
+    billing=bill_renewals if os.getenv("BILLING_ENABLED", "true").lower() == "true" else None,
+    **renewal_coordination,
+)
+
+def invalidate_deployed(pool_ids):
+    cache.invalidate(*(pool_key(pool_id) for pool_id in pool_ids))
+    stream.publish_pools(hub, SessionLocal, pool_ids)
+
+deployment_queue = deployments.DeploymentQueue(
+    SessionLocal,
+    workers=int(os.getenv("DEPLOY_WORKERS", "4")),
+    on_deployed=invalidate_deployed,
+    leader=leases.LeaderLease(SessionLocal, "deployment-recovery", WORKER_ID),
+)
+
+def invalidate_synced(pool_ids, wallets):
+    cache.invalidate(*(pool_key(pool_id) for pool_id in pool_ids), *(user_key(wallet) for wallet in wallets))
+    stream.publish_members(hub, SessionLocal, pool_ids, wallets)
+
+def reschedule_synced(pool_ids, wallets):
+    invalidate_synced(pool_ids, wallets)
+    # Pools the chain activated, dissolved or moved to a new deadline
+    renewal_engine.refresh(pool_ids)
+
+# Reconciles memberships and deposits with what actually happened on chain
+chain_sync = ChainSync(
+    SessionLocal,
+    interval=float(os.getenv("CHAIN_SYNC_INTERVAL", "5")),
+    on_synced=reschedule_synced,
+    leader=leases.LeaderLease(SessionLocal, "chain-sync", WORKER_ID),
+)
+
+# Folds deposit_events into the per-member and per-cycle rollups
+ledger_compactor = ledger.LedgerCompactor(
+    SessionLocal,
+    interval=float(os.getenv("LEDGER_COMPACT_INTERVAL", "1")),
+    on_compacted=invalidate_synced,
+    leader=leases.LeaderLease(SessionLocal, "ledger-compactor", WORKER_ID),
+)
+
+def renewal_metrics():
+    yield "renewal_lag_seconds", "Seconds the oldest due active pool is overdue.", "gauge", {}, renewal_engine.lag()
+    yield "renewal_queue_size", "Active pools in this worker's renewal queue.", "gauge", {}, len(renewal_engine)
+    yield "deployment_queue_pending", "Pool deployments waiting for a worker.", "gauge", {}, deployment_queue.pending()
+
+metrics.register_collector(renewal_metrics)
+metrics.expose_stats("cache", "Read-through cache counter.", cache.stats)
+metrics.expose_stats("chain", "Chain client counter.", lambda: get_chain().stats.snapshot() if "chain" in sys.modules else {})
+metrics.expose_stats("chain_batcher", "Atomic-group batcher statistic.", chain_batcher.stats.snapshot)
+metrics.expose_stats("chain_sync", "Indexer sync statistic.", lambda: chain_sync.stats)
+metrics.expose_stats("stream", "Stream hub statistic.", lambda: hub.stats)
+metrics.expose_stats("ledger", "Deposit ledger compaction statistic.", lambda: ledger_compactor.stats)
+
 def check_renewals():
-    db = SessionLocal()
-    try:
-        now = int(datetime.utcnow().timestamp())
-        pools = db.query(models.Pool).filter(models.Pool.renewal_timestamp < now, models.Pool.status == 1).all()
-        for pool in pools:
-            print(f"Triggering renewal for pool {pool.id}")
-            # Call Smart Contract Renew Cycle
-            # deploy.renew_cycle(pool.contract_address) 
-            
-            # Update DB
-            pool.renewal_timestamp += pool.cycle_duration
-            db.commit()
-    finally:
-        db.close()
+    # Manual trigger; the engine thread normally wakes itself at the next deadline
+    return renewal_engine.run_due()
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(check_renewals, 'interval', minutes=1)
-scheduler.start()
@@ -0,0 +1,333 @@
+"""
+Process-local instrumentation, exposed in Prometheus text format at /metrics.
+
+- MetricsMiddleware: per-route latency histograms and request counts, plus
+  the number of SQL queries each request ran (an N+1 shows up as a route
+  whose query count grows with the page size).
+- instrument_engine(): SQLAlchemy cursor events that time every query.
+- span(): times a block, e.g. an algod/indexer/KMD call or a background job.
+- Requests sent with `X-Profile: 1` get their span breakdown back: a
+  Server-Timing header with totals per kind, and X-Profile-Spans with the
+  individual spans as JSON.
+
+Metrics are per process; with several workers, scrape each one (or use the
+multiprocess-aware setup of your Prometheus agent).
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+PROFILE_HEADER = "x-profile"
+PROFILING_ENABLED = os.getenv("REQUEST_PROFILING", "true").lower() == "true"
+PROFILE_MAX_SPANS = 100
+
+_registry_lock = threading.Lock()
+_metrics = []  # registration order is render order
+_collectors = []  # callables yielding (name, help, type, labels, value)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_values(items))
+        return lines
+
+    def _render_values(self, items):
+        return [f"{self.name}{_label_text(self.labels, key)} {_number(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_values(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _label_text(self.labels + ("le",), key + (_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def register_collector(fn):
+    """`fn()` is called on every scrape and yields (name, help, type, labels dict, value)."""
+    with _registry_lock:
+        _collectors.append(fn)
+    return fn
+
+
+def expose_stats(prefix, help, snapshot):
+    """Exposes a stats snapshot (flat dict of numbers, as /cache/stats etc. return) as gauges."""
+    def collect():
+        for key, value in snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}_{key}", help, "gauge", {}, value
+
+    return register_collector(collect)
+
+
+def render():
+    """The whole registry in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics, collectors = list(_metrics), list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    seen = set()
+    for collector in collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+            continue
+        for name, help, type, labels, value in samples:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type}")
+            lines.append(f"{name}{_label_text(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------- #
+# Metrics
+# ---------------------------------------------------------------------- #
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_queries = Histogram(
+    "http_request_db_queries", "SQL queries run per HTTP request.", ("method", "route"), buckets=COUNT_BUCKETS,
+)
+db_latency = Histogram("db_query_duration_seconds", "SQL query latency by statement type.", ("operation",))
+chain_latency = Histogram(
+    "chain_request_duration_seconds", "algod/indexer/KMD request latency.", ("service", "endpoint"),
+)
+chain_errors = Counter("chain_request_errors_total", "algod/indexer/KMD requests that raised.", ("service", "endpoint"))
+job_latency = Histogram("job_duration_seconds", "Background job run time.", ("job",))
+
+
+# ---------------------------------------------------------------------- #
+# Spans and per-request context
+# ---------------------------------------------------------------------- #
+
+class RequestStats:
+    __slots__ = ("queries", "spans", "profile")
+
+    def __init__(self, profile=False):
+        self.queries = 0
+        self.spans = [] if profile else None  # (kind, name, start offset, seconds)
+        self.profile = profile
+
+
+_request = contextvars.ContextVar("request_stats", default=None)
+_started = contextvars.ContextVar("request_started", default=0.0)
+
+_HISTOGRAMS = {
+    "db": lambda name, seconds: db_latency.observe(seconds, operation=name),
+    "job": lambda name, seconds: job_latency.observe(seconds, job=name),
+}
+
+
+def record(kind, name, start, seconds):
+    """Records a finished span: its histogram, plus the current request's profile if any."""
+    observe = _HISTOGRAMS.get(kind)
+    if observe is not None:
+        observe(name, seconds)
+    else:
+        chain_latency.observe(seconds, service=kind, endpoint=name)
+    stats = _request.get()
+    if stats is not None:
+        if kind == "db":
+            stats.queries += 1
+        if stats.spans is not None and len(stats.spans) < PROFILE_MAX_SPANS:
+            stats.spans.append((kind, name, start - _started.get(), seconds))
+
+
+@contextlib.contextmanager
+def span(kind, name):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if kind not in _HISTOGRAMS:
+            chain_errors.inc(service=kind, endpoint=name)
+        raise
+    finally:
+        record(kind, name, start, time.perf_counter() - start)
+
+
+# Ids, txids, addresses and box names in chain URLs would explode the label set
+_PATH_IDS = re.compile(r"/(\d+|[A-Z2-7]{52,58}|[A-Za-z0-9_=-]{40,})(?=/|$)")
+
+
+def endpoint_label(path):
+    return _PATH_IDS.sub("/{id}", path.split("?", 1)[0])
+
+
+# ---------------------------------------------------------------------- #
+# SQLAlchemy
+# ---------------------------------------------------------------------- #
+
+def instrument_engine(engine):
+    """Times every cursor execution on `engine` (for an AsyncEngine, pass its sync_engine)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "EMPTY"
+        record("db", operation, start, time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        # after_cursor_execute does not run for a failing statement
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+# ---------------------------------------------------------------------- #
+# ASGI
+# ---------------------------------------------------------------------- #
+
+def _route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _server_timing(stats, total):
+    totals = {}
+    for kind, _, _, seconds in stats.spans:
+        count, elapsed = totals.get(kind, (0, 0.0))
+        totals[kind] = (count + 1, elapsed + seconds)
+    parts = [f'{kind};dur={elapsed * 1000:.2f};desc="{count} calls"' for kind, (count, elapsed) in sorted(totals.items())]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are timed to the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = PROFILING_ENABLED and any(
+            name == PROFILE_HEADER.encode() and value not in (b"", b"0") for name, value in scope.get("headers", ())
+        )
+        stats = RequestStats(profile)
+        start = time.perf_counter()
+        token, started = _request.set(stats), _started.set(start)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stats.profile:
+                    spans = [
+                        {"kind": kind, "name": name, "at_ms": round(at * 1000, 2), "ms": round(seconds * 1000, 2)}
+                        for kind, name, at, seconds in stats.spans
+                    ]
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", _server_timing(stats, time.perf_counter() - start).encode()),
+                        (b"x-profile-spans", json.dumps(spans, separators=(",", ":")).encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request.reset(token)
+            _started.reset(started)
+            method, route = scope.get("method", ""), _route_label(scope)
+            http_latency.observe(elapsed, method=method, route=route)
+            http_queries.observe(stats.queries, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status)
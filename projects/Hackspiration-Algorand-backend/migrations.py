@@ -0,0 +1,392 @@
+"""
+Versioned schema migrations.
+
+Each migration is a (version, description, function) entry in MIGRATIONS and
+runs once, in its own transaction, recording itself in `schema_migrations`.
+That transaction holds the migration lock (an advisory lock on Postgres,
+BEGIN IMMEDIATE on SQLite) and re-reads the version, so workers booting
+together wait for each other instead of applying a migration twice.
+Migrations only ever add to the schema so they work on both SQLite and
+Postgres without table rebuilds. Never edit an applied migration; append a new one.
+
+    python migrations.py            # upgrade the database in DATABASE_URL
+    python migrations.py --check    # also EXPLAIN the hot queries and check index use
+"""
+import logging
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, inspect, text,
+)
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key held while a migration runs
+LOCK_KEY = 0x5B5A4E
+
+
+# ----------------------------------------------------------------------- #
+# Helpers
+# ----------------------------------------------------------------------- #
+
+def _create_index(conn, name, table, columns, unique=False, where=None):
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(text(sql))
+
+
+def _add_column(conn, table, name, ddl):
+    # SQLite has no ADD COLUMN IF NOT EXISTS, so check the live table first
+    if name not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+# ----------------------------------------------------------------------- #
+# Migrations
+# ----------------------------------------------------------------------- #
+
+def _0001_initial(conn):
+    # Frozen copy of the original schema; existing databases already match it
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("wallet_address", String, unique=True, index=True),
+        Column("created_at", DateTime, default=datetime.utcnow),
+    )
+    Table(
+        "pools", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("contract_address", String, unique=True, index=True),
+        Column("subscription_name", String),
+        Column("admin_wallet", String),
+        Column("cost_per_cycle", BigInteger),
+        Column("max_members", Integer),
+        Column("cycle_duration", Integer),
+        Column("renewal_timestamp", BigInteger),
+        Column("status", Integer),
+        Column("created_at", DateTime, default=datetime.utcnow),
+    )
+    Table(
+        "pool_members", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("pool_id", Integer, ForeignKey("pools.id")),
+        Column("wallet_address", String, ForeignKey("users.wallet_address")),
+        Column("is_active", Boolean, default=True),
+        Column("deposited_amount", BigInteger, default=0),
+        Column("joined_at", DateTime, default=datetime.utcnow),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _0002_hot_query_indexes(conn):
+    # Duplicate memberships (possible before join_pool became an upsert) would
+    # block the unique index: fold their deposits into the oldest row first.
+    conn.execute(text("""
+        UPDATE pool_members SET deposited_amount = (
+            SELECT SUM(COALESCE(d.deposited_amount, 0)) FROM pool_members d
+            WHERE d.pool_id = pool_members.pool_id AND d.wallet_address = pool_members.wallet_address
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM pool_members GROUP BY pool_id, wallet_address HAVING COUNT(*) > 1
+        )
+    """))
+    conn.execute(text("""
+        DELETE FROM pool_members WHERE id NOT IN (
+            SELECT MIN(id) FROM pool_members GROUP BY pool_id, wallet_address
+        )
+    """))
+    _create_index(conn, "ix_pool_members_pool_wallet", "pool_members", ["pool_id", "wallet_address"], unique=True)
+    _create_index(conn, "ix_pool_members_wallet_address", "pool_members", ["wallet_address"])
+    _create_index(conn, "ix_pools_status_renewal", "pools", ["status", "renewal_timestamp"])
+
+
+def _0003_pool_deployment_state(conn):
+    _add_column(conn, "pools", "app_id", "BIGINT")
+    _add_column(conn, "pools", "deployment_status", "VARCHAR")
+    _add_column(conn, "pools", "deployment_error", "VARCHAR")
+    # Rows created before the deployment queue already carry their (placeholder) address
+    conn.execute(text("UPDATE pools SET deployment_status = 'deployed' WHERE contract_address IS NOT NULL"))
+
+
+def _0004_pool_storage(conn):
+    _add_column(conn, "pools", "storage", "VARCHAR")
+    conn.execute(text("UPDATE pools SET storage = 'local' WHERE storage IS NULL"))
+
+
+def _0005_sync_checkpoints(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            name VARCHAR PRIMARY KEY,
+            last_round BIGINT,
+            updated_at TIMESTAMP
+        )
+    """))
+    _create_index(conn, "ix_pools_app_id", "pools", ["app_id"])
+
+
+def _0006_renewal_leases(conn):
+    _add_column(conn, "pools", "lease_owner", "VARCHAR")
+    _add_column(conn, "pools", "lease_expires", "BIGINT")
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS leader_leases (
+            name VARCHAR PRIMARY KEY,
+            owner VARCHAR,
+            expires_at BIGINT
+        )
+    """))
+
+
+def _0007_deposit_ledger(conn):
+    _add_column(conn, "pools", "cycle", "BIGINT DEFAULT 0")
+    conn.execute(text("UPDATE pools SET cycle = 0 WHERE cycle IS NULL"))
+    metadata = MetaData()
+    Table(
+        "deposit_events", metadata,
+        Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+        Column("pool_id", Integer),
+        Column("wallet_address", String),
+        Column("kind", String),
+        Column("amount", BigInteger),
+        Column("cycle", BigInteger),
+        Column("txid", String, nullable=True),
+        Column("round", BigInteger, nullable=True),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "member_balances", metadata,
+        Column("pool_id", Integer, primary_key=True),
+        Column("wallet_address", String, primary_key=True),
+        Column("deposited", BigInteger, default=0),
+        Column("refunded", BigInteger, default=0),
+        Column("balance", BigInteger, default=0),
+        Column("last_event_id", BigInteger, default=0),
+    )
+    Table(
+        "pool_cycle_totals", metadata,
+        Column("pool_id", Integer, primary_key=True),
+        Column("cycle", BigInteger, primary_key=True),
+        Column("deposited", BigInteger, default=0),
+        Column("refunded", BigInteger, default=0),
+        Column("deposits", Integer, default=0),
+        Column("payers", Integer, default=0),
+    )
+    Table(
+        "member_cycle_deposits", metadata,
+        Column("pool_id", Integer, primary_key=True),
+        Column("cycle", BigInteger, primary_key=True),
+        Column("wallet_address", String, primary_key=True),
+        Column("amount", BigInteger, default=0),
+    )
+    metadata.create_all(conn, checkfirst=True)
+    _create_index(conn, "ix_deposit_events_txid", "deposit_events", ["txid", "pool_id", "wallet_address", "kind"], unique=True)
+    _create_index(conn, "ix_deposit_events_member", "deposit_events", ["pool_id", "wallet_address"])
+    # Opening balances: existing deposits become the first events, so the rollups match them
+    conn.execute(text("""
+        INSERT INTO deposit_events (pool_id, wallet_address, kind, amount, cycle, created_at)
+        SELECT pool_id, wallet_address, 'deposit', deposited_amount, 0, CURRENT_TIMESTAMP
+        FROM pool_members WHERE deposited_amount > 0
+    """))
+
+
+def _0008_invoices(conn):
+    metadata = MetaData()
+    Table(
+        "invoices", metadata,
+        Column("pool_id", Integer, primary_key=True),
+        Column("cycle", BigInteger, primary_key=True),
+        Column("wallet_address", String, primary_key=True),
+        Column("cycles", Integer, default=1),
+        Column("share", BigInteger, default=0),
+        Column("balance", BigInteger, default=0),
+        Column("charged", BigInteger, default=0),
+        Column("shortfall", BigInteger, default=0),
+        Column("refund", BigInteger, default=0),
+        Column("created_at", DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _0009_table_versions(conn):
+    metadata = MetaData()
+    Table(
+        "table_versions", metadata,
+        Column("name", String, primary_key=True),
+        Column("version", BigInteger, default=0),
+    )
+    metadata.create_all(conn, checkfirst=True)
+    for name in ("pools", "pool_members"):
+        conn.execute(
+            text("INSERT INTO table_versions (name, version) SELECT :name, 0 WHERE NOT EXISTS "
+                 "(SELECT 1 FROM table_versions WHERE name = :name)"),
+            {"name": name},
+        )
+
+
+def _0010_deployment_claims(conn):
+    _add_column(conn, "pools", "deployment_claim_expires", "BIGINT")
+    # Claims taken before this migration have no expiry; treat them as abandoned
+    conn.execute(text("UPDATE pools SET deployment_claim_expires = 0 WHERE deployment_status = 'deploying'"))
+
+
+def _0011_row_versions(conn):
+    # Per-row versions replace the table-wide counters of migration 9
+    for table in ("pools", "pool_members"):
+        _add_column(conn, table, "row_version", "BIGINT DEFAULT 1")
+        conn.execute(text(f"UPDATE {table} SET row_version = 1 WHERE row_version IS NULL"))
+    conn.execute(text("DROP TABLE IF EXISTS table_versions"))
+
+
+def _0012_ledger_checkpoints(conn):
+    # The compaction checkpoint is an event id plus the ids it skipped, not a round
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            name VARCHAR PRIMARY KEY,
+            last_event_id BIGINT,
+            gaps VARCHAR,
+            updated_at TIMESTAMP
+        )
+    """))
+    conn.execute(text("""
+        INSERT INTO ledger_checkpoints (name, last_event_id, gaps, updated_at)
+        SELECT name, last_round, '[]', updated_at FROM sync_checkpoints
+        WHERE name = 'deposit_ledger' AND NOT EXISTS (SELECT 1 FROM ledger_checkpoints WHERE name = 'deposit_ledger')
+    """))
+    conn.execute(text("DELETE FROM sync_checkpoints WHERE name = 'deposit_ledger'"))
+
+
+
+def _0013_deployment_attempts(conn):
+    _add_column(conn, "pools", "deployment_attempts", "INTEGER DEFAULT 0")
+
+MIGRATIONS = [
+    (1, "initial schema", _0001_initial),
+    (2, "indexes for membership, wallet and renewal queries", _0002_hot_query_indexes),
+    (3, "pool deployment state", _0003_pool_deployment_state),
+    (4, "pool contract storage variant", _0004_pool_storage),
+    (5, "chain sync checkpoints", _0005_sync_checkpoints),
+    (6, "renewal row leases and leader leases", _0006_renewal_leases),
+    (7, "deposit ledger and rollups", _0007_deposit_ledger),
+    (8, "billing invoices", _0008_invoices),
+    (9, "table version counters for ETags", _0009_table_versions),
+    (10, "deployment claim expiry", _0010_deployment_claims),
+    (11, "row versions for ETags", _0011_row_versions),
+    (12, "ledger checkpoints with gaps", _0012_ledger_checkpoints),
+    (13, "deployment retry attempts", _0013_deployment_attempts),
+]
+
+
+# ----------------------------------------------------------------------- #
+# Runner
+# ----------------------------------------------------------------------- #
+
+def current_version(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+
+def _ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR NOT NULL,
+            applied_at VARCHAR NOT NULL
+        )
+    """))
+
+
+@contextmanager
+def _locked(engine):
+    """A transaction holding the migration lock."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            with conn.begin():
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+                yield conn
+            return
+        # pysqlite's own BEGIN is deferred; take the write lock up front instead
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def upgrade(engine, target=None):
+    """Applies every pending migration up to `target` (default: latest). Returns applied versions."""
+    applied = []
+    while True:
+        with _locked(engine) as conn:
+            _ensure_version_table(conn)
+            # Read under the lock: another worker may have migrated while we waited
+            current = conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+            pending = [m for m in MIGRATIONS if m[0] > current and (target is None or m[0] <= target)]
+            if not pending:
+                return applied
+            version, description, migrate = pending[0]
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow().isoformat()},
+            )
+        logger.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+
+
+# ----------------------------------------------------------------------- #
+# Index checks
+# ----------------------------------------------------------------------- #
+
+# Hot queries, built by queries.py exactly as the routes and workers run them,
+# and the index each one must use
+HOT_QUERIES = [
+    ("membership lookup (track_deposit)", lambda q: q.membership(1, "WALLET"), "ix_pool_members_pool_wallet"),
+    ("wallet memberships (get_user_memberships)", lambda q: q.wallet_memberships("WALLET"), "ix_pool_members_wallet_address"),
+    ("renewal scan (leases.claim_due)", lambda q: q.due_pools(0, 500), "ix_pools_status_renewal"),
+]
+
+
+def explain_hot_queries(engine):
+    """Returns [(name, expected_index, plan, uses_index)] for every hot query."""
+    import queries
+
+    results = []
+    with engine.connect() as conn:
+        for name, build, index in HOT_QUERIES:
+            sql = str(build(queries).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            if engine.dialect.name == "postgresql":
+                # Tiny tables make a seq scan cheapest; we want to know the index is usable
+                with conn.begin():
+                    conn.execute(text("SET LOCAL enable_seqscan = off"))
+                    plan = "\n".join(r[0] for r in conn.exec_driver_sql(f"EXPLAIN {sql}"))
+            else:
+                plan = "\n".join(r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+            results.append((name, index, plan, index in plan))
+    return results
+
+
+def check_indexes(engine):
+    ok = True
+    for name, index, plan, uses_index in explain_hot_queries(engine):
+        print(f"[{'ok' if uses_index else 'FAIL'}] {name}: expected {index}")
+        if not uses_index:
+            print("    " + plan.replace("\n", "\n    "))
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    upgrade(engine)
+    print(f"Schema at version {current_version(engine)}")
+    if "--check" in sys.argv and not check_indexes(engine):
+        sys.exit(1)
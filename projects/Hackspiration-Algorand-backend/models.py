@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, DateTime, Index, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -13,6 +13,12 @@ class User(Base):
 
 class Pool(Base):
     __tablename__ = "pools"
+    __table_args__ = (
+        # Renewal scan: status == ACTIVE AND renewal_timestamp < now
+        Index("ix_pools_status_renewal", "status", "renewal_timestamp"),
+        # Chain sync: app call -> pool
+        Index("ix_pools_app_id", "app_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     contract_address = Column(String, unique=True, index=True)
     subscription_name = Column(String)
@@ -21,19 +27,109 @@ class Pool(Base):
     max_members = Column(Integer)
     cycle_duration = Column(Integer)
     renewal_timestamp = Column(BigInteger)
-    status = Column(Integer) # 0=FORMING, 1=ACTIVE, 2=DISSOLVED
+    status = Column(Integer) # 0=FORMING, 1=ACTIVE, 2=DISSOLVED, 3=UNDERFUNDED
+    cycle = Column(BigInteger, default=0) # cycles renewed so far; deposits are booked against it
+    app_id = Column(BigInteger, nullable=True)
+    deployment_status = Column(String, nullable=True) # pending/deploying/deployed/failed, see deployments.py
+    deployment_error = Column(String, nullable=True)
+    deployment_claim_expires = Column(BigInteger, nullable=True) # end of a deploying claim or of a pending retry's backoff, see deployments.py
+    deployment_attempts = Column(Integer, default=0) # failed attempts so far, for the retry backoff
+    storage = Column(String, default="local") # member storage of the contract: local (contract.py) or box (contract_boxes.py)
+    lease_owner = Column(String, nullable=True) # renewal worker holding the row, see leases.py
+    lease_expires = Column(BigInteger, nullable=True)
+    row_version = Column(BigInteger, default=1, onupdate=literal_column("row_version") + 1) # ETags, see etags.py
     created_at = Column(DateTime, default=datetime.utcnow)
 
     members = relationship("PoolMember", back_populates="pool")
 
 class PoolMember(Base):
     __tablename__ = "pool_members"
+    __table_args__ = (
+        # join_pool/track_deposit lookups and the target of the join_pool upsert
+        Index("ix_pool_members_pool_wallet", "pool_id", "wallet_address", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     pool_id = Column(Integer, ForeignKey("pools.id"))
-    wallet_address = Column(String, ForeignKey("users.wallet_address"))
+    wallet_address = Column(String, ForeignKey("users.wallet_address"), index=True)
     is_active = Column(Boolean, default=True)
-    deposited_amount = Column(BigInteger, default=0)
+    deposited_amount = Column(BigInteger, default=0) # projection of member_balances.balance, written by ledger.py only
     joined_at = Column(DateTime, default=datetime.utcnow)
+    row_version = Column(BigInteger, default=1, onupdate=literal_column("row_version") + 1) # ETags, see etags.py
 
     user = relationship("User", back_populates="memberships")
     pool = relationship("Pool", back_populates="members")
+
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoints"
+    name = Column(String, primary_key=True) # one row per sync worker, see chain_sync.py
+    last_round = Column(BigInteger, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class LedgerCheckpoint(Base):
+    __tablename__ = "ledger_checkpoints"
+    name = Column(String, primary_key=True) # one row per compactor, see ledger.py
+    last_event_id = Column(BigInteger, default=0) # every event id at or below it was compacted, except the gaps
+    gaps = Column(String, default="[]") # JSON [[event id, unix time first missed(, xid horizon)], ...] not yet seen below last_event_id
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class LeaderLease(Base):
+    __tablename__ = "leader_leases"
+    name = Column(String, primary_key=True) # job that must only run in one worker
+    owner = Column(String)
+    expires_at = Column(BigInteger)
+
+class DepositEvent(Base):
+    __tablename__ = "deposit_events"
+    __table_args__ = (
+        # Replays of the same transaction are dropped
+        Index("ix_deposit_events_txid", "txid", "pool_id", "wallet_address", "kind", unique=True),
+        Index("ix_deposit_events_member", "pool_id", "wallet_address"),
+    )
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True) # compaction watermark
+    pool_id = Column(Integer)
+    wallet_address = Column(String)
+    kind = Column(String) # deposit, refund (pays out the whole balance) or adjust (signed correction), see ledger.py
+    amount = Column(BigInteger) # NULL for refunds
+    cycle = Column(BigInteger)
+    txid = Column(String, nullable=True)
+    round = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MemberBalance(Base):
+    __tablename__ = "member_balances"
+    pool_id = Column(Integer, primary_key=True)
+    wallet_address = Column(String, primary_key=True)
+    deposited = Column(BigInteger, default=0)
+    refunded = Column(BigInteger, default=0)
+    balance = Column(BigInteger, default=0)
+    last_event_id = Column(BigInteger, default=0)
+
+class PoolCycleTotal(Base):
+    __tablename__ = "pool_cycle_totals"
+    pool_id = Column(Integer, primary_key=True)
+    cycle = Column(BigInteger, primary_key=True)
+    deposited = Column(BigInteger, default=0)
+    refunded = Column(BigInteger, default=0)
+    deposits = Column(Integer, default=0)
+    payers = Column(Integer, default=0) # distinct wallets with a deposit in the cycle
+
+class MemberCycleDeposit(Base):
+    __tablename__ = "member_cycle_deposits"
+    pool_id = Column(Integer, primary_key=True)
+    cycle = Column(BigInteger, primary_key=True)
+    wallet_address = Column(String, primary_key=True)
+    amount = Column(BigInteger, default=0)
+
+class Invoice(Base):
+    __tablename__ = "invoices"
+    pool_id = Column(Integer, primary_key=True)
+    cycle = Column(BigInteger, primary_key=True) # first cycle billed, see billing.py
+    wallet_address = Column(String, primary_key=True)
+    cycles = Column(Integer, default=1) # more than 1 when a renewal catches up on missed deadlines
+    share = Column(BigInteger, default=0)
+    balance = Column(BigInteger, default=0) # deposited balance at billing time
+    charged = Column(BigInteger, default=0)
+    shortfall = Column(BigInteger, default=0)
+    refund = Column(BigInteger, default=0) # whole balance of a member who exited
+    created_at = Column(DateTime, default=datetime.utcnow)
+
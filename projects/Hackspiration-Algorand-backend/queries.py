@@ -0,0 +1,39 @@
+"""
+Statements on the hot paths, built in one place so migrations.HOT_QUERIES
+explains the exact SQL the routes and workers run.
+"""
+from sqlalchemy import or_, select
+
+import models
+import schemas
+
+STATUS_ACTIVE = 1
+
+# Every schemas.PoolMember field, in the schema's order
+MEMBER_COLUMNS = tuple(getattr(models.PoolMember, name) for name in schemas.PoolMember.model_fields)
+
+
+def membership(pool_id, wallet):
+    """Id of the wallet's member row in the pool (track_deposit)."""
+    members = models.PoolMember
+    return select(members.id).where(members.pool_id == pool_id, members.wallet_address == wallet)
+
+
+def wallet_memberships(wallet):
+    """Every member row of a wallet (get_user_memberships)."""
+    return select(*MEMBER_COLUMNS).where(models.PoolMember.wallet_address == wallet)
+
+
+def lease_free(now):
+    return or_(models.Pool.lease_expires.is_(None), models.Pool.lease_expires < now)
+
+
+def due_pools(now, limit):
+    """Ids of due active pools nobody holds a lease on, oldest deadline first (leases.claim_due)."""
+    Pool = models.Pool
+    return (
+        select(Pool.id)
+        .where(Pool.status == STATUS_ACTIVE, Pool.renewal_timestamp <= now, Pool.cycle_duration > 0, lease_free(now))
+        .order_by(Pool.renewal_timestamp)
+        .limit(limit)
+    )
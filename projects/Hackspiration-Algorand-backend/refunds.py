@@ -0,0 +1,131 @@
+"""
+Batched refunds for dissolved box-storage pools (contract_boxes.py).
+
+refund_batch(start, count) pays back every member in slots [start, start+count).
+Each slot it touches needs its box in the call's references, and each member it
+pays needs their account there too; with 8 references per app call (at most 4
+of them accounts) one call can refund 4 members. Box references are shared by
+the whole atomic group, so calls are packed 16 to a group: one round-trip
+refunds up to 64 members, and members with nothing to refund are skipped.
+
+    python refunds.py <app_id>    # refund a dissolved pool from the deployer account
+"""
+import base64
+import copy
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+GROUP_SIZE = 16
+MEMBERS_PER_CALL = 4  # 4 accounts + 4 slot boxes = the 8-reference limit; contract_boxes.REFUND_BATCH_MAX
+STATUS_DISSOLVED = 2
+
+
+def slot_key(slot):
+    return b"s" + slot.to_bytes(8, "big")
+
+
+def plan_refunds(refundable_slots, members_per_call=MEMBERS_PER_CALL, group_size=GROUP_SIZE):
+    """
+    Covers the refundable slots with the fewest (start, count) windows and packs
+    them into groups. Returns [[(start, count, [slots paid]), ...], ...].
+    """
+    calls = []
+    slots = sorted(refundable_slots)
+    i = 0
+    while i < len(slots):
+        # Greedy interval cover: each window starts at the first uncovered slot
+        start = slots[i]
+        paid = []
+        while i < len(slots) and slots[i] < start + members_per_call:
+            paid.append(slots[i])
+            i += 1
+        calls.append((start, paid[-1] - start + 1, paid))
+    return [calls[n:n + group_size] for n in range(0, len(calls), group_size)]
+
+
+def _global_state(algod_client, app_id):
+    state = {}
+    for entry in algod_client.application_info(app_id)["params"].get("global-state", []):
+        value = entry["value"]
+        state[base64.b64decode(entry["key"]).decode()] = value["uint"] if value["type"] == 2 else base64.b64decode(value["bytes"])
+    return state
+
+
+def is_dissolved(algod_client, app_id):
+    return _global_state(algod_client, app_id).get("status") == STATUS_DISSOLVED
+
+
+def read_members(algod_client, app_id, member_count, cycle, carry_share=0, workers=8):
+    """Returns {slot: (address, refundable amount)} read from the pool's slot boxes."""
+    from algosdk import encoding
+
+    def read(slot):
+        record = base64.b64decode(algod_client.application_box_by_name(app_id, slot_key(slot))["value"])
+        deposited = int.from_bytes(record[32:40], "big")
+        record_cycle = int.from_bytes(record[48:56], "big")
+        address = encoding.encode_address(record[:32])
+        if record_cycle == cycle + 1:
+            return slot, address, 0  # already refunded
+        # Deposits from cycles that were already paid out only count through the carry-over share
+        return slot, address, (deposited if record_cycle == cycle else 0) + carry_share
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {slot: (address, amount) for slot, address, amount in pool.map(read, range(member_count))}
+
+
+def refund_pool(app_id, algod_client=None, sender=None, app_spec=None, suggested_params=None):
+    """
+    Refunds every member of a dissolved box-storage pool. Returns a summary with
+    the number of members refunded, app calls and atomic groups used.
+    """
+    from algosdk.atomic_transaction_composer import AtomicTransactionComposer
+
+    import artifacts
+    from chain import get_chain
+
+    chain = get_chain()
+    algod_client = algod_client or chain.algod
+    sender = sender or chain.deployer
+    app_spec = app_spec or artifacts.load(algod_client, "box").app_spec
+    method = app_spec.contract.get_method_by_name("refund_batch")
+
+    state = _global_state(algod_client, app_id)
+    if state.get("status") != STATUS_DISSOLVED:
+        raise ValueError(f"App {app_id} is not dissolved")
+    members = read_members(
+        algod_client, app_id, state.get("current_members", 0), state.get("cycle", 0), state.get("carry_share", 0)
+    )
+    groups = plan_refunds(slot for slot, (_, amount) in members.items() if amount > 0)
+
+    sp = suggested_params or chain.suggested_params()
+    calls = refunded = 0
+    for group in groups:
+        atc = AtomicTransactionComposer()
+        for start, count, paid in group:
+            # Fee pooling: the outer call covers its own fee plus one per inner payment
+            call_sp = copy.copy(sp)
+            call_sp.flat_fee = True
+            call_sp.fee = max(sp.min_fee, 1000) * (1 + len(paid))
+            atc.add_method_call(
+                app_id=app_id,
+                method=method,
+                sender=sender.address,
+                sp=call_sp,
+                signer=sender.signer,
+                method_args=[start, count],
+                accounts=[members[slot][0] for slot in paid],
+                boxes=[(0, slot_key(slot)) for slot in range(start, start + count)],
+            )
+        atc.execute(algod_client, 4)
+        calls += len(group)
+        refunded += sum(len(paid) for _, _, paid in group)
+
+    logger.info(f"Refunded {refunded} members of app {app_id} in {calls} calls / {len(groups)} groups")
+    return {"app_id": app_id, "members": len(members), "refunded": refunded, "calls": calls, "groups": len(groups)}
+
+
+if __name__ == "__main__":
+    print(refund_pool(int(sys.argv[1])))
@@ -0,0 +1,371 @@
+import heapq
+import logging
+import threading
+import time
+from concurrent import futures
+
+from sqlalchemy import func, update
+
+import leases
+import metrics
+import models
+
+logger = logging.getLogger(__name__)
+
+STATUS_ACTIVE = 1
+
+
+def catch_up(renewal_timestamp, cycle_duration, now):
+    """
+    (cycles elapsed, next future deadline) for a pool whose deadline may be
+    several cycles in the past. Same arithmetic as the contracts' cycles_due().
+    """
+    if now < renewal_timestamp or cycle_duration <= 0:
+        return 0, renewal_timestamp
+    cycles = (now - renewal_timestamp) // cycle_duration + 1
+    return cycles, renewal_timestamp + cycles * cycle_duration
+
+
+class RenewalEngine:
+    """
+    Keeps active pools in a min-heap keyed by renewal_timestamp and sleeps until
+    the next deadline instead of polling the pools table every minute.
+
+    The heap is loaded once on start(); afterwards callers keep it in sync with
+    schedule()/unschedule() whenever a pool's status or deadline changes.
+    Stale heap entries are skipped lazily on pop.
+
+    With a batcher.GroupBatcher, deployed pools also get their renew_cycle
+    call, sent in atomic groups across apps. Only pools whose call confirmed
+    are billed and moved on; the others keep their deadline and cycle and are
+    retried after retry_seconds (the contract settles every missed cycle then).
+
+    Several workers can run an engine against the same database:
+    - owner=<worker id>: the heap only says when to look; due pools are
+      claimed through row leases (leases.claim_due), so workers share the
+      load and never renew the same row twice.
+    - leader=leases.LeaderLease: only the lease holder renews; the others
+      stand by and reload the queue when they take over.
+
+    With `billing` (e.g. billing.bill_due), each batch is invoiced in the same
+    transaction that moves its deadlines on.
+    """
+
+    def __init__(self, session_factory, max_batch=500, on_renewed=None, batcher=None, chain_timeout=60,
+                 owner=None, lease_seconds=60, leader=None, billing=None, retry_seconds=60):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.on_renewed = on_renewed  # called with the list of renewed pool ids
+        self.batcher = batcher
+        self.chain_timeout = chain_timeout
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.leader = leader
+        self.billing = billing  # called as billing(db, now, pool_ids, owner) before the deadlines move
+        self.retry_seconds = retry_seconds
+        self._standby = leader is not None
+        self._heap = []  # (renewal_timestamp, pool_id)
+        self._pools = {}  # pool_id -> (renewal_timestamp, cycle_duration)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    # ------------------------------------------------------------------ #
+    # Queue maintenance
+    # ------------------------------------------------------------------ #
+
+    def load(self):
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                models.Pool.id, models.Pool.renewal_timestamp, models.Pool.cycle_duration
+            ).filter(models.Pool.status == STATUS_ACTIVE).all()
+        finally:
+            db.close()
+
+        with self._cond:
+            self._pools = {pool_id: (ts, cycle) for pool_id, ts, cycle in rows}
+            self._heap = [(ts, pool_id) for pool_id, (ts, _) in self._pools.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        logger.info(f"Renewal queue loaded with {len(rows)} active pools")
+
+    def schedule(self, pool_id, renewal_timestamp, cycle_duration, status=STATUS_ACTIVE):
+        """Adds or moves a pool in the queue. Non-active pools are dropped."""
+        if status != STATUS_ACTIVE:
+            self.unschedule(pool_id)
+            return
+        with self._cond:
+            current = self._pools.get(pool_id)
+            self._pools[pool_id] = (renewal_timestamp, cycle_duration)
+            if current is None or current[0] != renewal_timestamp:
+                # An unchanged deadline already has its heap entry
+                heapq.heappush(self._heap, (renewal_timestamp, pool_id))
+                self._cond.notify()
+
+    def schedule_pool(self, pool):
+        self.schedule(pool.id, pool.renewal_timestamp, pool.cycle_duration, pool.status)
+
+    def refresh(self, pool_ids):
+        """Re-reads pools and reschedules them, e.g. after chain sync changed their status or deadline."""
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                models.Pool.id, models.Pool.renewal_timestamp, models.Pool.cycle_duration, models.Pool.status
+            ).filter(models.Pool.id.in_(pool_ids)).all()
+        finally:
+            db.close()
+        for pool_id, renewal_timestamp, cycle_duration, status in rows:
+            self.schedule(pool_id, renewal_timestamp, cycle_duration, status)
+
+    def unschedule(self, pool_id):
+        with self._cond:
+            self._pools.pop(pool_id, None)
+
+    def __len__(self):
+        return len(self._pools)
+
+    def lag(self, now=None):
+        """Seconds the oldest due active pool is overdue (0 if none), read from the database."""
+        now = int(time.time()) if now is None else now
+        db = self.session_factory()
+        try:
+            oldest = db.query(func.min(models.Pool.renewal_timestamp)).filter(models.Pool.status == STATUS_ACTIVE).scalar()
+        finally:
+            db.close()
+        return max(0, now - oldest) if oldest is not None else 0
+
+    def next_deadline(self):
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            ts, pool_id = self._heap[0]
+            current = self._pools.get(pool_id)
+            if current is not None and current[0] == ts:
+                return
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and len(due) < self.max_batch:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            ts, pool_id = heapq.heappop(self._heap)
+            due.append((pool_id, ts, self._pools[pool_id][1]))
+        return due
+
+    # ------------------------------------------------------------------ #
+    # Renewal
+    # ------------------------------------------------------------------ #
+
+    def run_due(self, now=None):
+        """Renews every pool whose deadline has passed. Returns the renewed pool ids."""
+        now = int(time.time()) if now is None else now
+        if self.leader is not None:
+            if not self.leader.acquire(now):
+                self._standby = True
+                return []
+            if self._standby:
+                # Taking over: the previous leader has moved the deadlines on
+                self._standby = False
+                self.load()
+        if self.owner is not None:
+            # Pools scheduled on other workers are not in our heap; claim_due finds them anyway
+            with self._cond:
+                due = self._pop_due(now)
+            return self._run_leased(due, now)
+        renewed = []
+        while True:
+            with self._cond:
+                due = self._pop_due(now)
+            if not due:
+                return renewed
+            try:
+                done = self._renew_batch(due, now)
+            except Exception:
+                # Put the batch back so it is retried on the next wake-up
+                with self._cond:
+                    for pool_id, ts, _ in due:
+                        if pool_id in self._pools:
+                            heapq.heappush(self._heap, (ts, pool_id))
+                raise
+            renewed.extend(done)
+
+    def _run_leased(self, due, now):
+        """Claims and renews due pools batch by batch, then resyncs the heap from the database."""
+        renewed = []
+        touched = {pool_id for pool_id, _, _ in due}
+        db = self.session_factory()
+        try:
+            attempted = set()
+            while True:
+                claimed = leases.claim_due(db, self.owner, now, self.max_batch, self.lease_seconds)
+                # Every claimed row is released by _renew_batch; one that comes back
+                # in the same run could not be renewed, so stop instead of spinning on it
+                claimed = [row for row in claimed if row[0] not in attempted]
+                if not claimed:
+                    break
+                attempted.update(pool_id for pool_id, _, _ in claimed)
+                renewed.extend(self._renew_batch(claimed, now))
+                touched.update(pool_id for pool_id, _, _ in claimed)
+            rows = db.query(
+                models.Pool.id, models.Pool.renewal_timestamp, models.Pool.cycle_duration, models.Pool.status
+            ).filter(models.Pool.id.in_(touched)).all()
+        finally:
+            db.close()
+
+        # Other workers may have renewed some of these; the database has the final word
+        with self._cond:
+            for pool_id, ts, cycle, status in rows:
+                if status != STATUS_ACTIVE:
+                    self._pools.pop(pool_id, None)
+                    continue
+                if ts <= now:
+                    # Still leased by another worker: look again once that lease could have expired
+                    ts = now + self.lease_seconds
+                self._pools[pool_id] = (ts, cycle)
+                heapq.heappush(self._heap, (ts, pool_id))
+            self._cond.notify()
+        return renewed
+
+    def _renew_batch(self, due, now):
+        """Renews a batch of due pools. Returns the ids that were renewed."""
+        ids = [pool_id for pool_id, _, _ in due]
+        logger.debug(f"Triggering renewal for pools {ids}")
+
+        db = self.session_factory()
+        try:
+            # A pool whose renew_cycle did not confirm is neither billed nor moved on
+            failed = self._renew_on_chain(db, ids) if self.batcher is not None else set()
+            renewed = [pool_id for pool_id in ids if pool_id not in failed]
+            if renewed and self.billing is not None:
+                self.billing(db, now, renewed, self.owner)
+            # One UPDATE and one commit for the whole batch. Pools that fell
+            # several cycles behind (downtime) jump straight to their next
+            # future deadline instead of advancing one cycle per wake-up.
+            elapsed = (now - models.Pool.renewal_timestamp) // models.Pool.cycle_duration + 1
+            stmt = (
+                update(models.Pool)
+                .where(
+                    models.Pool.id.in_(renewed),
+                    models.Pool.status == STATUS_ACTIVE,
+                    models.Pool.renewal_timestamp <= now,
+                    models.Pool.cycle_duration > 0,
+                )
+                .values(
+                    renewal_timestamp=models.Pool.renewal_timestamp + elapsed * models.Pool.cycle_duration,
+                    # Deposits from here on are booked against the next cycle (ledger.py)
+                    cycle=func.coalesce(models.Pool.cycle, 0) + elapsed,
+                )
+            )
+            if self.owner is not None:
+                # Only rows we still hold
+                stmt = stmt.where(models.Pool.lease_owner == self.owner)
+            db.execute(stmt)
+            if self.owner is not None:
+                # Release every claimed row, renewed or not (dissolved, moved on by chain sync, ...)
+                db.execute(
+                    update(models.Pool)
+                    .where(models.Pool.id.in_(ids), models.Pool.lease_owner == self.owner)
+                    .values(lease_owner=None, lease_expires=None, row_version=models.Pool.row_version)
+                )
+            db.commit()
+        finally:
+            db.close()
+
+        if renewed and self.on_renewed is not None:
+            self.on_renewed(renewed)
+        if self.owner is not None:
+            return renewed
+
+        with self._cond:
+            for pool_id, ts, cycle in due:
+                current = self._pools.get(pool_id)
+                # Only advance if nobody rescheduled the pool while we were writing
+                if current is not None and current[0] == ts:
+                    if pool_id in failed:
+                        # The database still has the old deadline; look again later
+                        self._pools[pool_id] = (now + self.retry_seconds, cycle)
+                        heapq.heappush(self._heap, (now + self.retry_seconds, pool_id))
+                        continue
+                    _, next_ts = catch_up(ts, cycle, now)
+                    if next_ts == ts:
+                        # No cycle to advance by; drop it rather than spin on it
+                        del self._pools[pool_id]
+                        continue
+                    self._pools[pool_id] = (next_ts, cycle)
+                    heapq.heappush(self._heap, (next_ts, pool_id))
+        return renewed
+
+    def _renew_on_chain(self, db, ids):
+        """Sends renew_cycle for the deployed pools among `ids`. Returns the ids whose call did not confirm."""
+        from batcher import AppCall
+
+        deployed = db.query(models.Pool.id, models.Pool.app_id, models.Pool.storage, models.Pool.admin_wallet).filter(
+            models.Pool.id.in_(ids), models.Pool.status == STATUS_ACTIVE, models.Pool.app_id.isnot(None)
+        ).all()
+        pending = {
+            # settle() pays the admin from an inner payment, so the admin account must be referenced
+            self.batcher.submit(
+                AppCall(app_id, "renew_cycle", accounts=[admin], inner_txns=1, variant=storage or "local")
+            ): pool_id
+            for pool_id, app_id, storage, admin in deployed
+        }
+        done, not_done = futures.wait(pending, timeout=self.chain_timeout)
+        failed = {pending[f] for f in done if f.exception() is not None} | {pending[f] for f in not_done}
+        if failed:
+            logger.warning(f"renew_cycle failed or timed out for pools {sorted(failed)}, retrying in {self.retry_seconds}s")
+        return failed
+
+    # ------------------------------------------------------------------ #
+    # Worker thread
+    # ------------------------------------------------------------------ #
+
+    def start(self):
+        self.load()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="renewal-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Lease mode also sweeps every lease_seconds, for pools due on workers that went away
+        next_sweep = time.time() + self.lease_seconds
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                self._drop_stale()
+                if self._heap:
+                    timeout = max(0.0, self._heap[0][0] - time.time())
+                else:
+                    timeout = None
+                if self.owner is not None:
+                    sweep_in = max(0.0, next_sweep - time.time())
+                    timeout = sweep_in if timeout is None else min(timeout, sweep_in)
+                if timeout is None or timeout > 0:
+                    # Woken early by schedule()/stop()
+                    self._cond.wait(timeout)
+                    continue
+            try:
+                next_sweep = time.time() + self.lease_seconds
+                with metrics.span("job", "renewals"):
+                    self.run_due()
+                if self._standby:
+                    with self._cond:
+                        self._cond.wait(self.leader.ttl / 2)
+            except Exception as e:
+                logger.exception(f"Renewal batch failed: {e}")
+                with self._cond:
+                    self._cond.wait(5)
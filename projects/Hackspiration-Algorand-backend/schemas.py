@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -24,15 +24,46 @@ class PoolBase(BaseModel):
     status: int
 
 class PoolCreate(PoolBase):
-    pass
+    # The renewal catch-up and the contracts divide by it
+    cycle_duration: int = Field(gt=0)
+    # Defaults to box storage for pools of BOX_STORAGE_MIN_MEMBERS or more
+    storage: Optional[Literal["local", "box"]] = None
 
 class Pool(PoolBase):
     id: int
     contract_address: Optional[str]
+    app_id: Optional[int] = None
+    deployment_status: Optional[str] = None
+    storage: Optional[str] = None
     created_at: datetime
     class Config:
         from_attributes = True
 
+class Deployment(BaseModel):
+    pool_id: int
+    status: Optional[str]
+    app_id: Optional[int]
+    contract_address: Optional[str]
+    error: Optional[str]
+
+class PoolCard(BaseModel):
+    # Columns needed by the dashboard card view
+    id: int
+    subscription_name: str
+    cost_per_cycle: int
+    max_members: int
+    cycle_duration: int
+    renewal_timestamp: int
+    status: int
+
+class PoolPage(BaseModel):
+    items: List[Pool]
+    next_cursor: Optional[int] = None
+
+class PoolCardPage(BaseModel):
+    items: List[PoolCard]
+    next_cursor: Optional[int] = None
+
 class PoolMemberBase(BaseModel):
     pool_id: int
     wallet_address: str
@@ -47,3 +78,61 @@ class PoolMember(PoolMemberBase):
     joined_at: datetime
     class Config:
         from_attributes = True
+
+class PoolStats(BaseModel):
+    member_count: int
+    active_members: int
+    total_deposited: int
+    # total_deposited / cost_per_cycle, capped at 1.0
+    funding_progress: float
+    funding_shortfall: int
+
+class PoolDetail(BaseModel):
+    pool: Pool
+    stats: PoolStats
+    # The caller's membership comes first when ?wallet= is given
+    members: List[PoolMember]
+    membership: Optional[PoolMember] = None
+
+class CycleTotal(BaseModel):
+    pool_id: int
+    cycle: int
+    deposited: int
+    refunded: int
+    deposits: int
+    payers: int
+    class Config:
+        from_attributes = True
+
+class CyclePayer(BaseModel):
+    wallet_address: str
+    amount: int
+    class Config:
+        from_attributes = True
+
+class Invoice(BaseModel):
+    pool_id: int
+    cycle: int
+    cycles: int
+    wallet_address: str
+    share: int
+    balance: int
+    charged: int
+    shortfall: int
+    refund: int
+    created_at: datetime
+    class Config:
+        from_attributes = True
+
+class DepositRecord(BaseModel):
+    pool_id: int
+    wallet_address: str
+    amount: int
+    txid: str = Field(..., min_length=1) # payment txid (or client idempotency key); a replayed record is dropped
+
+class DepositBatch(BaseModel):
+    deposits: List[DepositRecord] = Field(..., max_length=50000)
+
+class DepositBatchResult(BaseModel):
+    applied: int
+    unknown: List[DepositRecord]
@@ -0,0 +1,314 @@
+"""
+Server push for pool and membership changes, served as SSE and WebSocket by main.py.
+
+Clients subscribe to pool ids and/or a wallet. Writers publish diffs to an
+in-process Hub, which fans each one out to the subscribers of its topics:
+
+- ("pool", id)       -> `pool` diffs: changed pool columns and member aggregates
+- ("wallet", address) and ("pool", id) -> `member` diffs: one membership row
+
+Every subscriber has a bounded queue. A client that falls `queue_size` events
+behind is evicted with an `evicted` event and has to refetch and reconnect,
+so one stalled tab never holds memory for the others. An idle subscriber is
+one coroutine and an empty deque.
+
+The hub lives on the event loop; publish() may be called from any thread
+(renewals, chain sync, the ledger compactor). The publish_* helpers load the
+diffs only for topics somebody subscribes to. Each worker process has its own
+hub, so a client only hears about changes made or observed by its worker.
+"""
+import asyncio
+import collections
+import json
+import logging
+import threading
+
+from sqlalchemy import case, func, or_, select
+
+import models
+
+logger = logging.getLogger(__name__)
+
+POOL_FIELDS = ("status", "renewal_timestamp", "cycle", "deployment_status", "app_id", "contract_address")
+
+
+def pool_topic(pool_id):
+    return ("pool", pool_id)
+
+
+def wallet_topic(wallet):
+    return ("wallet", wallet)
+
+
+class Subscriber:
+    __slots__ = ("topics", "max_queue", "queue", "wakeup", "closed")
+
+    def __init__(self, topics, max_queue):
+        self.topics = topics
+        self.max_queue = max_queue
+        self.queue = collections.deque()  # (event type, JSON data)
+        self.wakeup = asyncio.Event()
+        self.closed = None  # reason, once closed
+
+    def push(self, event):
+        """False if the subscriber is (now) closed. Event loop thread only."""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queue:
+            self.close("slow consumer")
+            return False
+        self.queue.append(event)
+        self.wakeup.set()
+        return True
+
+    def close(self, reason):
+        if not self.closed:
+            self.closed = reason
+            self.queue.clear()
+            self.wakeup.set()
+
+    async def get(self):
+        """Every queued event; [] when woken by the hub's keepalive tick."""
+        if not self.queue and not self.closed:
+            self.wakeup.clear()
+            await self.wakeup.wait()
+        events = list(self.queue)
+        self.queue.clear()
+        return events
+
+
+class Hub:
+    def __init__(self, max_clients=10000, queue_size=256, keepalive=15.0):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.stats = {"clients": 0, "published": 0, "delivered": 0, "evicted": 0, "rejected": 0}
+        self._topics = {}  # topic -> set of subscribers
+        self._loop = None
+        self._ticker = None
+        self._lock = threading.Lock()  # guards _topics against readers on other threads
+
+    def bind(self, loop):
+        """Call from the lifespan; events published before this are dropped."""
+        self._loop = loop
+        self._ticker = loop.call_later(self.keepalive, self._tick)
+
+    def _tick(self):
+        # One timer for every idle subscriber rather than one per connection
+        with self._lock:
+            subs = {sub for topic_subs in self._topics.values() for sub in topic_subs}
+        for sub in subs:
+            sub.wakeup.set()
+        self._ticker = self._loop.call_later(self.keepalive, self._tick)
+
+    def subscribe(self, topics):
+        """A new Subscriber, or None when the worker is at max_clients."""
+        if self.full():
+            self.stats["rejected"] += 1
+            return None
+        sub = Subscriber(frozenset(topics), self.queue_size)
+        with self._lock:
+            for topic in sub.topics:
+                self._topics.setdefault(topic, set()).add(sub)
+        self.stats["clients"] += 1
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close("disconnected")
+        self._drop(sub)
+        self.stats["clients"] -= 1
+
+    def _drop(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._topics[topic]
+
+    def full(self):
+        return self.stats["clients"] >= self.max_clients
+
+    def subscribed(self, topics):
+        """The subset of `topics` with at least one subscriber. Safe from any thread."""
+        with self._lock:
+            return {topic for topic in topics if topic in self._topics}
+
+    def publish(self, events):
+        """Fans out [(topics, event type, payload dict)]. Safe from any thread."""
+        if not events or self._loop is None or self._loop.is_closed():
+            return
+        # Encoded once, whatever the number of subscribers
+        encoded = [(topics, kind, json.dumps(payload, separators=(",", ":"))) for topics, kind, payload in events]
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._dispatch(encoded)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, encoded)
+
+    def _dispatch(self, events):
+        for topics, kind, data in events:
+            self.stats["published"] += 1
+            with self._lock:
+                subs = set()
+                for topic in topics:
+                    subs.update(self._topics.get(topic, ()))
+            for sub in subs:
+                if sub.push((kind, data)):
+                    self.stats["delivered"] += 1
+                elif sub.closed == "slow consumer":
+                    # Its connection keeps the client slot until the evicted event is sent
+                    self._drop(sub)
+                    self.stats["evicted"] += 1
+                    logger.info(f"Evicted a slow stream subscriber ({len(sub.topics)} topics)")
+
+    def close_all(self, reason="shutdown"):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        with self._lock:
+            subs = {sub for topic_subs in self._topics.values() for sub in topic_subs}
+        for sub in subs:
+            sub.close(reason)
+
+
+# ---------------------------------------------------------------------- #
+# Diffs
+# ---------------------------------------------------------------------- #
+
+def member_event(pool_id, wallet, **fields):
+    return (
+        (pool_topic(pool_id), wallet_topic(wallet)), "member",
+        dict(pool_id=pool_id, wallet_address=wallet, **fields),
+    )
+
+
+def _pool_events(db, pool_ids, columns, stats):
+    events = []
+    rows = {}
+    if columns:
+        pools = models.Pool
+        for row in db.execute(select(pools.id, *(getattr(pools, f) for f in POOL_FIELDS)).where(pools.id.in_(pool_ids))):
+            rows[row[0]] = dict(zip(POOL_FIELDS, row[1:]))
+    if stats:
+        # Same aggregates as GET /pool/{id}/detail
+        members = models.PoolMember
+        for pool_id, count, deposited, active in db.execute(
+            select(
+                members.pool_id,
+                func.count(members.id),
+                func.coalesce(func.sum(members.deposited_amount), 0),
+                func.coalesce(func.sum(case((members.is_active, 1), else_=0)), 0),
+            )
+            .where(members.pool_id.in_(pool_ids))
+            .group_by(members.pool_id)
+        ):
+            rows.setdefault(pool_id, {}).update(
+                member_count=count, total_deposited=int(deposited), active_members=int(active),
+            )
+    for pool_id, fields in rows.items():
+        events.append(((pool_topic(pool_id),), "pool", dict(pool_id=pool_id, **fields)))
+    return events
+
+
+def publish_pools(hub, session_factory, pool_ids, stats=False):
+    """Pool rows (renewed, deployed, ...) to their subscribers; with `stats`, the member aggregates too."""
+    wanted = [pool_id for _, pool_id in hub.subscribed(pool_topic(pool_id) for pool_id in pool_ids)]
+    if not wanted:
+        return
+    db = session_factory()
+    try:
+        events = _pool_events(db, wanted, True, stats)
+    finally:
+        db.close()
+    hub.publish(events)
+
+
+def publish_members(hub, session_factory, pool_ids, wallets):
+    """Membership rows of (pool_ids x wallets), plus the pools' aggregates, to their subscribers."""
+    pools = [pool_id for _, pool_id in hub.subscribed(pool_topic(pool_id) for pool_id in pool_ids)]
+    owners = [wallet for _, wallet in hub.subscribed(wallet_topic(wallet) for wallet in wallets)]
+    if not pools and not owners:
+        return
+    members = models.PoolMember
+    conditions = []
+    if pools:
+        conditions.append(members.pool_id.in_(pools) & members.wallet_address.in_(list(wallets)))
+    if owners:
+        conditions.append(members.wallet_address.in_(owners) & members.pool_id.in_(list(pool_ids)))
+    db = session_factory()
+    try:
+        rows = db.execute(
+            select(members.pool_id, members.wallet_address, members.is_active, members.deposited_amount)
+            .where(or_(*conditions))
+        ).all()
+        events = [
+            member_event(pool_id, wallet, is_active=is_active, deposited_amount=deposited or 0)
+            for pool_id, wallet, is_active, deposited in rows
+        ]
+        if pools:
+            events += _pool_events(db, pools, False, True)
+    finally:
+        db.close()
+    hub.publish(events)
+
+
+# ---------------------------------------------------------------------- #
+# Transports
+# ---------------------------------------------------------------------- #
+
+def sse_frame(kind, data):
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+async def sse_events(hub, topics):
+    """SSE body for one client. Subscribes on first iteration and unsubscribes when the client goes away."""
+    sub = hub.subscribe(topics)
+    if sub is None:
+        yield sse_frame("evicted", json.dumps({"reason": "too many clients"}))
+        return
+    try:
+        # Reconnect after 3 s; clients refetch on `subscribed` to cover the gap
+        yield "retry: 3000\n" + sse_frame("subscribed", json.dumps(sorted(list(t) for t in sub.topics)))
+        while True:
+            events = await sub.get()
+            if sub.closed:
+                yield sse_frame("evicted", json.dumps({"reason": sub.closed}))
+                return
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(sse_frame(kind, data) for kind, data in events)
+    finally:
+        hub.unsubscribe(sub)
+
+
+async def websocket_events(hub, sub, websocket):
+    """Same events as sse_events, one `{"event": ..., "data": ...}` text message each."""
+    async def watch():
+        # The client only ever sends a close; anything else is ignored
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                sub.close("disconnected")
+                return
+
+    watcher = asyncio.create_task(watch())
+    try:
+        await websocket.send_text(f'{{"event":"subscribed","data":{json.dumps(sorted(list(t) for t in sub.topics))}}}')
+        while True:
+            events = await sub.get()
+            if sub.closed:
+                if sub.closed != "disconnected":
+                    await websocket.send_text(f'{{"event":"evicted","data":{json.dumps({"reason": sub.closed})}}}')
+                    await websocket.close(code=1013 if sub.closed == "slow consumer" else 1001)
+                return
+            for kind, data in events:
+                await websocket.send_text(f'{{"event":"{kind}","data":{data}}}')
+    finally:
+        watcher.cancel()
+        hub.unsubscribe(sub)
@@ -0,0 +1,22 @@
+import logging
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+from database import build_engine
+
+logging.getLogger("migrations").setLevel(logging.WARNING)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'test.db'}", "production", False)
+    migrations.upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
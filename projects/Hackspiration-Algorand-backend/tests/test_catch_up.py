@@ -0,0 +1,52 @@
+import random
+
+import pytest
+from sqlalchemy import text
+
+from bench.catch_up import CYCLES, YEAR, renew_cycle
+from renewals import RenewalEngine, catch_up
+
+NOW = 2_000_000_000
+COST = 1_000_000
+
+
+@pytest.mark.parametrize("behind, cycles", [(0, 1), (1, 1), (3599, 1), (3600, 2), (YEAR, YEAR // 3600 + 1)])
+def test_catch_up_lands_on_the_next_future_deadline(behind, cycles):
+    assert catch_up(NOW - behind, 3600, NOW) == (cycles, NOW - behind + cycles * 3600)
+
+
+def test_catch_up_leaves_future_and_zero_length_cycles_alone():
+    assert catch_up(NOW + 10, 3600, NOW) == (0, NOW + 10)
+    assert catch_up(NOW - 10, 0, NOW) == (0, NOW - 10)
+
+
+def test_year_long_outage_renews_each_pool_once(engine, session_factory):
+    rng = random.Random(14)
+    pools = [(n, rng.choice(CYCLES), NOW - YEAR - rng.randrange(86400)) for n in range(1, 301)]
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, "
+                "cycle_duration, renewal_timestamp, status) VALUES (:id, 'Outage', 'A', :cost, 4, :cycle, :ts, 1)"
+            ),
+            [{"id": pool_id, "cost": COST, "cycle": cycle, "ts": ts} for pool_id, cycle, ts in pools],
+        )
+
+    scheduler = RenewalEngine(session_factory)
+    scheduler.load()
+    assert sorted(scheduler.run_due(NOW)) == [pool_id for pool_id, _, _ in pools]
+    assert scheduler.run_due(NOW) == []
+
+    with engine.connect() as conn:
+        stored = dict(conn.execute(text("SELECT id, renewal_timestamp FROM pools")).all())
+    for pool_id, cycle, ts in pools:
+        cycles, expected = catch_up(ts, cycle, NOW)
+        assert NOW < stored[pool_id] <= NOW + cycle
+        assert stored[pool_id] == expected == scheduler._pools[pool_id][0]
+
+        # One contract renew_cycle call lands on the same deadline and pays what the deposits cover
+        deposited = rng.randrange(cycles + 2) * COST + rng.randrange(COST)
+        amount, chain_ts, left, status = renew_cycle(NOW, ts, cycle, deposited, COST)
+        paid = min(cycles, deposited // COST)
+        assert chain_ts == expected
+        assert (amount, left, status) == (paid * COST, deposited - paid * COST, 1 if paid == cycles else 3)
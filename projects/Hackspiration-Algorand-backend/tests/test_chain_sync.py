@@ -0,0 +1,111 @@
+import base64
+
+from sqlalchemy import text
+
+import billing
+import fakes
+import ledger
+from chain_sync import ChainSync
+from renewals import RenewalEngine
+
+NOW = 2_000_000_000
+APP_ID = 1001
+WALLET = "W" * 58
+
+
+def deposit_call(round, deposited):
+    from algosdk import abi
+
+    selector = abi.Method.from_signature("deposit_share(pay)void").get_selector()
+    return {
+        "id": f"TX{round}",
+        "sender": WALLET,
+        "tx-type": "appl",
+        "confirmed-round": round,
+        "application-transaction": {
+            "application-id": APP_ID,
+            "application-arguments": [base64.b64encode(selector).decode()],
+            "on-completion": "noop",
+        },
+        "local-state-delta": [{
+            "address": WALLET,
+            "delta": [{"key": base64.b64encode(b"deposited_amount").decode(), "value": {"action": 2, "uint": deposited}}],
+        }],
+    }
+
+
+def test_sync_after_billing_does_not_undo_charges(engine, session_factory):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+            "renewal_timestamp, status, cycle, app_id) VALUES (1, 'Test', 'ADMIN', 1000, 4, 3600, :ts, 1, 0, :app)"
+        ), {"ts": NOW - 10, "app": APP_ID})
+        conn.execute(text("INSERT INTO users (wallet_address) VALUES (:w)"), {"w": WALLET})
+    indexer = fakes.FakeIndexer([deposit_call(100, 5000)])
+    sync = ChainSync(session_factory, indexer=indexer, start_round=0)
+
+    def balance():
+        db = session_factory()
+        try:
+            return ledger.balances(db, [(1, WALLET)])[(1, WALLET)]
+        finally:
+            db.close()
+
+    sync.sync_once()
+    assert balance() == 5000
+
+    renewals = RenewalEngine(session_factory, billing=billing.bill_due)
+    renewals.load()
+    assert renewals.run_due(NOW) == [1]
+    assert balance() == 4000
+
+    # deposited_amount on chain still says 5000 after the charge
+    indexer.transactions.append(deposit_call(101, 5000))
+    indexer.round = 101
+    sync.sync_once()
+    assert balance() == 4000
+
+    indexer.transactions.append(deposit_call(102, 7000))
+    indexer.round = 102
+    sync.sync_once()
+    assert balance() == 6000
+
+    ledger.LedgerCompactor(session_factory).compact_once()
+    assert balance() == 6000
+
+
+def test_sync_cost_does_not_grow_with_pools(engine, session_factory):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+                "renewal_timestamp, status, cycle, app_id) VALUES (:id, 'Test', 'ADMIN', 1000, 4, 3600, :ts, 1, 0, :app)"
+            ),
+            [{"id": n, "ts": NOW, "app": APP_ID + n - 1} for n in range(1, 201)],
+        )
+    # Long history, little of it ours
+    indexer = fakes.FakeIndexer([deposit_call(100, 5000)], round=50_000)
+    sync = ChainSync(session_factory, indexer=indexer, start_round=0)
+    assert sync.sync_once() == 1
+    # The tip and one page of calls, however many pools
+    assert indexer.calls == 2
+
+
+def test_cold_start_syncs_from_the_tip(engine, session_factory):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+            "renewal_timestamp, status, cycle, app_id) VALUES (1, 'Test', 'ADMIN', 1000, 4, 3600, :ts, 1, 0, :app)"
+        ), {"ts": NOW, "app": APP_ID})
+    indexer = fakes.FakeIndexer([deposit_call(100, 5000)], round=200)
+    sync = ChainSync(session_factory, indexer=indexer)
+    assert sync.sync_once() == 0
+
+    indexer.transactions.append(deposit_call(201, 6000))
+    indexer.round = 201
+    assert sync.sync_once() == 1
+    db = session_factory()
+    try:
+        assert sync.checkpoint(db) == 201
+    finally:
+        db.close()
@@ -0,0 +1,98 @@
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+import deploy
+import deployments
+import fakes
+import models
+from deployments import DeploymentQueue
+
+
+def seed(engine, pools):
+    with engine.begin() as conn:
+        for pool_id, cycle_duration in pools.items():
+            conn.execute(
+                text(
+                    "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+                    "status, deployment_status) VALUES (:id, 'Test', :admin, 1000, 4, :cycle, 0, 'pending')"
+                ),
+                {"id": pool_id, "admin": f"ADMIN{pool_id}", "cycle": cycle_duration},
+            )
+
+
+def pools(session_factory):
+    db = session_factory()
+    try:
+        return {pool.id: pool for pool in db.query(models.Pool)}
+    finally:
+        db.close()
+
+
+def make_queue(session_factory, chain, deploy_fn=fakes.fake_deploy):
+    return DeploymentQueue(session_factory, chain=chain, deploy_fn=deploy_fn, retry_seconds=30)
+
+
+def test_unreachable_chain_leaves_pools_pending_with_backoff(engine, session_factory):
+    seed(engine, {1: 3600, 2: 3600})
+    algod = fakes.FakeAlgodClient()
+    up = False
+
+    def chain():
+        if not up:
+            raise ConnectionError("algod unreachable")
+        return algod, SimpleNamespace(address="DEPLOYER"), {}
+
+    queue = make_queue(session_factory, chain)
+    assert queue.deploy_batch([1, 2]) == []
+    for pool in pools(session_factory).values():
+        assert pool.deployment_status == deployments.PENDING
+        assert pool.deployment_attempts == 1
+        assert pool.deployment_claim_expires > time.time()
+
+    # Still backing off
+    up = True
+    assert queue.deploy_batch([1, 2]) == []
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE pools SET deployment_claim_expires = 0"))
+    assert queue.deploy_batch([1, 2]) == [1, 2]
+    assert {pool.deployment_status for pool in pools(session_factory).values()} == {deployments.DEPLOYED}
+
+
+def test_only_the_rejected_pool_fails(engine, session_factory):
+    seed(engine, {1: 3600, 2: 0, 3: 3600})
+    algod = fakes.FakeAlgodClient()
+    queue = make_queue(session_factory, lambda: (algod, SimpleNamespace(address="DEPLOYER"), {}))
+
+    assert queue.deploy_batch([1, 2, 3]) == [1, 3]
+    rows = pools(session_factory)
+    assert rows[2].deployment_status == deployments.FAILED
+    assert rows[1].app_id and rows[3].app_id
+    assert len(algod.apps) == 2
+
+
+def test_unfunded_app_is_kept_and_only_funded_on_retry(engine, session_factory):
+    seed(engine, {1: 3600})
+    algod = fakes.FakeAlgodClient()
+    created = []
+
+    def deploy_fn(contracts, algod_client, deployer, batch, on_created=None):
+        pool = batch[0]
+        if pool.app_id:
+            return {pool.id: (pool.app_id, pool.contract_address)}
+        created.append(pool.id)
+        on_created(pool, 77, "APP77")
+        return {pool.id: deploy.FundingError("overspend", 77, "APP77")}
+
+    queue = make_queue(session_factory, lambda: (algod, SimpleNamespace(address="DEPLOYER"), {}), deploy_fn)
+    assert queue.deploy_batch([1]) == []
+    pool = pools(session_factory)[1]
+    assert (pool.deployment_status, pool.app_id, pool.contract_address) == (deployments.PENDING, 77, "APP77")
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE pools SET deployment_claim_expires = 0"))
+    assert queue.deploy_batch([1]) == [1]
+    assert created == [1]
+    assert pools(session_factory)[1].deployment_status == deployments.DEPLOYED
@@ -0,0 +1,61 @@
+from sqlalchemy import select, text
+
+import ledger
+import models
+
+
+def insert_event(engine, event_id, amount):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO deposit_events (id, pool_id, wallet_address, kind, amount, cycle, txid) "
+            "VALUES (:id, 1, 'W', 'deposit', :amount, 0, :txid)"
+        ), {"id": event_id, "amount": amount, "txid": f"T{event_id}"})
+
+
+def test_gap_list_is_bounded(engine, session_factory, monkeypatch):
+    monkeypatch.setattr(ledger, "MAX_GAPS", 10)
+    insert_event(engine, 1, 100)
+    # Ids 2..499 were spent by replays that hit ON CONFLICT DO NOTHING
+    insert_event(engine, 500, 100)
+    ledger.LedgerCompactor(session_factory).compact_once()
+
+    db = session_factory()
+    last_id, gaps = ledger._checkpoint(db)
+    assert last_id == 500
+    assert sorted(gaps) == list(range(490, 500))
+    pending = str(select(models.DepositEvent.id).where(ledger.uncompacted(db)).compile(compile_kwargs={"literal_binds": True}))
+    assert pending.count(",") < 20
+    db.close()
+
+    # A kept gap that commits late is still compacted exactly once
+    insert_event(engine, 495, 7)
+    ledger.LedgerCompactor(session_factory).compact_once()
+    db = session_factory()
+    assert ledger.balances(db, [(1, "W")]) == {(1, "W"): 207}
+    assert 495 not in ledger._checkpoint(db)[1]
+    db.close()
+
+
+def test_gaps_are_dropped_once_their_transactions_ended(engine, session_factory, monkeypatch):
+    snapshots = iter([(10, 20), (10, 20), (15, 25), (21, 30)])
+    monkeypatch.setattr(ledger, "_snapshot", lambda db: next(snapshots))
+    insert_event(engine, 1, 100)
+    insert_event(engine, 4, 100)
+    compactor = ledger.LedgerCompactor(session_factory)
+
+    def gaps():
+        db = session_factory()
+        try:
+            return ledger._checkpoint(db)[1]
+        finally:
+            db.close()
+
+    compactor.compact_once()
+    assert {gap: horizon for gap, (_, horizon) in gaps().items()} == {2: None, 3: None}
+    # The next pass notes the horizon: transactions that may hold ids 2 and 3 are all below xid 20
+    compactor.compact_once()
+    assert {gap: horizon for gap, (_, horizon) in gaps().items()} == {2: 20, 3: 20}
+    compactor.compact_once()
+    assert set(gaps()) == {2, 3}
+    compactor.compact_once()
+    assert gaps() == {}
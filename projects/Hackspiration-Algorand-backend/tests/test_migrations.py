@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import text
+
+import migrations
+
+
+@pytest.mark.parametrize("name", [name for name, _, _ in migrations.HOT_QUERIES])
+def test_hot_query_uses_its_index(engine, name):
+    (plan,) = [plan for query, _, plan, _ in migrations.explain_hot_queries(engine) if query == name]
+    (index,) = [index for query, _, index in migrations.HOT_QUERIES if query == name]
+    assert index in plan, plan
+
+
+def test_a_dropped_index_fails_the_check(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_pools_status_renewal"))
+    failing = [name for name, _, _, uses_index in migrations.explain_hot_queries(engine) if not uses_index]
+    assert failing == ["renewal scan (leases.claim_due)"]
+
+
+def test_upgrade_is_idempotent(engine):
+    version = migrations.current_version(engine)
+    migrations.upgrade(engine)
+    assert migrations.current_version(engine) == version == migrations.MIGRATIONS[-1][0]
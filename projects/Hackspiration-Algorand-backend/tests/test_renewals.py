@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+import billing
+import fakes
+import ledger
+from batcher import GroupBatcher
+from renewals import RenewalEngine
+
+NOW = 2_000_000_000
+CYCLE = 3600
+
+
+@pytest.fixture
+def algod():
+    return fakes.FakeAlgodClient()
+
+
+@pytest.fixture
+def batcher(algod):
+    params = SimpleNamespace(min_fee=1000)
+    batcher = GroupBatcher(fakes.FakeGroupSender(algod, report_index=True), params=lambda: params, linger=0.001)
+    batcher.start()
+    yield batcher
+    batcher.stop()
+
+
+def seed(engine, pools):
+    with engine.begin() as conn:
+        for pool_id in pools:
+            conn.execute(
+                text(
+                    "INSERT INTO pools (id, subscription_name, admin_wallet, cost_per_cycle, max_members, cycle_duration, "
+                    "renewal_timestamp, status, cycle, app_id) VALUES (:id, 'Test', :admin, 1000, 4, :cycle, :ts, 1, 0, :app)"
+                ),
+                {"id": pool_id, "admin": f"ADMIN{pool_id}", "cycle": CYCLE, "ts": NOW - 10, "app": 1000 + pool_id},
+            )
+            conn.execute(text("INSERT INTO users (wallet_address) VALUES (:w)"), {"w": f"W{pool_id}"})
+            conn.execute(
+                text("INSERT INTO pool_members (pool_id, wallet_address, is_active, deposited_amount) VALUES (:p, :w, 1, 0)"),
+                {"p": pool_id, "w": f"W{pool_id}"},
+            )
+
+
+def test_failed_renew_call_leaves_pool_unbilled(engine, session_factory, algod, batcher):
+    seed(engine, [1, 2])
+    db = session_factory()
+    ledger.append(db, [
+        {"pool_id": p, "wallet_address": f"W{p}", "kind": ledger.DEPOSIT, "amount": 5000, "txid": f"T{p}"} for p in (1, 2)
+    ])
+    db.commit()
+    db.close()
+    algod.failing_apps.add(1002)
+
+    engine_ = RenewalEngine(session_factory, batcher=batcher, billing=billing.bill_due, chain_timeout=5, retry_seconds=30)
+    engine_.load()
+    assert engine_.run_due(NOW) == [1]
+
+    with engine.connect() as conn:
+        pools = {row.id: row for row in conn.execute(text("SELECT id, cycle, renewal_timestamp FROM pools"))}
+    assert (pools[1].cycle, pools[1].renewal_timestamp) == (1, NOW - 10 + CYCLE)
+    assert (pools[2].cycle, pools[2].renewal_timestamp) == (0, NOW - 10)
+
+    db = session_factory()
+    assert ledger.balances(db, [(1, "W1"), (2, "W2")]) == {(1, "W1"): 4000, (2, "W2"): 5000}
+    assert db.execute(text("SELECT COUNT(*) FROM invoices WHERE pool_id = 2")).scalar() == 0
+    db.close()
+
+    # Retried later, not spun on
+    assert engine_.next_deadline() == NOW + 30
+
+
+def test_renew_call_references_admin(engine, session_factory, batcher):
+    seed(engine, [1])
+    sent = []
+    submit = batcher.submit
+    batcher.submit = lambda call: sent.append(call) or submit(call)
+
+    engine_ = RenewalEngine(session_factory, batcher=batcher, chain_timeout=5)
+    engine_.load()
+    assert engine_.run_due(NOW) == [1]
+    assert [(call.method, call.accounts) for call in sent] == [("renew_cycle", ["ADMIN1"])]
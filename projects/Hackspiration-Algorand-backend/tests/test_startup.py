@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from bench.startup import CHAIN_STACK
+
+BOOT = """
+import asyncio, json, sys
+import main, migrations
+
+chain_stack = sorted(m for m in {chain_stack!r} if m in sys.modules)
+order = []
+
+def record(name, fn):
+    def wrapped(*args, **kwargs):
+        order.append(name)
+        return fn(*args, **kwargs)
+    return wrapped
+
+main.migrations.upgrade = record("migrations", migrations.upgrade)
+for name in ("chain_batcher", "renewal_engine", "deployment_queue", "chain_sync", "ledger_compactor"):
+    worker = getattr(main, name)
+    worker.start = record(name, worker.start)
+
+async def boot():
+    async with main.lifespan(main.app):
+        return migrations.current_version(main.engine)
+
+version = asyncio.run(boot())
+print(json.dumps({{"chain_stack": chain_stack, "order": order, "version": version, "latest": migrations.MIGRATIONS[-1][0]}}))
+"""
+
+
+def boot(tmp_path):
+    # A fresh interpreter, so the import check sees what importing main alone loads
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'boot.db'}", CHAIN_SYNC_INTERVAL="3600")
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT.format(chain_stack=CHAIN_STACK)],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_startup_migrates_before_any_worker_starts(tmp_path):
+    report = boot(tmp_path)
+    assert report["order"][0] == "migrations"
+    assert set(report["order"][1:]) == {"chain_batcher", "renewal_engine", "deployment_queue", "chain_sync", "ledger_compactor"}
+    assert report["version"] == report["latest"]
+    # The chain stack loads lazily, in the workers, not at import
+    assert report["chain_stack"] == []
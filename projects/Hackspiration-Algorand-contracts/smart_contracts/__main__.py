@@ -1,9 +1,15 @@
 import dataclasses
+import hashlib
 import importlib
 import logging
+import os
 import subprocess
 import sys
+import tempfile
+import time
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
 from pathlib import Path
 from shutil import rmtree
 
@@ -33,7 +39,11 @@ root_path = Path(__file__).parent
 class SmartContract:
     path: Path
     name: str
-    deploy: Callable[[], None] | None = None
+
+    @property
+    def deploy(self) -> Callable[[], None] | None:
+        """The deploy function from deploy_config.py, imported on first use."""
+        return import_deploy_if_exists(self.path.parent)
 
 
 def import_contract(folder: Path) -> Path:
@@ -47,6 +57,8 @@ def import_contract(folder: Path) -> Path:
 
 def import_deploy_if_exists(folder: Path) -> Callable[[], None] | None:
     """Imports the deploy function from a folder if it exists."""
+    if not (folder / "deploy_config.py").exists():
+        return None
     try:
         module_name = f"{folder.parent.name}.{folder.name}.deploy_config"
         deploy_module = importlib.import_module(module_name)
@@ -63,11 +75,7 @@ def has_contract_file(directory: Path) -> bool:
 # Use the current directory (root_path) as the base for contract folders and exclude
 # folders that start with '_' (internal helpers).
 contracts: list[SmartContract] = [
-    SmartContract(
-        path=import_contract(folder),
-        name=folder.name,
-        deploy=import_deploy_if_exists(folder),
-    )
+    SmartContract(path=import_contract(folder), name=folder.name)
     for folder in root_path.iterdir()
     if folder.is_dir() and has_contract_file(folder) and not folder.name.startswith("_")
 ]
@@ -89,12 +97,36 @@ def _get_output_path(output_dir: Path, deployment_extension: str) -> Path:
 def build(output_dir: Path, contract_path: Path) -> Path:
     """
     Builds the contract by exporting (compiling) its source and generating a client.
-    If the output directory already exists, it is cleared.
+    Everything is written to a staging directory that replaces output_dir only
+    once the build has succeeded, so a failed build leaves the old artifacts intact.
     """
-    output_dir = output_dir.resolve()
-    if output_dir.exists():
-        rmtree(output_dir)
-    output_dir.mkdir(exist_ok=True, parents=True)
+    final_dir = output_dir.resolve()
+    final_dir.parent.mkdir(exist_ok=True, parents=True)
+    output_dir = Path(tempfile.mkdtemp(prefix=f".{final_dir.name}-", dir=final_dir.parent))
+    try:
+        _build_into(output_dir, contract_path)
+        (output_dir / FINGERPRINT_FILE).write_text(fingerprint(contract_path))
+        _swap_dir(output_dir, final_dir)
+    except BaseException:
+        rmtree(output_dir, ignore_errors=True)
+        raise
+
+    client_files = sorted(final_dir.glob("*.arc56.json"))
+    return client_files[0] if client_files else final_dir
+
+
+def _swap_dir(staging: Path, final_dir: Path) -> None:
+    """Replaces final_dir with staging using renames only."""
+    old_dir = None
+    if final_dir.exists():
+        old_dir = final_dir.with_name(f".{final_dir.name}-old-{os.getpid()}")
+        final_dir.rename(old_dir)
+    staging.rename(final_dir)
+    if old_dir is not None:
+        rmtree(old_dir, ignore_errors=True)
+
+
+def _build_into(output_dir: Path, contract_path: Path) -> None:
     logger.info(f"Exporting {contract_path} to {output_dir}")
 
     build_result = subprocess.run(
@@ -123,14 +155,12 @@ def build(output_dir: Path, contract_path: Path) -> Path:
         file.name for file in output_dir.glob("*.arc56.json")
     ]
 
-    client_file: str | None = None
     if not app_spec_file_names:
         logger.warning(
             "No '*.arc56.json' file found (likely a logic signature being compiled). Skipping client generation."
         )
     else:
         for file_name in app_spec_file_names:
-            client_file = file_name
             print(file_name)
             generate_result = subprocess.run(
                 [
@@ -158,15 +188,83 @@ def build(output_dir: Path, contract_path: Path) -> Path:
                     raise Exception(
                         f"Could not generate typed client:\n{generate_result.stdout}"
                     )
-    if client_file:
-        return output_dir / client_file
-    return output_dir
+
+
+# ------------------------ Incremental Builds ------------------------ #
+
+FINGERPRINT_FILE = ".fingerprint"
+# Tool versions that change compiler/generator output
+TOOL_PACKAGES = ("puyapy", "algorand-python", "algokit-client-generator")
+
+
+def fingerprint(contract_path: Path) -> str:
+    """Hash of the contract's sources and the compiler/generator versions."""
+    digest = hashlib.sha256()
+    folder = contract_path.parent
+    for source in sorted(folder.rglob("*.py")):
+        # Deployment code does not affect the compiled output
+        if source.name == "deploy_config.py" or "__pycache__" in source.parts:
+            continue
+        digest.update(str(source.relative_to(folder)).encode())
+        digest.update(source.read_bytes())
+    for package in TOOL_PACKAGES:
+        try:
+            digest.update(f"{package}=={metadata.version(package)}".encode())
+        except metadata.PackageNotFoundError:
+            digest.update(f"{package}==none".encode())
+    return digest.hexdigest()
+
+
+def is_up_to_date(output_dir: Path, contract_path: Path) -> bool:
+    stamp = output_dir / FINGERPRINT_FILE
+    return stamp.exists() and stamp.read_text() == fingerprint(contract_path)
+
+
+def _timed_build(output_dir: Path, contract_path: Path) -> float:
+    start = time.perf_counter()
+    build(output_dir, contract_path)
+    return time.perf_counter() - start
+
+
+def build_all(artifact_path: Path, contracts_to_build: list[SmartContract], force: bool = False) -> None:
+    """
+    Builds stale contracts in parallel and skips those whose fingerprint matches.
+    Prints a timing line per contract.
+    """
+    stale = [
+        contract
+        for contract in contracts_to_build
+        if force or not is_up_to_date(artifact_path / contract.name, contract.path)
+    ]
+    for contract in contracts_to_build:
+        if contract not in stale:
+            print(f"{contract.name:<30} up to date")
+    if not stale:
+        return
+
+    started = time.perf_counter()
+    workers = min(len(stale), os.cpu_count() or 1)
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            contract.name: pool.submit(_timed_build, artifact_path / contract.name, contract.path)
+            for contract in stale
+        }
+        for name, future in futures.items():
+            try:
+                print(f"{name:<30} built in {future.result():.2f}s")
+            except Exception as e:
+                failures.append(name)
+                print(f"{name:<30} FAILED: {e}")
+    print(f"Built {len(stale) - len(failures)}/{len(stale)} contracts in {time.perf_counter() - started:.2f}s")
+    if failures:
+        raise Exception(f"Could not build: {', '.join(failures)}")
 
 
 # --------------------------- Main Logic --------------------------- #
 
 
-def main(action: str, contract_name: str | None = None) -> None:
+def main(action: str, contract_name: str | None = None, force: bool = False) -> None:
     """Main entry point to build and/or deploy smart contracts."""
     artifact_path = root_path / "artifacts"
     # Filter contracts based on an optional specific contract name.
@@ -178,9 +276,7 @@ def main(action: str, contract_name: str | None = None) -> None:
 
     match action:
         case "build":
-            for contract in filtered_contracts:
-                logger.info(f"Building app at {contract.path}")
-                build(artifact_path / contract.name, contract.path)
+            build_all(artifact_path, filtered_contracts, force=force)
         case "deploy":
             for contract in filtered_contracts:
                 output_dir = artifact_path / contract.name
@@ -194,24 +290,28 @@ def main(action: str, contract_name: str | None = None) -> None:
                 )
                 if app_spec_file_name is None:
                     raise Exception("Could not deploy app, .arc56.json file not found")
-                if contract.deploy:
+                deploy = contract.deploy
+                if deploy:
                     logger.info(f"Deploying app {contract.name}")
-                    contract.deploy()
+                    deploy()
         case "all":
+            build_all(artifact_path, filtered_contracts, force=force)
             for contract in filtered_contracts:
-                logger.info(f"Building app at {contract.path}")
-                build(artifact_path / contract.name, contract.path)
-                if contract.deploy:
+                deploy = contract.deploy
+                if deploy:
                     logger.info(f"Deploying {contract.name}")
-                    contract.deploy()
+                    deploy()
         case _:
             logger.error(f"Unknown action: {action}")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 2:
-        main(sys.argv[1], sys.argv[2])
-    elif len(sys.argv) > 1:
-        main(sys.argv[1])
+    # --force rebuilds every contract regardless of fingerprints
+    force = "--force" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    if len(args) > 1:
+        main(args[0], args[1], force=force)
+    elif len(args) > 0:
+        main(args[0], force=force)
     else:
-        main("all")
+        main("all", force=force)
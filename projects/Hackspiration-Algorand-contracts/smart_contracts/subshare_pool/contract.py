@@ -5,103 +5,134 @@ from beaker import *
 STATUS_FORMING = Int(0)
 STATUS_ACTIVE = Int(1)
 STATUS_DISSOLVED = Int(2)
+STATUS_UNDERFUNDED = Int(3)
 
-class SubSharePool(Application):
+class SubShareState:
     # Global State
-    subscription_name = ApplicationStateValue(stack_type=TealType.bytes)
-    admin_address = ApplicationStateValue(stack_type=TealType.bytes)
-    cost_per_cycle = ApplicationStateValue(stack_type=TealType.uint64)
-    max_members = ApplicationStateValue(stack_type=TealType.uint64)
-    current_members = ApplicationStateValue(stack_type=TealType.uint64)
-    cycle_duration = ApplicationStateValue(stack_type=TealType.uint64)
-    renewal_timestamp = ApplicationStateValue(stack_type=TealType.uint64)
-    total_deposited = ApplicationStateValue(stack_type=TealType.uint64)
-    status = ApplicationStateValue(stack_type=TealType.uint64)
+    subscription_name = GlobalStateValue(stack_type=TealType.bytes)
+    admin_address = GlobalStateValue(stack_type=TealType.bytes)
+    cost_per_cycle = GlobalStateValue(stack_type=TealType.uint64)
+    max_members = GlobalStateValue(stack_type=TealType.uint64)
+    current_members = GlobalStateValue(stack_type=TealType.uint64)
+    cycle_duration = GlobalStateValue(stack_type=TealType.uint64)
+    renewal_timestamp = GlobalStateValue(stack_type=TealType.uint64)
+    total_deposited = GlobalStateValue(stack_type=TealType.uint64)
+    status = GlobalStateValue(stack_type=TealType.uint64)
 
     # Local State (per member)
-    deposited_amount = AccountStateValue(stack_type=TealType.uint64, default=Int(0))
-    is_active = AccountStateValue(stack_type=TealType.uint64, default=Int(0))
+    deposited_amount = LocalStateValue(stack_type=TealType.uint64, default=Int(0))
+    is_active = LocalStateValue(stack_type=TealType.uint64, default=Int(0))
 
-    @create
-    def create(self, subscription_name: abi.String, admin_address: abi.Address, cost_per_cycle: abi.Uint64, max_members: abi.Uint64, cycle_duration: abi.Uint64):
-        return Seq(
-            self.subscription_name.set(subscription_name.get()),
-            self.admin_address.set(admin_address.get()),
-            self.cost_per_cycle.set(cost_per_cycle.get()),
-            self.max_members.set(max_members.get()),
-            self.current_members.set(Int(0)),
-            self.cycle_duration.set(cycle_duration.get()),
-            self.renewal_timestamp.set(Global.latest_timestamp() + cycle_duration.get()),
-            self.total_deposited.set(Int(0)),
-            self.status.set(STATUS_FORMING),
-        )
+app = Application("SubSharePool", state=SubShareState())
 
-    @opt_in
-    def opt_in(self):
-        return Seq(
-            Assert(self.status != STATUS_DISSOLVED),
-            Assert(self.current_members < self.max_members),
-            self.is_active.set(Int(1)),
-            self.current_members.increment(),
-        )
+@app.create
+def create(subscription_name: abi.String, admin_address: abi.Address, cost_per_cycle: abi.Uint64, max_members: abi.Uint64, cycle_duration: abi.Uint64):
+    return Seq(
+        # cycles_due() divides by it
+        Assert(cycle_duration.get() > Int(0)),
+        app.state.subscription_name.set(subscription_name.get()),
+        app.state.admin_address.set(admin_address.get()),
+        app.state.cost_per_cycle.set(cost_per_cycle.get()),
+        app.state.max_members.set(max_members.get()),
+        app.state.current_members.set(Int(0)),
+        app.state.cycle_duration.set(cycle_duration.get()),
+        app.state.renewal_timestamp.set(Global.latest_timestamp() + cycle_duration.get()),
+        app.state.total_deposited.set(Int(0)),
+        app.state.status.set(STATUS_FORMING),
+    )
 
-    @external
-    def deposit_share(self, payment: abi.PaymentTransaction):
-        return Seq(
-            Assert(self.status != STATUS_DISSOLVED),
-            Assert(payment.get().receiver() == Global.current_application_address()),
-            self.deposited_amount.set(self.deposited_amount + payment.get().amount()),
-            self.total_deposited.set(self.total_deposited + payment.get().amount()),
-        )
+@app.opt_in
+def opt_in():
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(app.state.current_members < app.state.max_members),
+        app.state.is_active.set(Int(1)),
+        app.state.current_members.increment(),
+    )
 
-    @external
-    def payout(self):
-        return Seq(
-            Assert(self.total_deposited == self.cost_per_cycle),
-            InnerTxnBuilder.Execute({
-                TxnField.type_enum: TxnType.Payment,
-                TxnField.receiver: self.admin_address,
-                TxnField.amount: self.total_deposited,
-            }),
-            self.status.set(STATUS_ACTIVE),
-            self.renewal_timestamp.set(self.renewal_timestamp + self.cycle_duration),
-            self.total_deposited.set(Int(0)),
-        )
+@app.external
+def deposit_share(payment: abi.PaymentTransaction):
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(payment.get().receiver() == Global.current_application_address()),
+        app.state.deposited_amount.set(app.state.deposited_amount + payment.get().amount()),
+        app.state.total_deposited.set(app.state.total_deposited + payment.get().amount()),
+    )
 
-    @external
-    def renew_cycle(self):
-        return Seq(
-            Assert(Global.latest_timestamp() >= self.renewal_timestamp),
-            self.payout(), # Triggers payout logic
-        )
-    
-    @external
-    def dissolve_pool(self):
-        return Seq(
-            Assert(Txn.sender() == self.admin_address),
-            self.status.set(STATUS_DISSOLVED),
-            # Ideally refund all here, but iterating over accounts is hard in AVM 
-            # Simplified: Users withdraw manually if dissolved
-        )
+@Subroutine(TealType.uint64)
+def cycles_due():
+    # Deadlines passed since renewal_timestamp, including the current one
+    return If(
+        Global.latest_timestamp() >= app.state.renewal_timestamp,
+        (Global.latest_timestamp() - app.state.renewal_timestamp) / app.state.cycle_duration + Int(1),
+        Int(0),
+    )
 
-    @external
-    def withdraw(self):
-        # Allow withdrawal if dissolved
-        return Seq(
-            Assert(self.status == STATUS_DISSOLVED),
+@Subroutine(TealType.none)
+def settle(cycles):
+    # Pays as many of `cycles` as the deposits cover in one inner payment and
+    # jumps renewal_timestamp past all of them; a shortfall marks the pool underfunded
+    paid = ScratchVar(TealType.uint64)
+    return Seq(
+        paid.store(app.state.total_deposited / app.state.cost_per_cycle),
+        If(paid.load() > cycles).Then(paid.store(cycles)),
+        If(paid.load() > Int(0)).Then(
             InnerTxnBuilder.Execute({
                 TxnField.type_enum: TxnType.Payment,
-                TxnField.receiver: Txn.sender(),
-                TxnField.amount: self.deposited_amount,
-            }),
-            self.deposited_amount.set(Int(0))
-        )
+                TxnField.receiver: app.state.admin_address,
+                TxnField.amount: paid.load() * app.state.cost_per_cycle,
+            })
+        ),
+        app.state.total_deposited.set(app.state.total_deposited - paid.load() * app.state.cost_per_cycle),
+        app.state.renewal_timestamp.set(app.state.renewal_timestamp + cycles * app.state.cycle_duration),
+        app.state.status.set(If(paid.load() == cycles, STATUS_ACTIVE, STATUS_UNDERFUNDED)),
+    )
+
+@app.external
+def payout():
+    due = ScratchVar(TealType.uint64)
+    return Seq(
+        # A dissolved pool only pays members back (withdraw/refund_batch)
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(app.state.total_deposited >= app.state.cost_per_cycle),
+        # Early payout settles the upcoming cycle
+        due.store(cycles_due()),
+        settle(If(due.load() > Int(0), due.load(), Int(1))),
+    )
+
+@app.external
+def renew_cycle():
+    return Seq(
+        Assert(app.state.status != STATUS_DISSOLVED),
+        Assert(Global.latest_timestamp() >= app.state.renewal_timestamp),
+        settle(cycles_due()),
+    )
+
+@app.external
+def dissolve_pool():
+    return Seq(
+        Assert(Txn.sender() == app.state.admin_address),
+        app.state.status.set(STATUS_DISSOLVED),
+        # Ideally refund all here, but iterating over accounts is hard in AVM 
+        # Simplified: Users withdraw manually if dissolved
+    )
+
+@app.external
+def withdraw():
+    # Allow withdrawal if dissolved
+    return Seq(
+        Assert(app.state.status == STATUS_DISSOLVED),
+        InnerTxnBuilder.Execute({
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.receiver: Txn.sender(),
+            TxnField.amount: app.state.deposited_amount,
+        }),
+        app.state.deposited_amount.set(Int(0))
+    )
 
-    @external
-    def exit_next_cycle(self):
-        return self.is_active.set(Int(0))
+@app.external
+def exit_next_cycle():
+    return app.state.is_active.set(Int(0))
 
 if __name__ == "__main__":
-    import json
-    app = SubSharePool()
-    print(app.application_spec().to_json())
+    print(app.build().to_json())
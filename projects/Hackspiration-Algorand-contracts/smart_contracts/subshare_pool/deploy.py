@@ -1,39 +1,60 @@
 import logging
-import base64
+import sys
+from pathlib import Path
 from algosdk.v2client import algod
 from algosdk.mnemonic import to_private_key
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer
 from algokit_utils import (
     Account,
-    ApplicationSpecification,
-    ApplicationClient,
     get_algod_client,
     get_indexer_client,
-    get_kmd_wallet_account,
+    get_localnet_default_account,
 )
-from contract import SubSharePool
+
+# The backend's artifact cache (artifacts.py) keeps this contract's compiled
+# programs too, keyed by its source and the compiler versions
+sys.path.append(str(Path(__file__).resolve().parents[3] / "Hackspiration-Algorand-backend"))
+import artifacts
 
 logger = logging.getLogger(__name__)
 
+VARIANT = "contracts"
+artifacts.register(VARIANT, "subshare_pool_contracts", Path(__file__).parent / "contract.py")
+
+def load_contract(algod_client: algod.AlgodClient) -> artifacts.ContractArtifacts:
+    """SubSharePool's app spec and programs, compiled only when contract.py or the compiler changes."""
+    return artifacts.load(algod_client, VARIANT)
+
 def deploy(
-    app_spec: ApplicationSpecification,
+    contract: artifacts.ContractArtifacts,
     algod_client: algod.AlgodClient,
     deployer: Account,
-) -> None:
-    app_client = ApplicationClient(
-        algod_client=algod_client,
-        app_spec=app_spec,
-        signer=deployer,
-    )
+) -> int:
+    app_spec = contract.app_spec
 
-    app_id, app_addr, tx_id = app_client.create(
-        subscription_name="Netflix Share",
-        admin_address=deployer.address,
-        cost_per_cycle=1000000, # 1 Algo
-        max_members=4,
-        cycle_duration=60*60*24*30 # 30 days
+    # The programs come assembled from the cache: no compile round-trips
+    atc = AtomicTransactionComposer()
+    atc.add_method_call(
+        app_id=0,
+        method=app_spec.contract.get_method_by_name("create"),
+        sender=deployer.address,
+        sp=algod_client.suggested_params(),
+        signer=deployer.signer,
+        method_args=[
+            "Netflix Share",
+            deployer.address,
+            1000000, # 1 Algo
+            4,
+            60*60*24*30, # 30 days
+        ],
+        approval_program=contract.approval_bin,
+        clear_program=contract.clear_bin,
+        global_schema=app_spec.global_state_schema,
+        local_schema=app_spec.local_state_schema,
     )
-    
-    logger.info(f"Deployed app_id: {app_id}, app_addr: {app_addr}")
+    app_id = atc.execute(algod_client, 4).abi_results[0].tx_info["application-index"]
+
+    logger.info(f"Deployed app_id: {app_id}")
     return app_id
 
 if __name__ == "__main__":
@@ -44,7 +65,7 @@ if __name__ == "__main__":
     indexer_client = get_indexer_client()
     
     # Get deployer account (using localnet default or environment variable)
-    deployer = get_kmd_wallet_account(algod_client, "unencrypted-default-wallet", "test")
+    deployer = get_localnet_default_account(algod_client)
     # In production/testnet, use mnemonic from env
     # import os
     # mnemonic = os.getenv("DEPLOYER_MNEMONIC")
@@ -52,7 +73,4 @@ if __name__ == "__main__":
     #     private_key = to_private_key(mnemonic)
     #     deployer = Account(private_key=private_key)
 
-    app = SubSharePool()
-    app_spec = app.application_spec()
-    
-    deploy(app_spec, algod_client, deployer)
+    deploy(load_contract(algod_client), algod_client, deployer)
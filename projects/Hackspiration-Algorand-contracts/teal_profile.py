@@ -0,0 +1,489 @@
+"""
+Static opcode-cost and program-size profiler for the SubSharePool variants.
+
+Compiles each variant to TEAL offline (no algod), splits the approval program
+into ABI routes and reports, per method:
+
+- worst-case opcode cost (dispatch prefix + longest path through the handler),
+- global/local/box state reads and writes reachable from the route,
+- inner transactions submitted,
+
+plus the estimated assembled size of the approval and clear programs. The
+result is printed as JSON; the exit status is 1 when anything exceeds the
+budgets in teal_budgets.json or a variant does not compile.
+
+A loop runs at most `max_iterations` times, declared per method in the
+budgets (and asserted by the contract): its longest iteration and its inner
+transactions are counted that many times. A loop without a declared bound,
+or nested in another loop, is a violation.
+
+    python teal_profile.py [--budgets teal_budgets.json] [--out report.json] [--allow-errors]
+    python teal_profile.py --teal backend=approval.teal    # profile a TEAL file instead
+"""
+import argparse
+import base64
+import importlib.util
+import json
+import re
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+VARIANTS = {
+    # name -> (contract source, how to get the application out of it)
+    "backend": (HERE.parent / "Hackspiration-Algorand-backend" / "contract.py", "app"),
+    "backend_boxes": (HERE.parent / "Hackspiration-Algorand-backend" / "contract_boxes.py", "app"),
+    "contracts": (HERE / "smart_contracts" / "subshare_pool" / "contract.py", "app"),
+}
+
+# Opcodes that cost more than 1 (AVM v8 cost table); everything else costs 1
+OPCODE_COSTS = {
+    "sha256": 35, "keccak256": 130, "sha512_256": 45, "sha3_256": 130,
+    "ed25519verify": 1900, "ed25519verify_bare": 1900,
+    "ecdsa_verify": 1700, "ecdsa_pk_decompress": 650, "ecdsa_pk_recover": 2000,
+    "vrf_verify": 5700, "falcon_verify": 1700,
+    "bn256_add": 70, "bn256_scalar_mul": 970, "bn256_pairing": 8700,
+    "b+": 10, "b-": 10, "b*": 20, "b/": 20, "b%": 20, "bsqrt": 40,
+    "b|": 6, "b&": 6, "b^": 6, "b~": 4, "json_ref": 25,
+}
+
+STATE_OPS = {
+    "app_global_get": ("global", "reads"), "app_global_get_ex": ("global", "reads"),
+    "app_global_put": ("global", "writes"), "app_global_del": ("global", "writes"),
+    "app_local_get": ("local", "reads"), "app_local_get_ex": ("local", "reads"),
+    "app_local_put": ("local", "writes"), "app_local_del": ("local", "writes"),
+    "box_get": ("box", "reads"), "box_extract": ("box", "reads"), "box_len": ("box", "reads"),
+    "box_put": ("box", "writes"), "box_replace": ("box", "writes"), "box_del": ("box", "writes"),
+    "box_create": ("box", "writes"), "box_resize": ("box", "writes"), "box_splice": ("box", "writes"),
+}
+
+TERMINAL_OPS = {"return", "err", "retsub"}
+BRANCH_OPS = {"b", "bz", "bnz", "callsub"}
+
+# Named integer constants accepted by `int`/`pushint`
+NAMED_INTS = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3, "UpdateApplication": 4, "DeleteApplication": 5,
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+}
+
+
+# ----------------------------------------------------------------------- #
+# Parsing
+# ----------------------------------------------------------------------- #
+
+def _tokenize(line):
+    """Splits a TEAL line into tokens, dropping // comments outside strings."""
+    tokens, token, in_string, i = [], "", False, 0
+    while i < len(line):
+        c = line[i]
+        if in_string:
+            token += c
+            if c == "\\" and i + 1 < len(line):
+                token += line[i + 1]
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            token += c
+            in_string = True
+        elif line.startswith("//", i):
+            break
+        elif c.isspace():
+            if token:
+                tokens.append(token)
+                token = ""
+        else:
+            token += c
+        i += 1
+    if token:
+        tokens.append(token)
+    return tokens
+
+
+def _comment(line):
+    match = re.search(r'//\s*"(.*)"\s*$', line)
+    return match.group(1) if match else None
+
+
+class Program:
+    def __init__(self, teal):
+        self.ops = []  # (opcode, args, comment)
+        self.labels = {}  # label -> index of the next op
+        self.version = 1
+        for raw in teal.splitlines():
+            tokens = _tokenize(raw)
+            if not tokens:
+                continue
+            if tokens[0] == "#pragma":
+                self.version = int(tokens[2])
+                continue
+            if tokens[0].endswith(":") and len(tokens) == 1:
+                self.labels[tokens[0][:-1]] = len(self.ops)
+                continue
+            self.ops.append((tokens[0], tokens[1:], _comment(raw)))
+
+    # --------------------------- size --------------------------- #
+
+    def byte_size(self):
+        return 1 + sum(_op_size(op, args) for op, args, _ in self.ops)  # +1 for the version byte
+
+    # ------------------------ control flow ------------------------ #
+
+    def successors(self, i):
+        op, args, _ = self.ops[i]
+        nxt = [i + 1] if i + 1 < len(self.ops) else []
+        if op in TERMINAL_OPS:
+            return []
+        if op == "b":
+            return [self.labels[args[0]]]
+        if op in ("bz", "bnz"):
+            return [self.labels[args[0]]] + nxt
+        if op in ("switch", "match"):
+            return [self.labels[a] for a in args] + nxt
+        return nxt
+
+    def worst_cost(self, start):
+        """
+        Longest-path opcode cost from `start` to return/err/retsub, following
+        each loop's back edge zero times; see loop_cost() for the iterations.
+        """
+        memo, on_stack = {}, set()
+
+        def cost(i):
+            if i >= len(self.ops):
+                return 0
+            if i in memo:
+                return memo[i]
+            if i in on_stack:
+                return 0
+            on_stack.add(i)
+            op, args, _ = self.ops[i]
+            total = OPCODE_COSTS.get(op, 1)
+            if op == "callsub":
+                total += cost(self.labels[args[0]])
+                total += cost(i + 1)
+            else:
+                total += max((cost(s) for s in self.successors(i)), default=0)
+            on_stack.discard(i)
+            memo[i] = total
+            return total
+
+        return cost(start)
+
+    def _edges(self, i):
+        op, args, _ = self.ops[i]
+        if op == "callsub":
+            return [self.labels[args[0]], i + 1]
+        return self.successors(i)
+
+    def loop_headers(self, start):
+        """Targets of the back edges reachable from `start`, subroutines (and recursion) included."""
+        headers, done, on_stack = set(), set(), set()
+
+        def visit(i):
+            if i >= len(self.ops) or i in done:
+                return
+            if i in on_stack:
+                headers.add(i)
+                return
+            on_stack.add(i)
+            for s in self._edges(i):
+                visit(s)
+            on_stack.discard(i)
+            done.add(i)
+
+        visit(start)
+        return headers
+
+    def loop_body(self, header):
+        """Ops on a cycle through `header`."""
+        return {i for i in self.reachable(header) if header in self.reachable(i)}
+
+    def loop_cost(self, header, body):
+        """(opcode cost, inner transactions) of one pass around the loop, subroutines included."""
+        memo = {}
+
+        def cost(i):
+            if i not in memo:
+                op, args, _ = self.ops[i]
+                own = OPCODE_COSTS.get(op, 1)
+                if op == "callsub":
+                    own += self.worst_cost(self.labels[args[0]])
+                # Every op in the body leads back to the header; nothing else closes a cycle
+                memo[i] = own + max(0 if s == header else cost(s) for s in self._edges(i) if s in body)
+            return memo[i]
+
+        called = set(body)
+        for i in body:
+            if self.ops[i][0] == "callsub":
+                called |= self.reachable(self.labels[self.ops[i][1][0]])
+        inner = sum(1 for i in called if self.ops[i][0] == "itxn_submit")
+        return cost(header), inner
+
+    def reachable(self, start):
+        seen, stack = set(), [start]
+        while stack:
+            i = stack.pop()
+            if i in seen or i >= len(self.ops):
+                continue
+            seen.add(i)
+            op, args, _ = self.ops[i]
+            if op == "callsub":
+                stack.append(self.labels[args[0]])
+                stack.append(i + 1)
+            else:
+                stack.extend(self.successors(i))
+        return seen
+
+    # --------------------------- routes --------------------------- #
+
+    def routes(self):
+        """
+        Maps each ABI method (and the bare-call branch, as "<bare>") to
+        (index of the dispatching branch op, handler entry index).
+        """
+        routes = {}
+        pending = []  # selectors pushed before a match
+        for i, (op, args, comment) in enumerate(self.ops):
+            if op in ("method", "pushbytes", "byte") and self._is_selector(i):
+                name = (args[0].strip('"') if op == "method" else comment) or args[0]
+                pending.append(name.split("(")[0])
+                continue
+            if op == "==" and pending and i + 1 < len(self.ops) and self.ops[i + 1][0] == "bnz":
+                routes[pending.pop()] = (i + 1, self.labels[self.ops[i + 1][1][0]])
+                pending = []
+            elif op == "match" and pending:
+                for name, label in zip(pending, self.ops[i][1]):
+                    routes[name] = (i, self.labels[label])
+                pending = []
+            elif op == "bnz" and i >= 3 and self.ops[i - 3][1][:1] == ["NumAppArgs"]:
+                routes["<bare>"] = (i, self.labels[args[0]])
+        return routes
+
+    def _is_selector(self, i):
+        # A 4-byte constant compared against ApplicationArgs 0
+        op, args, _ = self.ops[i]
+        if op == "method":
+            return True
+        previous = self.ops[i - 1] if i else ("", [], None)
+        return (
+            previous[0] == "txna" and previous[1] == ["ApplicationArgs", "0"]
+            or previous[0] in ("method", "pushbytes")
+        ) and bool(re.fullmatch(r"0x[0-9a-fA-F]{8}", args[0] if args else ""))
+
+
+def _varuint_len(n):
+    length = 1
+    while n >= 0x80:
+        n >>= 7
+        length += 1
+    return length
+
+
+def _bytes_len(token):
+    if token.startswith("0x"):
+        return (len(token) - 2) // 2
+    if token.startswith('"'):
+        return len(json.loads(token).encode())
+    if token.startswith(("base64(", "b64(")):
+        return len(base64.b64decode(token[token.index("(") + 1:-1]))
+    if token.startswith(("base32(", "b32(")):
+        data = token[token.index("(") + 1:-1]
+        return len(base64.b32decode(data + "=" * (-len(data) % 8)))
+    return len(token)
+
+
+def _int_value(token):
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    return int(token, 0)
+
+
+def _op_size(op, args):
+    if op in ("int", "pushint"):
+        return 1 + _varuint_len(_int_value(args[0]))
+    if op in ("byte", "pushbytes"):
+        data = args[-1] if args[0] in ("base64", "b64", "base32", "b32") else args[0]
+        length = len(base64.b64decode(data)) if args[0] in ("base64", "b64") else _bytes_len(data)
+        return 1 + _varuint_len(length) + length
+    if op == "method":
+        return 1 + 1 + 4
+    if op == "addr":
+        return 1 + 1 + 32
+    if op == "intcblock":
+        return 1 + _varuint_len(len(args)) + sum(_varuint_len(_int_value(a)) for a in args)
+    if op == "bytecblock":
+        return 1 + _varuint_len(len(args)) + sum(_varuint_len(_bytes_len(a)) + _bytes_len(a) for a in args)
+    if op == "pushints":
+        return 1 + _varuint_len(len(args)) + sum(_varuint_len(_int_value(a)) for a in args)
+    if op == "pushbytess":
+        return 1 + _varuint_len(len(args)) + sum(_varuint_len(_bytes_len(a)) + _bytes_len(a) for a in args)
+    if op in BRANCH_OPS:
+        return 3
+    if op in ("switch", "match"):
+        return 2 + 2 * len(args)
+    # Everything else: opcode byte plus one byte per immediate (fields, small indexes)
+    return 1 + len(args)
+
+
+# ----------------------------------------------------------------------- #
+# Compilation
+# ----------------------------------------------------------------------- #
+
+def compile_variant(source, attr):
+    """Returns (approval_teal, clear_teal) for a contract module, compiled offline."""
+    sys.path.insert(0, str(source.parent))
+    try:
+        spec = importlib.util.spec_from_file_location(f"_profiled_{source.parent.name}", source)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(source.parent))
+
+    app = getattr(module, attr)
+    if isinstance(app, type):
+        # Class-based (pre-1.0) beaker applications compile on instantiation
+        app = app()
+        approval = getattr(app, "approval_program", None)
+        clear = getattr(app, "clear_program", None)
+        if approval is None:
+            source_map = app.application_spec()["source"]
+            approval = base64.b64decode(source_map["approval"]).decode()
+            clear = base64.b64decode(source_map["clear"]).decode()
+        return approval, clear
+    built = app.build()
+    return built.approval_program, built.clear_program
+
+
+# ----------------------------------------------------------------------- #
+# Report
+# ----------------------------------------------------------------------- #
+
+def method_limits(budgets, variant, method):
+    limits = {**budgets.get("default", {}), **budgets.get("variants", {}).get(variant, {})}
+    method_limits = {**budgets.get("methods", {}), **limits.get("methods", {})}
+    return {**method_limits.get("*", {}), **method_limits.get(method, {})}
+
+
+def declared_iterations(budgets, variant, approval_teal):
+    """{method: max_iterations from the budgets} for profile()."""
+    routes = Program(approval_teal).routes()
+    return {name: method_limits(budgets, variant, name).get("max_iterations") for name in routes}
+
+
+def profile(approval_teal, clear_teal, iterations=None):
+    """Report for one variant; `iterations` maps a method to its declared max_iterations."""
+    approval, clear = Program(approval_teal), Program(clear_teal)
+    iterations = iterations or {}
+    methods = {}
+    for name, (branch, entry) in sorted(approval.routes().items()):
+        # Dispatch prefix: every comparison before this route's branch runs and fails
+        prefix = sum(OPCODE_COSTS.get(op, 1) for op, _, _ in approval.ops[: branch + 1])
+        handler_cost = approval.worst_cost(entry)
+        headers = approval.loop_headers(entry)
+        bound = iterations.get(name)
+        loop_inner = 0
+        unbounded = bool(headers) and bound is None
+        for header in headers:
+            body = approval.loop_body(header)
+            if bound is None or len(headers & body) > 1:
+                unbounded = True
+                continue
+            # The acyclic path may already hold one pass; counting `bound` more keeps it an upper bound
+            body_cost, body_inner = approval.loop_cost(header, body)
+            handler_cost += bound * body_cost
+            loop_inner += (bound - 1) * body_inner
+        state = {"global": {"reads": 0, "writes": 0}, "local": {"reads": 0, "writes": 0}, "box": {"reads": 0, "writes": 0}}
+        inner = 0
+        for i in approval.reachable(entry):
+            op = approval.ops[i][0]
+            if op in STATE_OPS:
+                kind, access = STATE_OPS[op]
+                state[kind][access] += 1
+            elif op == "itxn_submit":
+                inner += 1
+        methods[name] = {
+            "worst_case_cost": prefix + handler_cost,
+            "dispatch_cost": prefix,
+            "loops": len(headers),
+            "max_iterations": bound if headers else None,
+            "unbounded_loop": unbounded,
+            "state": state,
+            "inner_txns": inner + loop_inner,
+        }
+    return {
+        "avm_version": approval.version,
+        "program_bytes": {
+            "approval": approval.byte_size(),
+            "clear": clear.byte_size(),
+            "total": approval.byte_size() + clear.byte_size(),
+        },
+        "methods": methods,
+    }
+
+
+def check_budgets(report, budgets):
+    violations = []
+    for variant, result in report.items():
+        if "error" in result:
+            continue
+        limits = {**budgets.get("default", {}), **budgets.get("variants", {}).get(variant, {})}
+        max_bytes = limits.get("max_program_bytes")
+        if max_bytes is not None and result["program_bytes"]["total"] > max_bytes:
+            violations.append(f"{variant}: program is {result['program_bytes']['total']} bytes (budget {max_bytes})")
+        for method, stats in result["methods"].items():
+            limit = method_limits(budgets, variant, method)
+            if stats["unbounded_loop"]:
+                violations.append(f"{variant}.{method}: loop without a max_iterations bound (or nested loops)")
+            for key, stat in (("max_cost", "worst_case_cost"), ("max_inner_txns", "inner_txns")):
+                if key in limit and stats[stat] > limit[key]:
+                    violations.append(f"{variant}.{method}: {stat} {stats[stat]} > {limit[key]}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budgets", type=Path, default=HERE / "teal_budgets.json")
+    parser.add_argument("--out", type=Path, help="also write the JSON report here")
+    parser.add_argument("--teal", action="append", default=[], metavar="NAME=APPROVAL.teal[,CLEAR.teal]",
+                        help="profile TEAL files instead of compiling the variants")
+    parser.add_argument("--allow-errors", action="store_true", help="only warn when a variant cannot be compiled")
+    args = parser.parse_args()
+
+    budgets = json.loads(args.budgets.read_text()) if args.budgets.exists() else {}
+
+    report = {}
+    if args.teal:
+        for item in args.teal:
+            name, paths = item.split("=", 1)
+            approval_path, _, clear_path = paths.partition(",")
+            approval = Path(approval_path).read_text()
+            clear = Path(clear_path).read_text() if clear_path else "#pragma version 8\npushint 1\nreturn"
+            report[name] = profile(approval, clear, declared_iterations(budgets, name, approval))
+    else:
+        for name, (source, attr) in VARIANTS.items():
+            try:
+                approval, clear = compile_variant(source, attr)
+                report[name] = profile(approval, clear, declared_iterations(budgets, name, approval))
+            except Exception as e:
+                report[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    violations = check_budgets(report, budgets)
+    errors = [f"{name}: could not compile ({r['error']})" for name, r in report.items() if "error" in r]
+
+    output = json.dumps({"variants": report, "violations": violations}, indent=2)
+    print(output)
+    if args.out:
+        args.out.write_text(output)
+
+    for line in errors:
+        print(f"{'WARNING' if args.allow_errors else 'ERROR'} {line}", file=sys.stderr)
+    for line in violations:
+        print(f"OVER BUDGET {line}", file=sys.stderr)
+    if violations or (errors and not args.allow_errors):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
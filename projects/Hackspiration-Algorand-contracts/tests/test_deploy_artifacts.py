@@ -0,0 +1,30 @@
+import base64
+
+from smart_contracts.subshare_pool import deploy
+
+
+class CompilingAlgod:
+    def __init__(self):
+        self.compiles = 0
+
+    def compile(self, source, **kwargs):
+        self.compiles += 1
+        return {"result": base64.b64encode(source.encode()[:64]).decode(), "hash": "H" * 58}
+
+
+def test_deploy_reuses_the_compiled_programs(tmp_path, monkeypatch):
+    monkeypatch.setattr(deploy.artifacts, "ARTIFACT_DIR", tmp_path)
+    monkeypatch.setattr(deploy.artifacts, "_loaded", {})
+    algod = CompilingAlgod()
+
+    first = deploy.load_contract(algod)
+    compiles = algod.compiles
+    assert first.compiled
+    assert list(tmp_path.glob("subshare_pool_contracts-*.json"))
+
+    # A new process: nothing in memory, the cache entry on disk
+    deploy.artifacts._loaded.clear()
+    second = deploy.load_contract(algod)
+    assert algod.compiles == compiles
+    assert (second.approval_bin, second.clear_bin) == (first.approval_bin, first.clear_bin)
+    assert second.app_spec.contract.get_method_by_name("create")
@@ -0,0 +1,54 @@
+import teal_profile
+
+LOOP = """#pragma version 8
+txna ApplicationArgs 0
+method "walk(uint64)void"
+==
+bnz main_l2
+err
+main_l2:
+pushint 0
+store 0
+main_l3:
+load 0
+txna ApplicationArgs 1
+btoi
+<
+bz main_l4
+itxn_begin
+itxn_submit
+load 0
+pushint 1
++
+store 0
+b main_l3
+main_l4:
+pushint 1
+return
+"""
+CLEAR = "#pragma version 8\npushint 1\nreturn"
+
+
+def test_loop_is_costed_per_iteration():
+    once = teal_profile.profile(LOOP, CLEAR, {"walk": 1})["methods"]["walk"]
+    four = teal_profile.profile(LOOP, CLEAR, {"walk": 4})["methods"]["walk"]
+    assert (once["inner_txns"], four["inner_txns"]) == (1, 4)
+    assert four["worst_case_cost"] - once["worst_case_cost"] == 3 * 12
+
+
+def test_unbounded_loop_is_a_violation():
+    report = {"v": teal_profile.profile(LOOP, CLEAR)}
+    assert report["v"]["methods"]["walk"]["unbounded_loop"]
+    assert teal_profile.check_budgets(report, {}) == ["v.walk: loop without a max_iterations bound (or nested loops)"]
+
+
+def test_variants_compile_within_budget():
+    budgets = {
+        "methods": {"*": {"max_inner_txns": 1}},
+        "variants": {"backend_boxes": {"methods": {"refund_batch": {"max_iterations": 4, "max_inner_txns": 4}}}},
+    }
+    source, attr = teal_profile.VARIANTS["backend_boxes"]
+    approval, clear = teal_profile.compile_variant(source, attr)
+    report = {"backend_boxes": teal_profile.profile(approval, clear, teal_profile.declared_iterations(budgets, "backend_boxes", approval))}
+    assert report["backend_boxes"]["methods"]["refund_batch"]["inner_txns"] == 4
+    assert teal_profile.check_budgets(report, budgets) == []
@@ -20,15 +20,38 @@ const mockPools: Pool[] = []
 export default function Dashboard() {
     const [pools, setPools] = useState<Pool[]>(mockPools)
     const [loading, setLoading] = useState(true)
+    const [nextCursor, setNextCursor] = useState<number | null>(null)
 
     useEffect(() => {
         fetchPools()
     }, [])
 
-    const fetchPools = async () => {
+    // Status and renewal changes of the listed pools are pushed instead of re-fetched
+    const poolIds = pools.map(pool => pool.id).join(',')
+    useEffect(() => {
+        if (!poolIds) return
+        const params = new URLSearchParams()
+        poolIds.split(',').slice(0, 100).forEach(id => params.append('pool', id))
+        const source = new EventSource(`http://localhost:8000/pools/stream?${params}`)
+        source.addEventListener('pool', (e) => {
+            const diff = JSON.parse((e as MessageEvent).data)
+            setPools(prev => prev.map(pool => (pool.id === diff.pool_id ? {
+                ...pool,
+                status: diff.status ?? pool.status,
+                renewal_timestamp: diff.renewal_timestamp ?? pool.renewal_timestamp,
+                current_members: diff.member_count ?? pool.current_members,
+            } : pool)))
+        })
+        return () => source.close()
+    }, [poolIds])
+
+    const fetchPools = async (cursor?: number) => {
         try {
-            const response = await axios.get('http://localhost:8000/pools')
-            setPools(response.data)
+            const response = await axios.get('http://localhost:8000/pools', {
+                params: { view: 'card', limit: 30, cursor },
+            })
+            setPools(prev => (cursor ? [...prev, ...response.data.items] : response.data.items))
+            setNextCursor(response.data.next_cursor)
         } catch (error) {
             console.error("Failed to fetch pools", error)
         } finally {
@@ -96,6 +119,15 @@ export default function Dashboard() {
                     ))}
                 </div>
             )}
+
+            {nextCursor !== null && (
+                <button
+                    onClick={() => fetchPools(nextCursor)}
+                    className="block mx-auto mt-8 bg-gray-700 hover:bg-gray-600 px-6 py-2 rounded-lg transition font-medium"
+                >
+                    Load more
+                </button>
+            )}
         </div>
     )
 }
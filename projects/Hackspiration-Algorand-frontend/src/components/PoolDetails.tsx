@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { useParams } from 'react-router-dom'
 import axios from 'axios'
 import { useWallet } from '@txnlab/use-wallet-react'
@@ -24,13 +24,23 @@ interface Member {
     deposited_amount: number
 }
 
+interface PoolStats {
+    member_count: number
+    active_members: number
+    total_deposited: number
+    funding_progress: number
+    funding_shortfall: number
+}
+
 export default function PoolDetails() {
     const { id } = useParams()
     const { activeAddress, signTransactions } = useWallet()
     const [pool, setPool] = useState<Pool | null>(null)
     const [member, setMember] = useState<Member | null>(null)
+    const [stats, setStats] = useState<PoolStats | null>(null)
     const [amount, setAmount] = useState('')
     const [loading, setLoading] = useState(false)
+    const cost = useRef(0)
 
     const algodConfig = getAlgodConfigFromViteEnvironment()
     const algodClient = new algosdk.Algodv2(
@@ -40,29 +50,53 @@ export default function PoolDetails() {
     )
 
     useEffect(() => {
-        fetchPool()
-    }, [id])
+        fetchDetail()
+    }, [id, activeAddress])
 
+    // Joins, deposits, renewals and chain sync are pushed as diffs instead of re-fetched
     useEffect(() => {
-        if (activeAddress && pool) {
-            checkMembership()
-        }
-    }, [activeAddress, pool])
-
-    const fetchPool = async () => {
+        const params = new URLSearchParams({ pool: String(id) })
+        if (activeAddress) params.set('wallet', activeAddress)
+        const source = new EventSource(`http://localhost:8000/pools/stream?${params}`)
+        source.addEventListener('pool', (e) => {
+            const { member_count, active_members, total_deposited, ...fields } = JSON.parse((e as MessageEvent).data)
+            setPool(prev => (prev ? { ...prev, ...fields } : prev))
+            if (member_count !== undefined) {
+                setStats(prev => prev && {
+                    ...prev,
+                    member_count,
+                    active_members,
+                    total_deposited,
+                    funding_progress: cost.current ? Math.min(1, total_deposited / cost.current) : 1,
+                    funding_shortfall: Math.max(0, cost.current - total_deposited),
+                })
+            }
+        })
+        source.addEventListener('member', (e) => {
+            const diff = JSON.parse((e as MessageEvent).data)
+            if (diff.pool_id === Number(id) && diff.wallet_address === activeAddress) {
+                setMember(prev => ({ ...(prev ?? { is_active: true, deposited_amount: 0 }), ...diff }))
+            }
+        })
+        // After an eviction or a dropped connection EventSource reconnects; catch up on what was missed
+        let connected = false
+        source.addEventListener('subscribed', () => {
+            if (connected) fetchDetail()
+            connected = true
+        })
+        return () => source.close()
+    }, [id, activeAddress])
+
+    // Pool, member aggregates and the connected wallet's membership in one request
+    const fetchDetail = async () => {
         try {
-            const res = await axios.get(`http://localhost:8000/pool/${id}`)
-            setPool(res.data)
-        } catch (e) {
-            console.error(e)
-        }
-    }
-
-    const checkMembership = async () => {
-        try {
-            const res = await axios.get(`http://localhost:8000/user/${activeAddress}`)
-            const membership = res.data.find((m: Member) => m.pool_id === Number(id))
-            setMember(membership || null)
+            const res = await axios.get(`http://localhost:8000/pool/${id}/detail`, {
+                params: { wallet: activeAddress || undefined, members_limit: 0 }
+            })
+            setPool(res.data.pool)
+            cost.current = res.data.pool.cost_per_cycle
+            setStats(res.data.stats)
+            setMember(res.data.membership)
         } catch (e) {
             console.error(e)
         }
@@ -78,7 +112,6 @@ export default function PoolDetails() {
                 is_active: true,
                 deposited_amount: 0
             })
-            checkMembership()
         } catch (e) {
             console.error(e)
             alert("Failed to join")
@@ -113,10 +146,9 @@ export default function PoolDetails() {
             await algosdk.waitForConfirmation(algodClient, txId, 4)
 
             // Notify backend
-            await axios.post(`http://localhost:8000/deposit?pool_id=${id}&wallet_address=${activeAddress}&amount=${amountMicroAlgo}`)
+            await axios.post(`http://localhost:8000/deposit?pool_id=${id}&wallet_address=${activeAddress}&amount=${Math.round(amountMicroAlgo)}&txid=${txId}`)
 
             alert(`Deposit successful! TX: ${txId}`)
-            checkMembership()
 
         } catch (e) {
             console.error(e)
@@ -134,7 +166,10 @@ export default function PoolDetails() {
                 <h1 className="text-3xl font-bold mb-4">{pool.subscription_name}</h1>
                 <div className="space-y-4 text-gray-300">
                     <p><strong>Cost:</strong> {(pool.cost_per_cycle / 1000000).toFixed(2)} ALGO</p>
-                    <p><strong>Members:</strong> {pool.max_members} max</p>
+                    <p><strong>Members:</strong> {stats ? `${stats.member_count} / ` : ''}{pool.max_members} max</p>
+                    {stats && (
+                        <p><strong>Funded:</strong> {(stats.total_deposited / 1000000).toFixed(2)} ALGO ({Math.round(stats.funding_progress * 100)}%)</p>
+                    )}
                     <p><strong>Renewal:</strong> {new Date(pool.renewal_timestamp * 1000).toLocaleDateString()}</p>
                     <p><strong>Status:</strong> {pool.status === 0 ? 'Forming' : 'Active'}</p>
                     <p className="text-xs text-gray-500 break-all">Contract: {pool.contract_address}</p>